@@ -1,8 +1,28 @@
 import os
+import re
+import signal
+import json
 import subprocess
+import threading
+from time import perf_counter
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from .config import config, compilers
-from .parse_aggregator import parse_compiler_output
+from .parse_aggregator import parse_compiler_output, iter_compiler_output, parse_depfile, find_local_symbols
+from .cache_aggregator import CompilationCache
+from .project_tree import ProjectTree
+from .utils import log, wrn
+
+cache: CompilationCache | None = None
+
+
+def get_cache() -> CompilationCache | None:
+    # BUILD_CACHE_SIZE = 0 выключает кэш
+    global cache
+    if cache is None and int(config['BUILD_CACHE_SIZE']) > 0:
+        cache = CompilationCache(Path(config['BUILD_CACHE']), int(config['BUILD_CACHE_SIZE']) * 2 ** 20)
+    return cache
 
 
 def find_vcvarsall():
@@ -43,7 +63,9 @@ def find_cpp_source_files(project_root: Path) -> tuple[list[str], list[str]]:
     include_dirs = set()
 
     for root, _, files in os.walk(project_root):
-        if any(i in root for i in ('build', 'test')):
+        # Каталоги сборки и тестов ищутся в пути относительно проекта: сам проект может лежать, например, в /tmp/tests
+        relative = str(Path(root).relative_to(project_root))
+        if any(i in relative for i in ('build', 'test')) or Path(root).is_relative_to(Path(project_root) / 'bin'):
             continue
         for file in files:
             path = Path(root) / file
@@ -54,7 +76,9 @@ def find_cpp_source_files(project_root: Path) -> tuple[list[str], list[str]]:
             elif ext in header_exts:
                 include_dirs.add(str(path.parent))
 
-    return sources, list(include_dirs)
+    # Порядок входит в команды, по которым манифесты решают, пересобирать ли объект, поэтому он
+    # не должен зависеть от хеширования строк (PYTHONHASHSEED) и порядка обхода каталогов
+    return sorted(sources), sorted(include_dirs)
 
 
 def select_cpp_compiler(compiler: str, sources: list[str]) -> dict:
@@ -79,30 +103,68 @@ def select_cpp_compiler(compiler: str, sources: list[str]) -> dict:
     }
 
 
-def build_cpp_compile_command(compiler_info: dict,
-                              sources: list[str],
-                              include_dirs: list[str],
-                              output_path: str) -> list[str]:
-    is_cpp = any(f.endswith(('.cpp', '.cc', '.cxx')) for f in sources)
-    compiler = compiler_info['cpp'] if is_cpp else compiler_info['c']
-
-    cmd = [compiler]
-
-    cmd += compiler_info['flags'].split()
+@lru_cache(maxsize=None)
+def structured_diagnostics_flags(compiler: str) -> tuple[str, ...]:
+    # Первый машиночитаемый формат диагностики, который принимает компилятор: SARIF у clang,
+    # JSON у GCC 9–14 и SARIF у GCC 13+ (в GCC 15 JSON убран); () — только текст
+    if 'clang' in compiler:
+        candidates = [('-fdiagnostics-format=sarif', '-Wno-sarif-format-unstable')]
+    else:
+        candidates = [('-fdiagnostics-format=json',), ('-fdiagnostics-format=sarif-stderr',)]
+    for flags in candidates:
+        try:
+            process = subprocess.run(
+                [compiler, *flags, '-fsyntax-only', '-x', 'c++', os.devnull],
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace'
+            )
+        except OSError:
+            return ()
+        if process.returncode == 0:
+            return flags
+    return ()
+
+
+def build_cpp_flags(compiler_info: dict, is_cpp: bool, include_dirs: list[str]) -> list[str]:
+    cmd = compiler_info['flags'].split()
 
     if compiler_info['type'] != 'msvc':
         std = f'-std={compiler_info["cpp_version"]}' if is_cpp else f'-std={compiler_info["c_version"]}'
         cmd.append(std)
+        # JSON/SARIF компилятор выдаёт одним документом при выходе, и ErrorLimit не может оборвать
+        # компиляцию на полпути, поэтому структурный формат — только по выбору и без лимита ошибок
+        if config['DIAGNOSTICS_FORMAT'] == 'structured' and config['MAX_ERRORS'] == '0':
+            cmd += structured_diagnostics_flags(compiler_info['cpp'] if is_cpp else compiler_info['c'])
     else:
         cmd += [
             f'/I{config.get("VS_INCLUDE")}',
             f'/I{config.get("WIN_SDK_INCLUDE")}',
-            f'/std:{compiler["cpp_version"]}'
+            f'/std:{compiler_info["cpp_version"]}'
         ]
 
     for include in include_dirs:
         cmd.append(f'-I{include}' if compiler_info['type'] != 'msvc' else f'/I{include}')
 
+    return cmd
+
+
+def build_cpp_compile_command(compiler_info: dict,
+                              sources: list[str],
+                              include_dirs: list[str],
+                              output_path: str,
+                              pch_flags: list[str] = ()) -> list[str]:
+    is_cpp = any(f.endswith(('.cpp', '.cc', '.cxx')) for f in sources)
+    compiler = compiler_info['cpp'] if is_cpp else compiler_info['c']
+
+    cmd = [compiler]
+
+    cmd += build_cpp_flags(compiler_info, is_cpp, include_dirs)
+
+    if is_cpp:
+        cmd += pch_flags
+
     cmd += sources
 
     if compiler_info['type'] != 'msvc':
@@ -116,7 +178,572 @@ def build_cpp_compile_command(compiler_info: dict,
     return cmd
 
 
-def compile_cpp_project(project_path: str, compiler: str = 'auto', output_name: str = 'out') -> dict:
+def build_cpp_object_command(compiler_info: dict,
+                             source: str,
+                             include_dirs: list[str],
+                             object_path: str,
+                             pch_flags: list[str] = ()) -> list[str]:
+    is_cpp = source.endswith(('.cpp', '.cc', '.cxx', '.c++'))
+    cmd = [compiler_info['cpp'] if is_cpp else compiler_info['c']]
+    cmd += build_cpp_flags(compiler_info, is_cpp, include_dirs)
+    if is_cpp:
+        cmd += pch_flags
+    if compiler_info['type'] != 'msvc':
+        cmd += ['-MMD', '-MF', str(Path(object_path).with_suffix('.d'))]
+        cmd += ['-c', source, '-o', str(object_path)]
+    else:
+        cmd += ['/c', source, f'/Fo{object_path}']
+    return cmd
+
+
+def build_cpp_link_command(compiler_info: dict, objects: list[str], is_cpp: bool, output_path: str) -> list[str]:
+    cmd = [compiler_info['cpp'] if is_cpp else compiler_info['c']]
+    cmd += objects
+    if compiler_info['type'] != 'msvc':
+        cmd += ['-o', str(output_path)]
+    else:
+        cmd += ['/nologo', f'/Fe{output_path}', '/link', 'kernel32.lib', 'user32.lib']
+    return cmd
+
+
+def build_syntax_check_command(compiler_info: dict, path: str, include_dirs: list[str]) -> list[str]:
+    is_header = path.endswith(('.h', '.hpp', '.hh', '.hxx', '.ipp', '.tpp', '.inc'))
+    cmd = [compiler_info['cpp']]
+    cmd += build_cpp_flags(compiler_info, True, include_dirs)
+    if compiler_info['type'] != 'msvc':
+        cmd += ['-fsyntax-only', '-x', 'c++-header' if is_header else 'c++', path]
+    else:
+        cmd += ['/Zs', f'/Tp{path}']
+    return cmd
+
+
+def syntax_check_file(compiler_info: dict, path: str, include_dirs: list[str]) -> tuple[list[dict], list[dict]]:
+    target = Path(path)
+    if target.suffix in ('.ipp', '.tpp'):
+        # Реализация шаблонов не компилируется сама по себе: её включает свой .hpp, поэтому проверяется
+        # он, а в результат идут только диагностики самого .ipp (ошибки .hpp достанутся его проверке)
+        owner = target.with_suffix('.hpp')
+        if not owner.exists():
+            return [], []
+        target = owner
+    process = subprocess.run(
+        build_syntax_check_command(compiler_info, str(target), include_dirs),
+        cwd=target.parent,
+        capture_output=True,
+        text=True,
+        encoding='utf-8',
+        errors='replace'
+    )
+    errors, warnings = parse_compiler_output(process.stdout + process.stderr)
+    if str(target) != path:
+        checked = Path(path).resolve()
+        errors, warnings = (
+            [d for d in diagnostics if d.get('file') and (target.parent / d['file']).resolve() == checked]
+            for diagnostics in (errors, warnings)
+        )
+        return errors, warnings
+    if process.returncode != 0 and not errors:
+        errors.append({
+            'type': 'error',
+            'file': path,
+            'line': 0,
+            'column': 0,
+            'message': f'Syntax check failed with exit code {process.returncode}',
+            'code': '',
+            'context': (process.stdout + process.stderr).strip()
+        })
+    # И наоборот: ошибки из своего .ipp достаются проверке .ipp, иначе чинить отправили бы заголовок
+    implementations = {target.with_suffix(suffix).resolve() for suffix in ('.ipp', '.tpp')}
+    errors, warnings = (
+        [d for d in diagnostics if not d.get('file') or (target.parent / d['file']).resolve() not in implementations]
+        for diagnostics in (errors, warnings)
+    )
+    return errors, warnings
+
+
+def object_path_for(source: str, project_root: Path, build_dir: Path, compiler_info: dict) -> Path:
+    relative = Path(source).resolve().relative_to(project_root)
+    suffix = '.obj' if compiler_info['type'] == 'msvc' else '.o'
+    return build_dir / 'obj' / relative.with_name(relative.name + suffix)
+
+
+def newest_header_mtime(include_dirs: list[str]) -> float:
+    header_exts = {'.h', '.hpp', '.hh', '.hxx', '.inc', '.ipp', '.tpp'}
+    newest = 0.0
+    for include in include_dirs:
+        for path in Path(include).iterdir():
+            if path.suffix.lower() in header_exts and path.is_file():
+                newest = max(newest, path.stat().st_mtime)
+    return newest
+
+
+def kill_compiler(process: subprocess.Popen) -> None:
+    # g++ и clang — драйверы: настоящий компилятор (cc1plus) держит канал вывода открытым и переживает
+    # kill драйвера, поэтому на POSIX убивается вся группа процессов, созданная при запуске
+    if os.name == 'posix':
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    else:
+        process.kill()
+
+
+class ErrorLimit:
+    # Общий на сборку счётчик ошибок: после limit-й ошибки запущенные компиляторы убиваются,
+    # а ещё не начатые TU не запускаются. limit = 0 — без ограничения
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.count = 0
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._processes: set[subprocess.Popen] = set()
+
+    def start(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.add(process)
+            if self.cancelled.is_set():
+                kill_compiler(process)
+
+    def finish(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.discard(process)
+
+    def report(self, entry: dict) -> None:
+        if 'error' not in entry['type']:
+            return
+        with self._lock:
+            self.count += 1
+            if not self.limit or self.count < self.limit or self.cancelled.is_set():
+                return
+            self.cancelled.set()
+            for process in self._processes:
+                kill_compiler(process)
+        wrn('Build cancelled after {} errors', self.count)
+
+
+def compile_cpp_object(command: list[str],
+                       project_root: Path,
+                       error_limit: ErrorLimit | None = None) -> tuple[int, str, list[dict], list[dict]]:
+    # Вывод компилятора разбирается по мере поступления из канала, без ожидания завершения процесса
+    process = subprocess.Popen(
+        command,
+        cwd=project_root,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        start_new_session=True
+    )
+    if error_limit is not None:
+        error_limit.start(process)
+    output = []
+    errors = []
+    warnings = []
+
+    def lines():
+        for line in process.stdout:
+            output.append(line)
+            yield line
+
+    try:
+        for entry in iter_compiler_output(lines()):
+            if 'error' in entry['type']:
+                errors.append(entry)
+            else:
+                warnings.append(entry)
+            if error_limit is not None:
+                error_limit.report(entry)
+        returncode = process.wait()
+    finally:
+        process.stdout.close()
+        if error_limit is not None:
+            error_limit.finish(process)
+    return returncode, ''.join(output), errors, warnings
+
+
+def compile_cpp_object_cached(unit: dict,
+                              compiler_info: dict,
+                              project_root: Path,
+                              error_limit: ErrorLimit | None = None) -> tuple[int, str, list[dict], list[dict]]:
+    if error_limit is not None and error_limit.cancelled.is_set():
+        unit['cancelled'] = True
+        return -1, '', [], []
+    build_cache = get_cache()
+    if build_cache is None:
+        return compile_cpp_object(unit['command'], project_root, error_limit)
+    depfile = Path(unit['depfile']) if unit['depfile'] else None
+    key = build_cache.key(unit['command'], compiler_info, unit['source'], project_root)
+    if key is not None:
+        output = build_cache.get(key, Path(unit['object']), project_root, depfile)
+        if output is not None:
+            unit['cached'] = True
+            return 0, output, *parse_compiler_output(output)
+    returncode, output, errors, warnings = compile_cpp_object(unit['command'], project_root, error_limit)
+    if key is not None and returncode == 0:
+        build_cache.put(key, Path(unit['object']), output, project_root, depfile)
+    return returncode, output, errors, warnings
+
+
+def inputs_mtime(source: str, dependencies: list[str] | None, headers_mtime: float) -> float:
+    # Без depfile любой заголовок проекта считается входом TU
+    if dependencies is None:
+        return max(Path(source).stat().st_mtime, headers_mtime)
+    try:
+        return max([Path(source).stat().st_mtime] + [Path(d).stat().st_mtime for d in dependencies])
+    except OSError:
+        return float('inf')
+
+
+def check_include_graph(include_graph: dict[str, list[str]],
+                        project_tree: ProjectTree,
+                        project_root: Path) -> list[str]:
+    # Сверяет реальные #include (из depfile) с зависимостями из project_structure.json
+    warnings = []
+    for source, dependencies in include_graph.items():
+        name = Path(source).stem
+        if name not in project_tree:
+            continue
+        declared = {node.name for node in project_tree.get_subtree(name)}
+        included = set()
+        for dependency in dependencies:
+            path = Path(dependency)
+            if path.is_relative_to(project_root) and path.stem in project_tree and path.stem != name:
+                included.add(path.stem)
+        for undeclared in sorted(included - declared):
+            warnings.append(f'"{source}" includes "{undeclared}", which is not among its dependencies '
+                            'in project_structure.json')
+        for unused in sorted(project_tree[name].dependencies - included):
+            warnings.append(f'"{source}" never includes "{unused}", although project_structure.json '
+                            'declares it as a dependency')
+    return warnings
+
+
+def compile_cpp_objects(compiler_info: dict,
+                        sources: list[str],
+                        include_dirs: list[str],
+                        project_root: Path,
+                        build_dir: Path,
+                        jobs: int | None = None,
+                        pch_flags: list[str] = (),
+                        max_errors: int = 0) -> list[dict]:
+    # Каждый TU компилируется в свой объектный файл; объекты, чьи входы не менялись, переиспользуются.
+    # Пул потоков: сама работа идёт в дочерних процессах компилятора, потоки только ждут их
+    manifest_path = build_dir / 'objects.json'
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding='UTF-8'))
+    except (OSError, ValueError):
+        manifest = {}
+    include_graph_path = build_dir / 'include_graph.json'
+    try:
+        include_graph = json.loads(include_graph_path.read_text(encoding='UTF-8'))
+    except (OSError, ValueError):
+        include_graph = {}
+    headers_mtime = newest_header_mtime(include_dirs)
+    build_cache = get_cache()
+
+    units = []
+    for source in sources:
+        object_path = object_path_for(source, project_root, build_dir, compiler_info)
+        command = build_cpp_object_command(compiler_info, source, include_dirs, str(object_path), pch_flags)
+        previous = manifest.get(str(object_path))
+        fresh = (
+            previous is not None
+            and previous['command'] == command
+            and previous['returncode'] == 0
+            and object_path.exists()
+            and object_path.stat().st_mtime >= inputs_mtime(source, include_graph.get(source), headers_mtime)
+        )
+        unit = {
+            'source': source,
+            'object': str(object_path),
+            'depfile': str(object_path.with_suffix('.d')) if compiler_info['type'] != 'msvc' else '',
+            'command': command,
+            'skipped': fresh,
+            'cached': False,
+            'cancelled': False,
+            'returncode': previous['returncode'] if fresh else -1,
+            'output': previous['output'] if fresh else '',
+            'errors': [],
+            'warnings': []
+        }
+        if fresh:
+            unit['errors'], unit['warnings'] = parse_compiler_output(unit['output'])
+        units.append(unit)
+
+    stale = [unit for unit in units if not unit['skipped']]
+    for unit in stale:
+        Path(unit['object']).parent.mkdir(parents=True, exist_ok=True)
+    if stale:
+        error_limit = ErrorLimit(max_errors)
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+            results = executor.map(
+                lambda u: compile_cpp_object_cached(u, compiler_info, project_root, error_limit), stale
+            )
+            for unit, (returncode, output, errors, warnings) in zip(stale, results):
+                unit['returncode'], unit['output'] = returncode, output
+                unit['errors'], unit['warnings'] = errors, warnings
+                unit['cancelled'] = unit['cancelled'] or error_limit.cancelled.is_set() and returncode != 0
+        if build_cache is not None:
+            build_cache.save()
+
+    for unit in units:
+        unit['success'] = unit['returncode'] == 0
+        manifest[unit['object']] = {k: unit[k] for k in ('command', 'returncode', 'output')}
+        if not unit['skipped'] and unit['success'] and unit['depfile'] and Path(unit['depfile']).exists():
+            dependencies = parse_depfile(Path(unit['depfile']).read_text(encoding='UTF-8'))
+            source = Path(unit['source']).resolve()
+            include_graph[unit['source']] = [
+                str(path) for path in ((project_root / d).resolve() for d in dependencies) if path != source
+            ]
+    manifest_path.write_text(json.dumps(manifest, indent=1), encoding='UTF-8')
+    include_graph_path.write_text(json.dumps(include_graph, indent=1), encoding='UTF-8')
+    return units
+
+
+def defines_main(source: str) -> bool:
+    # TU с точкой входа не входит в библиотеку проекта и не склеивается с другими
+    with open(source, 'r', encoding='UTF-8', errors='replace') as file:
+        return re.search(r'\bint\s+main\s*\(', file.read()) is not None
+
+
+def group_unity_sources(sources: list[str],
+                        project_tree: ProjectTree | None,
+                        excluded: set[str]) -> tuple[dict[str, list[str]], list[str]]:
+    # Группы по модулю ProjectTree (без дерева — по каталогу); файлы с конфликтующими
+    # символами внутреннего связывания и ранее ломавшиеся при склейке компилируются отдельно
+    groups: dict[str, list[str]] = {}
+    singles = []
+    for source in sources:
+        name = Path(source).stem
+        if source in excluded or not source.endswith(('.cpp', '.cc', '.cxx', '.c++')) or defines_main(source):
+            singles.append(source)
+            continue
+        module = project_tree[name].module if project_tree is not None and name in project_tree \
+            else Path(source).parent.name
+        groups.setdefault(module, []).append(source)
+
+    unity = {}
+    for module, members in groups.items():
+        seen: set[str] = set()
+        safe = []
+        for source in members:
+            with open(source, 'r', encoding='UTF-8', errors='replace') as file:
+                symbols = find_local_symbols(file.read())
+            if symbols & seen:
+                singles.append(source)
+                continue
+            seen |= symbols
+            safe.append(source)
+        if len(safe) > 1:
+            unity[module] = safe
+        else:
+            singles += safe
+    return unity, singles
+
+
+_INCLUDE = re.compile(r'^\s*#\s*include\s*([<"])([^>"]+)[>"]', re.MULTILINE)
+
+
+def collect_common_includes(sources: list[str], include_dirs: list[str], threshold: float = 0.5) -> list[str]:
+    # Системные заголовки (#include <...>), которые доходят хотя бы до threshold доли TU (и минимум до двух)
+    # напрямую или через заголовки проекта: сгенерированный .cpp обычно включает только свой .hpp, и по прямым
+    # #include общих почти нет. Сами заголовки проекта в PCH не идут — их правят между сборками
+    parsed: dict[Path, tuple[list[str], list[Path]]] = {}  # файл -> (системные заголовки, заголовки проекта)
+
+    def parse(path: Path) -> tuple[list[str], list[Path]]:
+        if path not in parsed:
+            try:
+                text = path.read_text(encoding='UTF-8', errors='replace')
+            except OSError:
+                text = ''
+            system, local = [], []
+            for bracket, header in _INCLUDE.findall(text):
+                if bracket == '<':
+                    system.append(f'<{header}>')
+                else:
+                    for base in (path.parent, *map(Path, include_dirs)):
+                        if (base / header).is_file():
+                            local.append((base / header).resolve())
+                            break
+            parsed[path] = system, local
+        return parsed[path]
+
+    counts: dict[str, int] = {}
+    for source in sources:
+        seen = set()
+        headers = set()
+        pending = [Path(source).resolve()]
+        while pending:
+            path = pending.pop()
+            if path in seen:
+                continue
+            seen.add(path)
+            system, local = parse(path)
+            headers.update(system)
+            pending += local
+        for header in headers:
+            counts[header] = counts.get(header, 0) + 1
+    return sorted(header for header, count in counts.items() if count >= max(2, len(sources) * threshold))
+
+
+def build_precompiled_header(compiler_info: dict,
+                             sources: list[str],
+                             include_dirs: list[str],
+                             project_root: Path,
+                             build_dir: Path) -> list[str]:
+    # Возвращает флаги подключения PCH для команд TU или [], если PCH не нужен или не собрался
+    if compiler_info['type'] == 'msvc':
+        return []
+    sources = [source for source in sources if source.endswith(('.cpp', '.cc', '.cxx', '.c++'))]
+    headers = collect_common_includes(sources, include_dirs)
+    if not headers:
+        return []
+    pch_dir = build_dir / 'pch'
+    pch_dir.mkdir(exist_ok=True)
+    header = pch_dir / 'common.hpp'
+    content = '#pragma once\n' + ''.join(f'#include {h}\n' for h in headers)
+    if not header.exists() or header.read_text(encoding='UTF-8') != content:
+        header.write_text(content, encoding='UTF-8')
+
+    is_clang = 'clang' in compiler_info['cpp']
+    output = pch_dir / ('common.hpp.pch' if is_clang else 'common.hpp.gch')
+    depfile = pch_dir / 'common.d'
+    # Команда сравнивается с pch.json, поэтому порядок -I не должен меняться между запусками
+    command = [compiler_info['cpp']] + build_cpp_flags(compiler_info, True, sorted(include_dirs))
+    command += ['-x', 'c++-header', '-MMD', '-MF', str(depfile), str(header), '-o', str(output)]
+
+    # PCH пересобирается, если изменились набор заголовков, флаги или любой из вошедших в него файлов
+    state_path = pch_dir / 'pch.json'
+    try:
+        state = json.loads(state_path.read_text(encoding='UTF-8'))
+    except (OSError, ValueError):
+        state = {}
+    dependencies = parse_depfile(depfile.read_text(encoding='UTF-8')) if depfile.exists() else None
+    fresh = (
+        state.get('command') == command
+        and output.exists()
+        and output.stat().st_mtime >= inputs_mtime(str(header), dependencies, float('inf'))
+    )
+    if not fresh:
+        returncode, log_output, _, _ = compile_cpp_object(command, project_root)
+        if returncode != 0:
+            wrn('Precompiled header was not built:\n{}', log_output.strip())
+            output.unlink(missing_ok=True)
+            return []
+        state_path.write_text(json.dumps({'command': command}, indent=1), encoding='UTF-8')
+    if is_clang:
+        return ['-include-pch', str(output)]
+    return ['-include', str(header), '-Winvalid-pch']
+
+
+def build_static_library(compiler_info: dict, objects: list[str], output_path: Path) -> tuple[bool, str]:
+    # Библиотека пересобирается, только если сменился состав или какой-то объект новее архива
+    state_path = output_path.with_suffix('.json')
+    objects = sorted(objects)
+    try:
+        state = json.loads(state_path.read_text(encoding='UTF-8'))
+    except (OSError, ValueError):
+        state = {}
+    if (
+        state.get('objects') == objects
+        and output_path.exists()
+        and output_path.stat().st_mtime >= max((Path(o).stat().st_mtime for o in objects), default=0.0)
+    ):
+        return True, ''
+    output_path.unlink(missing_ok=True)  # ar дописывает в существующий архив
+    if compiler_info['type'] == 'msvc':
+        command = ['lib.exe', '/nologo', f'/OUT:{output_path}', *objects]
+    else:
+        command = ['ar', 'rcs', str(output_path), *objects]
+    process = subprocess.run(
+        command,
+        capture_output=True,
+        text=True,
+        encoding='utf-8',
+        errors='replace'
+    )
+    if process.returncode == 0:
+        state_path.write_text(json.dumps({'objects': objects}, indent=1), encoding='UTF-8')
+    return process.returncode == 0, process.stdout + process.stderr
+
+
+def record_build_time(build_dir: Path, mode: str, seconds: float, full: bool) -> dict:
+    # Хранит время последней полной (без переиспользованных объектов) сборки в каждом режиме
+    timing_path = build_dir / 'timing.json'
+    try:
+        timing = json.loads(timing_path.read_text(encoding='UTF-8'))
+    except (OSError, ValueError):
+        timing = {}
+    if full is True:
+        timing[mode] = seconds
+        timing_path.write_text(json.dumps(timing, indent=1), encoding='UTF-8')
+    if mode != 'per_tu' and mode in timing and 'per_tu' in timing:
+        log('Full build: {:.2f}s {} vs {:.2f}s per-TU ({:.2f}x)',
+            timing[mode], mode, timing['per_tu'], timing['per_tu'] / max(timing[mode], 1e-9))
+    return {**timing, 'current': seconds, 'mode': mode}
+
+
+def compile_cpp_unity(compiler_info: dict,
+                      sources: list[str],
+                      include_dirs: list[str],
+                      project_root: Path,
+                      build_dir: Path,
+                      project_tree: ProjectTree | None = None,
+                      pch_flags: list[str] = (),
+                      max_errors: int = 0) -> list[dict]:
+    unity_dir = build_dir / 'unity'
+    unity_dir.mkdir(exist_ok=True)
+    excluded_path = unity_dir / 'excluded.json'
+    try:
+        excluded = set(json.loads(excluded_path.read_text(encoding='UTF-8')))
+    except (OSError, ValueError):
+        excluded = set()
+
+    groups, singles = group_unity_sources(sources, project_tree, excluded)
+    members = {}
+    for module, group in groups.items():
+        path = unity_dir / f'{module}.cpp'
+        content = ''.join(f'#include "{Path(source).as_posix()}"\n' for source in group)
+        if not path.exists() or path.read_text(encoding='UTF-8') != content:
+            path.write_text(content, encoding='UTF-8')
+        elif max(Path(source).stat().st_mtime for source in group) > path.stat().st_mtime:
+            os.utime(path)
+        members[str(path)] = group
+
+    units = compile_cpp_objects(
+        compiler_info, list(members) + singles, include_dirs, project_root, build_dir,
+        pch_flags=pch_flags, max_errors=max_errors
+    )
+
+    # Склейка, которая не компилируется, разбирается на отдельные TU; если по отдельности
+    # все файлы собираются, виновата именно склейка, и группа исключается из unity-режима.
+    # После отмены сборки по лимиту ошибок разборка не выполняется
+    failed = [unit for unit in units if unit['source'] in members and not unit['success']]
+    if failed and not any(unit['cancelled'] for unit in units):
+        retry = [source for unit in failed for source in members[unit['source']]]
+        units = [unit for unit in units if unit not in failed]
+        retried = compile_cpp_objects(
+            compiler_info, retry, include_dirs, project_root, build_dir, pch_flags=pch_flags, max_errors=max_errors
+        )
+        units += retried
+        for unit in failed:
+            group = members[unit['source']]
+            if all(u['success'] for u in retried if u['source'] in group):
+                wrn('Unity TU "{}" breaks under amalgamation, excluding {} sources', unit['source'], len(group))
+                excluded.update(group)
+        excluded_path.write_text(json.dumps(sorted(excluded), indent=1), encoding='UTF-8')
+    return units
+
+
+def compile_cpp_project(project_path: str,
+                        compiler: str = 'auto',
+                        output_name: str = 'out',
+                        project_tree: ProjectTree | None = None,
+                        unity: bool | None = None,
+                        pch: bool | None = None,
+                        max_errors: int | None = None) -> dict:
     '''
     :return: {
         'success': bool,
@@ -124,6 +751,12 @@ def compile_cpp_project(project_path: str, compiler: str = 'auto', output_name:
         'errors': List[Dict],
         'warnings': List[Dict],
         'executable': str,
+        'library': str,
+        'units': List[Dict],
+        'cache': Dict,
+        'include_warnings': List[str],
+        'timing': Dict,
+        'cancelled': bool,
         'tests': {
             'total': int,
             'passed': int,
@@ -138,6 +771,9 @@ def compile_cpp_project(project_path: str, compiler: str = 'auto', output_name:
         'errors': [],
         'warnings': [],
         'executable': '',
+        'library': '',
+        'units': [],
+        'cancelled': False,
         'tests': {
             'total': 0,
             'passed': 0,
@@ -158,15 +794,73 @@ def compile_cpp_project(project_path: str, compiler: str = 'auto', output_name:
 
         compiler_info = select_cpp_compiler(compiler, sources)
 
-        compile_cmd = build_cpp_compile_command(
+        if unity is None:
+            unity = config['UNITY_BUILD'] == 'true'
+        if pch is None:
+            pch = config['PCH'] == 'true'
+        if max_errors is None:
+            max_errors = int(config['MAX_ERRORS'])
+        start = perf_counter()
+        pch_flags = build_precompiled_header(compiler_info, sources, include_dirs, project_root, build_dir) \
+            if pch is True else []
+        if unity is True:
+            units = compile_cpp_unity(
+                compiler_info, sources, include_dirs, project_root, build_dir, project_tree, pch_flags, max_errors
+            )
+        else:
+            units = compile_cpp_objects(
+                compiler_info, sources, include_dirs, project_root, build_dir,
+                pch_flags=pch_flags, max_errors=max_errors
+            )
+        result['timing'] = record_build_time(
+            build_dir,
+            ('unity' if unity is True else 'per_tu') + ('+pch' if pch_flags else ''),
+            perf_counter() - start,
+            all(not unit['skipped'] and not unit['cached'] for unit in units)
+        )
+        result['units'] = [
+            {k: unit[k] for k in ('source', 'object', 'success', 'skipped', 'cached', 'cancelled')} for unit in units
+        ]
+        result['cancelled'] = any(unit['cancelled'] for unit in units)
+        if get_cache() is not None:
+            result['cache'] = {**get_cache().session, 'hit_rate': get_cache().hit_rate}
+        result['output'] = ''.join(unit['output'] for unit in units)
+        # Полный разбор: дубликаты и каскады сворачиваются только в промпте исправления (format_diagnostics)
+        for unit in units:
+            result['errors'] += unit['errors']
+            result['warnings'] += unit['warnings']
+        if project_tree is not None:
+            try:
+                include_graph = json.loads((build_dir / 'include_graph.json').read_text(encoding='UTF-8'))
+            except (OSError, ValueError):
+                include_graph = {}
+            result['include_warnings'] = check_include_graph(include_graph, project_tree, project_root)
+            for warning in result['include_warnings']:
+                wrn('{}', warning)
+        if not all(unit['success'] for unit in units):
+            return result
+
+        # Всё, кроме точки входа, — в статическую библиотеку, с которой линкуются тесты
+        library = build_dir / (f'{output_name}.lib' if compiler_info['type'] == 'msvc' else f'lib{output_name}.a')
+        members = [unit['object'] for unit in units if not defines_main(unit['source'])]
+        if members:
+            built, library_output = build_static_library(compiler_info, members, library)
+            result['output'] += library_output
+            if built:
+                result['library'] = str(library)
+            else:
+                wrn('Static library was not built:\n{}', library_output.strip())
+
+        is_cpp = any(file.endswith(('.cpp', '.cc', '.cxx', '.c++')) for file in sources)
+        link_cmd = build_cpp_link_command(
             compiler_info,
-            sources,
-            include_dirs,
+            [unit['object'] for unit in units],
+            is_cpp,
             str(build_dir / output_name)
         )
 
         process = subprocess.run(
-            compile_cmd,
+            link_cmd,
             cwd=project_root,
             capture_output=True,
             text=True,
@@ -174,8 +868,10 @@ def compile_cpp_project(project_path: str, compiler: str = 'auto', output_name:
             errors='replace'
         )
 
-        result['output'] = process.stdout + process.stderr
-        result['errors'], result['warnings'] = parse_compiler_output(process.stderr)
+        result['output'] += process.stdout + process.stderr
+        errors, warnings = parse_compiler_output(process.stderr)
+        result['errors'] += errors
+        result['warnings'] += warnings
 
         result['success'] = process.returncode == 0
         if result['success']:
@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import subprocess
+import threading
+from pathlib import Path
+from functools import lru_cache
+
+ROOT_TOKEN = '<<PROJECT_ROOT>>'
+# Маркеры строк препроцессора: '# 12 "file" 1 3' (GCC, Clang) и '#line 12 "file"' (MSVC)
+_LINE_MARKER = re.compile(r'^#(?:line)?[ \t]+\d+[ \t]+"[^"\n]*"', re.MULTILINE)
+# Встроенные функции, которые берут имя файла из маркеров строк при компиляции (std::source_location)
+_BUILTIN_FILE = re.compile(r'\b__builtin_(?:FILE|source_location)\b')
+
+
+@lru_cache(maxsize=None)
+def compiler_identity(compiler: str) -> str:
+    try:
+        process = subprocess.run(
+            [compiler, '--version'],
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
+        )
+    except OSError:
+        return compiler
+    return compiler + '\n' + process.stdout + process.stderr
+
+
+def build_preprocess_command(compile_command: list[str], compiler_info: dict) -> list[str]:
+    # Та же команда, но вместо объекта препроцессированный текст в stdout
+    cmd = []
+    skip = False
+    for arg in compile_command:
+        if skip:
+            skip = False
+            continue
+        if arg == '-o':
+            skip = True
+        elif arg in ('-c', '/c') or arg.startswith('/Fo'):
+            continue
+        elif arg in ('-MMD', '-MD'):
+            continue
+        elif arg == '-MF':
+            skip = True
+        elif arg.endswith('.pch') and cmd and cmd[-1] == '-include-pch':
+            # Препроцессор должен видеть текст заголовка, а не бинарный PCH
+            cmd[-1:] = ['-include', arg.removesuffix('.pch')]
+        else:
+            cmd.append(arg)
+    cmd.insert(1, '/E' if compiler_info['type'] == 'msvc' else '-E')
+    return cmd
+
+
+def normalize_line_markers(text: str, project_root: Path) -> str:
+    # Путь проекта заменяется только в маркерах строк: строковые литералы (__FILE__) попадают в объектный
+    # файл, и объект с путями другого проекта под тем же ключом был бы ошибкой. std::source_location
+    # читает путь из самих маркеров, поэтому такой TU остаётся привязанным к своему проекту
+    if _BUILTIN_FILE.search(text) is not None:
+        return text
+    roots = (str(project_root), str(project_root).replace('\\', '\\\\'))
+
+    def replace(match: re.Match) -> str:
+        marker = match.group(0)
+        for root in roots:
+            marker = marker.replace(root, ROOT_TOKEN)
+        return marker
+
+    return _LINE_MARKER.sub(replace, text)
+
+
+def compiler_flags(compile_command: list[str], source: str) -> list[str]:
+    # Флаги без путей, зависящих от проекта: исходник, объект, depfile, include-каталоги и PCH
+    # (содержимое заголовков уже учтено в препроцессированном тексте)
+    flags = []
+    skip = False
+    for arg in compile_command[1:]:
+        if skip:
+            skip = False
+        elif arg in ('-o', '-MF', '-include', '-include-pch'):
+            skip = True
+        elif arg != source and not arg.startswith(('-I', '/I', '/Fo')):
+            flags.append(arg)
+    return flags
+
+
+class CompilationCache:
+    # ccache-подобный кэш: ключ — препроцессированный исходник + версия компилятора + флаги,
+    # значение — объектный файл и вывод компилятора. Пути проекта в маркерах строк заменяются на ROOT_TOKEN,
+    # поэтому кэш общий для разных проектов и запусков, пока исходник не встраивает свой путь в код.
+    def __init__(self, root: Path, max_size: int):
+        self.root = Path(root)
+        self.max_size = max_size
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats_path = self.root / 'stats.json'
+        try:
+            self.stats = json.loads(self._stats_path.read_text(encoding='UTF-8'))
+        except (OSError, ValueError):
+            self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.session = {'hits': 0, 'misses': 0}
+        # Размер кэша известен после первого обхода и дальше ведётся по записям этого процесса;
+        # соседние процессы тоже пишут в кэш, поэтому каждая чистка заново считает его обходом
+        self._size: int | None = None
+
+    def key(self, compile_command: list[str], compiler_info: dict, source: str, project_root: Path) -> str | None:
+        process = subprocess.run(
+            build_preprocess_command(compile_command, compiler_info),
+            cwd=project_root,
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
+        )
+        if process.returncode != 0:
+            return None
+        digest = hashlib.sha256()
+        digest.update(compiler_identity(compile_command[0]).encode('UTF-8'))
+        digest.update(compiler_info['type'].encode('UTF-8'))
+        digest.update('\0'.join(compiler_flags(compile_command, source)).encode('UTF-8'))
+        digest.update(normalize_line_markers(process.stdout, project_root).encode('UTF-8'))
+        return digest.hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str, object_path: Path, project_root: Path, depfile: Path | None = None) -> str | None:
+        entry = self._entry(key)
+        meta = entry / 'meta.json'
+        try:
+            data = json.loads(meta.read_text(encoding='UTF-8'))
+            output = data['output']
+            shutil.copyfile(entry / 'object', object_path)
+            if depfile is not None and data.get('depfile') is not None:
+                depfile.write_text(data['depfile'].replace(ROOT_TOKEN, str(project_root)), encoding='UTF-8')
+        except (OSError, ValueError, KeyError):
+            self._count('misses')
+            return None
+        os.utime(meta)  # LRU: время последнего доступа
+        self._count('hits')
+        return output.replace(ROOT_TOKEN, str(project_root))
+
+    def put(self, key: str, object_path: Path, output: str, project_root: Path, depfile: Path | None = None) -> None:
+        entry = self._entry(key)
+        temporary = entry.with_name(f'{key}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            data = {'output': output.replace(str(project_root), ROOT_TOKEN), 'depfile': None}
+            if depfile is not None and depfile.exists():
+                data['depfile'] = depfile.read_text(encoding='UTF-8').replace(str(project_root), ROOT_TOKEN)
+            temporary.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(object_path, temporary / 'object')
+            (temporary / 'meta.json').write_text(json.dumps(data), encoding='UTF-8')
+            if entry.exists():
+                shutil.rmtree(temporary)
+                return
+            size = sum(f.stat().st_size for f in temporary.iterdir())
+            temporary.rename(entry)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)
+            return
+        self._count('stores')
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+            if name in self.session:
+                self.session[name] += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def evict(self) -> None:
+        # Удаляет самые давно использованные записи, пока кэш не уложится в 90% max_size:
+        # запас не даёт чистке с полным обходом запускаться после каждой сборки
+        entries = []
+        total = 0
+        for meta in self.root.glob('*/*/meta.json'):
+            entry = meta.parent
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((meta.stat().st_mtime, size, entry))
+            except OSError:  # запись удалил соседний процесс
+                continue
+            total += size
+        if total > self.max_size:
+            entries.sort()
+            for _, size, entry in entries:
+                if total <= self.max_size * 0.9:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                self.stats['evictions'] += 1
+        with self._lock:
+            self._size = total
+
+    def save(self) -> None:
+        # Полный обход кэша — только при первом сохранении и когда записи процесса превысили max_size
+        if self._size is None or self._size > self.max_size:
+            self.evict()
+        with self._lock:
+            self._stats_path.write_text(json.dumps(self.stats, indent=1), encoding='UTF-8')
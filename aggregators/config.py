@@ -1,3 +1,4 @@
+import io
 import os
 import sys
 from pathlib import Path
@@ -19,7 +20,7 @@ all_models = [
 ]
 
 # Config loading
-config_path = Path(sys.argv[0]).parent / 'config.ini'
+config_path = Path(sys.argv[0]).resolve().parent / 'config.ini'
 general = configparser.ConfigParser()
 general.read(config_path)
 
@@ -31,7 +32,7 @@ def check_value(name: str, default: str) -> bool:
     return True
 
 
-main_path = Path(sys.argv[0]).parent
+main_path = Path(sys.argv[0]).resolve().parent
 
 check_value('COMPILER', 'clang')
 check_value('NAME', 'unnamed_project')
@@ -53,13 +54,84 @@ check_value('VSWHERE', _)
 check_value('GTEST_INCLUDE_DIR', r'C:\includes\googletest\include')
 check_value('GTEST_LIB_DIR', r'C:\includes\googletest\lib')
 
+check_value('BATCHING', 'false')
+check_value('BATCH_TOKENS', '4000')
+check_value('PROMPT_LAYOUT', 'inline')
+check_value('STREAMING', 'true')
+check_value('MAX_CONCURRENCY', '16')
+check_value('BUILD_CACHE', str(main_path / 'cache'))
+check_value('BUILD_CACHE_SIZE', '1024')
+check_value('SYNTAX_CHECK', 'true')
+check_value('CANDIDATES', '1')
+check_value('JOB_QUEUE', 'false')
+check_value('JOB_LEASE', '300')
+check_value('JOB_ATTEMPTS', '3')
+check_value('JOB_TOTAL_ATTEMPTS', '9')
+check_value('UNITY_BUILD', 'false')
+check_value('PCH', 'false')
+check_value('MAX_ERRORS', '0')
+check_value('DIAGNOSTICS_FORMAT', 'text')
+check_value('DIAGNOSTICS_LIMIT', '6000')
+check_value('TEST_JOBS', '0')
+check_value('TEST_TIMEOUT', '60')
+check_value('TEST_MEMORY_LIMIT', '1024')
+check_value('TEST_SHARDS', '0')
+
 if general['DEFAULT']['TESTING'] not in {'false', 'true'}:
     general['DEFAULT']['TESTING'] = 'false'
+if general['DEFAULT']['BATCHING'] not in {'false', 'true'}:
+    general['DEFAULT']['BATCHING'] = 'false'
+if not general['DEFAULT']['BATCH_TOKENS'].isdigit():
+    general['DEFAULT']['BATCH_TOKENS'] = '4000'
+if general['DEFAULT']['PROMPT_LAYOUT'] not in {'inline', 'prefix'}:
+    general['DEFAULT']['PROMPT_LAYOUT'] = 'inline'
+if not general['DEFAULT']['MAX_CONCURRENCY'].isdigit() or general['DEFAULT']['MAX_CONCURRENCY'] == '0':
+    general['DEFAULT']['MAX_CONCURRENCY'] = '16'
+if general['DEFAULT']['STREAMING'] not in {'false', 'true'}:
+    general['DEFAULT']['STREAMING'] = 'true'
+if general['DEFAULT']['SYNTAX_CHECK'] not in {'false', 'true'}:
+    general['DEFAULT']['SYNTAX_CHECK'] = 'true'
+if not general['DEFAULT']['CANDIDATES'].isdigit() or general['DEFAULT']['CANDIDATES'] == '0':
+    general['DEFAULT']['CANDIDATES'] = '1'
+if general['DEFAULT']['JOB_QUEUE'] not in {'false', 'true'}:
+    general['DEFAULT']['JOB_QUEUE'] = 'false'
+if not general['DEFAULT']['JOB_LEASE'].isdigit() or general['DEFAULT']['JOB_LEASE'] == '0':
+    general['DEFAULT']['JOB_LEASE'] = '300'
+if not general['DEFAULT']['JOB_ATTEMPTS'].isdigit() or general['DEFAULT']['JOB_ATTEMPTS'] == '0':
+    general['DEFAULT']['JOB_ATTEMPTS'] = '3'
+if not general['DEFAULT']['JOB_TOTAL_ATTEMPTS'].isdigit() or general['DEFAULT']['JOB_TOTAL_ATTEMPTS'] == '0':
+    general['DEFAULT']['JOB_TOTAL_ATTEMPTS'] = '9'
+if general['DEFAULT']['UNITY_BUILD'] not in {'false', 'true'}:
+    general['DEFAULT']['UNITY_BUILD'] = 'false'
+if general['DEFAULT']['PCH'] not in {'false', 'true'}:
+    general['DEFAULT']['PCH'] = 'false'
+if general['DEFAULT']['DIAGNOSTICS_FORMAT'] not in {'structured', 'text'}:
+    general['DEFAULT']['DIAGNOSTICS_FORMAT'] = 'text'
+if not general['DEFAULT']['DIAGNOSTICS_LIMIT'].isdigit() or general['DEFAULT']['DIAGNOSTICS_LIMIT'] == '0':
+    general['DEFAULT']['DIAGNOSTICS_LIMIT'] = '6000'
+if not general['DEFAULT']['TEST_JOBS'].isdigit():
+    general['DEFAULT']['TEST_JOBS'] = '0'
+if not general['DEFAULT']['TEST_TIMEOUT'].isdigit() or general['DEFAULT']['TEST_TIMEOUT'] == '0':
+    general['DEFAULT']['TEST_TIMEOUT'] = '60'
+if not general['DEFAULT']['TEST_SHARDS'].isdigit():
+    general['DEFAULT']['TEST_SHARDS'] = '0'
+if not general['DEFAULT']['TEST_MEMORY_LIMIT'].isdigit():
+    general['DEFAULT']['TEST_MEMORY_LIMIT'] = '1024'
+if not general['DEFAULT']['MAX_ERRORS'].isdigit():
+    general['DEFAULT']['MAX_ERRORS'] = '0'
+if not general['DEFAULT']['BUILD_CACHE_SIZE'].isdigit():
+    general['DEFAULT']['BUILD_CACHE_SIZE'] = '1024'
 if general['DEFAULT']['MODEL'] not in all_models and general['DEFAULT']['MODEL'] != 'auto':
     general['DEFAULT']['MODEL'] = 'auto'
 
-with open(config_path, 'w', encoding='UTF-8') as file:
-    general.write(file)
+# Воркеры стартуют одновременно: файл переписывается только при изменениях и атомарно,
+# чтобы соседний процесс не прочитал его обрезанным
+_text = io.StringIO()
+general.write(_text)
+if not config_path.exists() or config_path.read_text(encoding='UTF-8') != _text.getvalue():
+    _temporary = config_path.with_name(f'{config_path.name}.{os.getpid()}.tmp')
+    _temporary.write_text(_text.getvalue(), encoding='UTF-8')
+    os.replace(_temporary, config_path)
 
 if not os.path.isabs(general['DEFAULT']['SYSTEM_LOG']):
     general['DEFAULT']['SYSTEM_LOG'] = str(main_path / general['DEFAULT']['SYSTEM_LOG'])
@@ -73,10 +145,16 @@ if not os.path.isabs(general['DEFAULT']['PROMPTS']):
     general['DEFAULT']['PROMPTS'] = str(main_path / general['DEFAULT']['PROMPTS'])
 if not os.path.isabs(general['DEFAULT']['WORKSPACE']):
     general['DEFAULT']['WORKSPACE'] = str(main_path / general['DEFAULT']['WORKSPACE'])
+if not os.path.isabs(general['DEFAULT']['BUILD_CACHE']):
+    general['DEFAULT']['BUILD_CACHE'] = str(main_path / general['DEFAULT']['BUILD_CACHE'])
 if not os.path.isabs(general['DEFAULT']['TASK']):
     general['DEFAULT']['TASK'] = str(main_path / general['DEFAULT']['TASK'])
 
-if len(general.sections()) > 1:
+# --section=<name> выбирает секцию без вопроса (для скриптов и фоновых процессов)
+_section = next((arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--section=')), None)
+if _section == 'DEFAULT' or _section in general.sections():
+    config = general[_section]
+elif len(general.sections()) > 1:
     print('Choose section:\n  0. DEFAULT\n' + '\n'.join(f'  {i + 1}. {s}' for i, s in enumerate(general.sections())))
     answer = input('>>> ').strip()
     while not answer.isdigit() or not 0 <= int(answer) <= len(general.sections()):
@@ -0,0 +1,193 @@
+import json
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from time import time as now
+from typing import Dict, Iterable, List, Optional
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    total_attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    result TEXT,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS dependencies (
+    job TEXT NOT NULL,
+    dependency TEXT NOT NULL,
+    PRIMARY KEY (job, dependency)
+);
+CREATE INDEX IF NOT EXISTS dependencies_by_dependency ON dependencies (dependency);
+'''
+
+# Задача готова, если она свободна (или её аренда истекла) и все её зависимости выполнены;
+# порядок вставки — топологический, поэтому первой берётся самая ранняя
+_READY = '''
+SELECT id, kind, payload, attempts FROM jobs
+WHERE (state = 'pending' OR (state = 'leased' AND lease_until < ?))
+  AND NOT EXISTS (
+    SELECT 1 FROM dependencies JOIN jobs AS dependency ON dependency.id = dependencies.dependency
+    WHERE dependencies.job = jobs.id AND dependency.state != 'done'
+  )
+ORDER BY rowid LIMIT 1
+'''
+
+
+class JobQueue:
+    # Долговечная очередь задач в SQLite-файле рабочей папки. Координатор добавляет задачи с зависимостями,
+    # воркеры (процессы, в том числе на других машинах с общей папкой) арендуют их на время lease,
+    # продлевают аренду heartbeat'ом и завершают. Задача упавшего воркера возвращается в очередь, когда
+    # истекает аренда. WAL не используется: он требует общей памяти и не работает на сетевых дисках.
+    __slots__ = ('path',)
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+            columns = {name for _, name, *_ in connection.execute('PRAGMA table_info(jobs)')}
+            if 'total_attempts' not in columns:  # очередь, созданная до появления общего счётчика попыток
+                connection.execute('ALTER TABLE jobs ADD COLUMN total_attempts INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self) -> sqlite3.Connection:
+        # Отдельное соединение на операцию: очередь используется из нескольких потоков (heartbeat)
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def add(self, jobs: Iterable[Dict]) -> int:
+        # Повторное добавление той же задачи игнорируется, поэтому перезапуск координатора не теряет
+        # выполненную работу. Задача — {'id', 'kind', 'payload', 'deps'}
+        added = 0
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            for job in jobs:
+                cursor = connection.execute(
+                    'INSERT OR IGNORE INTO jobs (id, kind, payload, updated) VALUES (?, ?, ?, ?)',
+                    (job['id'], job['kind'], json.dumps(job.get('payload', {})), now())
+                )
+                added += cursor.rowcount
+                connection.executemany(
+                    'INSERT OR IGNORE INTO dependencies (job, dependency) VALUES (?, ?)',
+                    ((job['id'], dependency) for dependency in job.get('deps', ()))
+                )
+            connection.execute('COMMIT')
+        return added
+
+    def retry_failed(self, max_total_attempts: int) -> int:
+        # Новый запуск координатора даёт упавшим задачам (и отменённым из-за них) новые попытки, пока
+        # общий счётчик попыток задачи не достиг max_total_attempts: он, в отличие от attempts, между
+        # запусками не сбрасывается. Задачи, зависящие от исчерпавших бюджет, снова отменяются
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            retried = {
+                job_id for job_id, in connection.execute(
+                    "SELECT id FROM jobs WHERE state = 'failed' AND total_attempts < ?", (max_total_attempts,)
+                )
+            }
+            connection.executemany(
+                "UPDATE jobs SET state = 'pending', attempts = 0, worker = NULL, updated = ? WHERE id = ?",
+                ((now(), job_id) for job_id in retried)
+            )
+            while True:
+                cancelled = connection.execute(
+                    "SELECT dependencies.job, dependencies.dependency FROM dependencies "
+                    "JOIN jobs ON jobs.id = dependencies.job "
+                    "JOIN jobs AS dependency ON dependency.id = dependencies.dependency "
+                    "WHERE jobs.state = 'pending' AND dependency.state = 'failed'"
+                ).fetchall()
+                if not cancelled:
+                    break
+                connection.executemany(
+                    "UPDATE jobs SET state = 'failed', result = ?, updated = ? WHERE id = ?",
+                    ((json.dumps({'error': f'dependency "{dependency}" failed'}), now(), job_id)
+                     for job_id, dependency in cancelled)
+                )
+                retried.difference_update(job_id for job_id, _ in cancelled)
+            connection.execute('COMMIT')
+        return len(retried)
+
+    def lease(self, worker: str, duration: float) -> Optional[Dict]:
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(_READY, (now(),)).fetchone()
+            if row is None:
+                connection.execute('COMMIT')
+                return None
+            job_id, kind, payload, attempts = row
+            connection.execute(
+                "UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, attempts = ?, "
+                "total_attempts = total_attempts + 1, updated = ? WHERE id = ?",
+                (worker, now() + duration, attempts + 1, now(), job_id)
+            )
+            connection.execute('COMMIT')
+        return {'id': job_id, 'kind': kind, 'payload': json.loads(payload), 'attempts': attempts + 1}
+
+    def _update_owned(self, job_id: str, worker: str, assignments: str, values: tuple) -> bool:
+        # Меняет только задачу, которую этот воркер всё ещё держит: если аренда истекла и задачу
+        # забрал другой, поздний ответ игнорируется
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                values + (now(), job_id, worker)
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str, worker: str, duration: float) -> bool:
+        return self._update_owned(job_id, worker, 'lease_until = ?', (now() + duration,))
+
+    def complete(self, job_id: str, worker: str, result: Optional[Dict] = None) -> bool:
+        return self._update_owned(job_id, worker, "state = 'done', result = ?", (json.dumps(result or {}),))
+
+    def fail(self, job_id: str, worker: str, error: str, max_attempts: int) -> bool:
+        # Пока попытки не исчерпаны, задача возвращается в очередь; иначе она и все зависящие от неё
+        # помечаются failed, чтобы воркеры не ждали их вечно
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                "SELECT attempts FROM jobs WHERE id = ? AND worker = ? AND state = 'leased'", (job_id, worker)
+            ).fetchone()
+            if row is None:
+                connection.execute('COMMIT')
+                return False
+            result = json.dumps({'error': error})
+            if row[0] < max_attempts:
+                connection.execute(
+                    "UPDATE jobs SET state = 'pending', worker = NULL, result = ?, updated = ? WHERE id = ?",
+                    (result, now(), job_id)
+                )
+            else:
+                failed = [job_id]
+                for current in failed:
+                    connection.execute(
+                        "UPDATE jobs SET state = 'failed', result = ?, updated = ? WHERE id = ?",
+                        (result if current == job_id else json.dumps({'error': f'dependency "{job_id}" failed'}),
+                         now(), current)
+                    )
+                    failed += [
+                        dependent for dependent, in connection.execute(
+                            "SELECT job FROM dependencies JOIN jobs ON jobs.id = dependencies.job "
+                            "WHERE dependency = ? AND state != 'failed'", (current,)
+                        )
+                    ]
+            connection.execute('COMMIT')
+        return True
+
+    def counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as connection:
+            return dict(connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    def remaining(self) -> int:
+        # Задачи, которые ещё будут выполнены: свободные и арендованные
+        counts = self.counts()
+        return counts.get('pending', 0) + counts.get('leased', 0)
+
+    def failed(self) -> List[Dict]:
+        with closing(self._connect()) as connection:
+            return [
+                {'id': job_id, **json.loads(result or '{}')}
+                for job_id, result in connection.execute("SELECT id, result FROM jobs WHERE state = 'failed'")
+            ]
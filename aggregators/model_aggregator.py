@@ -2,11 +2,106 @@ from aggregators.utils import get_http_proxies, get_https_proxies, logged, log,
 from aggregators import utils
 import requests
 from aggregators.config import api_link, config
-from time import sleep
+from time import sleep, perf_counter as now
+from typing import Callable, Iterator
+from contextlib import contextmanager
+import json
+import threading
 
 proxies: dict[str: str, str: str] = {'http': get_http_proxies(), 'https': get_https_proxies()}
 
 
+class AdaptiveLimit:
+    # AIMD-окно одновременных запросов к одной паре (модель, прокси): пока ответы успешны и задержка
+    # не выросла, окно растёт на 1 за каждое окно успешных ответов; 429, 5xx и таймауты делят его пополам,
+    # но не чаще раза на окно — запросы, ушедшие до предыдущего сокращения, его не повторяют
+    increase = 1.0
+    decrease = 0.5
+    latency_tolerance = 3.0
+
+    def __init__(self, name: str, initial: float = 2.0, maximum: float = 16.0):
+        self.name = name
+        self.limit = min(initial, maximum)
+        self.maximum = maximum
+        self.in_flight = 0
+        self.latency = None
+        self.best_latency = None
+        self._cut_at = 0.0
+        self._condition = threading.Condition()
+
+    def __str__(self) -> str:
+        return f'{self.name}: {self.in_flight}/{int(self.limit)} in flight'
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, outcome: str, start: float) -> None:
+        # outcome: 'ok', 'overload' (429, 5xx, таймаут) или 'error' (прочие ошибки — окно не меняется)
+        latency = now() - start
+        with self._condition:
+            self.in_flight -= 1
+            previous = int(self.limit)
+            if outcome == 'overload':
+                if start >= self._cut_at:
+                    self.limit = max(1.0, self.limit * self.decrease)
+                    self._cut_at = now()
+            elif outcome == 'ok':
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                self.best_latency = min(self.best_latency or latency, latency)
+                if self.latency <= self.best_latency * self.latency_tolerance:
+                    self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            self._condition.notify_all()
+            if int(self.limit) != previous:
+                log('Concurrency limit of {} was {} to {} ({})', self.name,
+                    'raised' if int(self.limit) > previous else 'cut', int(self.limit), outcome)
+
+
+limits: dict[tuple[str, str], AdaptiveLimit] = {}
+limits_lock = threading.Lock()
+
+
+def current_limit(model: str | None = None) -> AdaptiveLimit:
+    key = (model or utils.context['model'], proxies['https'] or proxies['http'] or 'direct')
+    with limits_lock:
+        if key not in limits:
+            limits[key] = AdaptiveLimit(f'{key[0]} via {key[1]}', maximum=float(config['MAX_CONCURRENCY']))
+        return limits[key]
+
+
+@contextmanager
+def request_slot(model: str | None = None) -> Iterator[dict[str, str]]:
+    # Слот в окне пары (модель, прокси) занят всё время внутри with, в том числе пока читается поток.
+    # Исход выставляет вызывающий код; обрыв соединения и таймаут считаются перегрузкой
+    limit = current_limit(model)
+    limit.acquire()
+    start = now()
+    slot = {'outcome': 'error'}
+    try:
+        yield slot
+    except (ConnectionError, requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        slot['outcome'] = 'overload'
+        raise
+    finally:
+        limit.release(slot['outcome'], start)
+
+
+def response_outcome(response: requests.Response) -> str:
+    if response.status_code == 429 or response.status_code >= 500:
+        return 'overload'
+    return 'ok' if response.status_code == 200 else 'error'
+
+
+def post(send: dict) -> requests.Response:
+    # Обычный запрос: requests читает тело целиком, поэтому слот освобождается вместе с ответом
+    with request_slot(send['model']) as slot:
+        response = requests.post(api_link, json=send, proxies=proxies, timeout=1000)
+        slot['outcome'] = response_outcome(response)
+        return response
+
+
 @logged
 def next_proxies() -> None:
     global proxies
@@ -44,15 +139,16 @@ def next_model(messages: list[dict[str: str, str: str]]) -> requests.Response:
 
 
 @logged
-def ask(messages: list[dict[str: str]], what: str = None) -> str:
+def ask(messages: list[dict[str: str]], what: str = None, model: str | None = None) -> str:
+    # model фиксирует модель для этого вызова: параллельные запросы не зависят от смены context['model']
     what = (' for ' + what) if what is not None else ''
-    send = {'model': utils.context['model'], 'request': {'messages': messages}}
+    send = {'model': model or utils.context['model'], 'request': {'messages': messages}}
     result = None
     response = None
     while True:
         try:
-            log(f'Trying to ask model{what}...')
-            response = requests.post(api_link, json=send, proxies=proxies, timeout=1000)
+            log(f'Trying to ask model{what} ({current_limit(send["model"])})...')
+            response = post(send)
         except requests.exceptions.ProxyError as e:
             wrn('Proxy error. Error\'s content: {}. Changing proxies and trying again...', e)
             next_proxies()
@@ -87,5 +183,85 @@ def ask(messages: list[dict[str: str]], what: str = None) -> str:
     return result
 
 
-def simply(text: str, *, role: str = 'user') -> list[dict[str: str]]:
+@logged
+def ask_stream(messages: list[dict[str: str]], consume: Callable[[str], None], what: str = None) -> str:
+    # Как ask, но ответ читается потоком и каждый кусок сразу отдаётся consume.
+    # ValueError из consume закрывает соединение, не дожидаясь конца ответа.
+    # Если сервер отвечает не потоком (или streaming = false), consume получает весь ответ целиком
+    if config['STREAMING'] == 'false':
+        result = ask(messages, what)
+        consume(result)
+        return result
+    label = (' for ' + what) if what is not None else ''
+    send = {'model': utils.context['model'], 'request': {'messages': messages, 'stream': True}}
+    while True:
+        with request_slot() as slot:
+            try:
+                log(f'Trying to ask model{label} (streaming, {current_limit()})...')
+                response = requests.post(api_link, json=send, proxies=proxies, timeout=1000, stream=True)
+            except requests.exceptions.ProxyError as e:
+                wrn('Proxy error. Error\'s content: {}. Changing proxies and trying again...', e)
+                next_proxies()
+                continue
+            except (ConnectionError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                slot['outcome'] = 'overload'
+                wrn('Connection error. Error\'s content: {}. Trying again...', e)
+                continue
+            except Exception as e:
+                wrn('Unexpected error. Error\'s content: {}. Trying again...', e)
+                continue
+            if response.status_code != 200 or 'text/event-stream' not in response.headers.get('Content-Type', ''):
+                slot['outcome'] = response_outcome(response)
+                response.close()
+                break
+            # Слот держится до конца потока: окно ограничивает число одновременно читаемых ответов
+            result = read_stream(response, consume)
+            slot['outcome'] = 'ok'
+            return result
+    wrn('Streaming is not available, waiting for the whole response...')
+    result = ask(messages, what)
+    consume(result)
+    return result
+
+
+def read_stream(response: requests.Response, consume: Callable[[str], None]) -> str:
+    parts = []
+    answer = {'choices': [{'message': {'role': 'assistant'}, 'finish_reason': None}],
+              'usage': {'prompt_tokens': 0, 'completion_tokens': 0}}
+    with response:
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line.removeprefix('data:').strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(data)
+                    choice = chunk['choices'][0] if chunk.get('choices') else {}
+                except (ValueError, AttributeError):
+                    continue
+                answer.update({key: chunk[key] for key in ('id', 'created', 'model', 'usage') if chunk.get(key)})
+                answer['choices'][0]['finish_reason'] = choice.get('finish_reason') or \
+                    answer['choices'][0]['finish_reason']
+                delta = (choice.get('delta') or {}).get('content')
+                if delta:
+                    parts.append(delta)
+                    consume(delta)
+        except requests.exceptions.RequestException as e:
+            raise ConnectionError(f'Stream was interrupted: {e}') from e
+    result = ''.join(parts)
+    answer['choices'][0]['message']['content'] = result
+    log('Response has been received successfully!')
+    utils.write_answer(answer)
+    return result
+
+
+def simply(text: str | tuple[str, str], *, role: str = 'user') -> list[dict[str: str]]:
+    # Кортеж (префикс, суффикс) от utils.prompt: общий префикс этапа идёт отдельным system-сообщением,
+    # чтобы провайдер мог переиспользовать его кэш между запросами
+    if isinstance(text, tuple):
+        prefix, suffix = text
+        return [{'role': 'system', 'content': prefix}, {'role': role, 'content': suffix}]
     return [{'role': role, 'content': text}]
+
@@ -1,94 +1,346 @@
 import os
 import re
+import json
+import typing
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import urlparse, unquote
 
 
-def parse_compiler_output(output: str) -> tuple[list[dict], list[dict]]:
-    errors = []
-    warnings = []
+# Одна регулярка на все форматы: ищется отличительный фрагмент диагностики, а имя файла —
+# всё, что стоит слева от него (для GCC/Clang, MSVC и ссылок на LNK)
+_DIAGNOSTIC = re.compile(
+    # GCC/Clang compile
+    r':(?P<gnu_line>\d+):(?P<gnu_column>\d+): '
+    r'(?P<gnu_type>fatal error|error|warning|note): (?P<gnu_message>.+)'
+    # MSVC compile
+    r'|\((?P<msvc_line>\d+),(?P<msvc_column>\d+)\): '
+    r'(?P<msvc_type>error|warning) (?P<msvc_code>C\d+): (?P<msvc_message>.+)'
+    # Common link
+    r'|^(?P<link_type>LINK|ld): (?P<link_message>.*)'
+    # MSVC link
+    r'|: (?P<lnk_type>warning|fatal error|error) (?P<lnk_code>LNK\d+): (?P<lnk_message>.+)'
+    # GCC/Clang link
+    r'|^undefined reference to `(?P<undefined_symbol>.+)\''
+)
+_WITH_FILE = {'gnu_message', 'msvc_message', 'lnk_message'}
+# Строка исходника под диагностикой GCC 9+: '   12 |     code' и '      |     ^~~~'
+_SOURCE_LINE = re.compile(r'\s*\d*\s\|')
+
+
+def _gcc_location(location: dict) -> tuple[str, int, int]:
+    caret = location.get('caret', {})
+    return os.path.normpath(caret.get('file', '')), caret.get('line', 0), caret.get('column', 0)
+
+
+def _from_gcc_json(diagnostic: dict) -> dict:
+    # Формат GCC -fdiagnostics-format=json: вложенные note и fix-it уходят в context
+    file, line, column = _gcc_location(diagnostic['locations'][0]) if diagnostic.get('locations') else ('.', 0, 0)
+    context = []
+    for child in diagnostic.get('children', []):
+        child_file, child_line, child_column = _gcc_location(child['locations'][0]) \
+            if child.get('locations') else ('.', 0, 0)
+        context.append(f'{child_file}:{child_line}:{child_column}: {child["kind"]}: {child["message"]}')
+    for fixit in diagnostic.get('fixits', []):
+        fix_file, fix_line, fix_column = _gcc_location({'caret': fixit['start']})
+        context.append(f'fix-it: {fix_file}:{fix_line}:{fix_column}: replace with "{fixit["string"]}"')
+    return {
+        'type': diagnostic['kind'],
+        'file': file,
+        'line': line,
+        'column': column,
+        'message': diagnostic['message'],
+        'code': diagnostic.get('option', ''),
+        'context': '\n'.join(context)
+    }
+
+
+def _sarif_location(location: dict) -> tuple[str, int, int]:
+    physical = location.get('physicalLocation', {})
+    uri = physical.get('artifactLocation', {}).get('uri', '')
+    path = unquote(urlparse(uri).path) if uri.startswith('file:') else uri
+    region = physical.get('region', {})
+    return os.path.normpath(path), region.get('startLine', 0), region.get('startColumn', 0)
+
+
+def _from_sarif(result: dict) -> dict:
+    # SARIF 2.1.0 (clang -fdiagnostics-format=sarif, gcc sarif-stderr)
+    file, line, column = _sarif_location(result['locations'][0]) if result.get('locations') else ('.', 0, 0)
+    context = []
+    for related in result.get('relatedLocations', []):
+        related_file, related_line, related_column = _sarif_location(related)
+        context.append(f'{related_file}:{related_line}:{related_column}: note: '
+                       f'{related.get("message", {}).get("text", "")}')
+    for fix in result.get('fixes', []):
+        for change in fix.get('artifactChanges', []):
+            uri = change.get('artifactLocation', {}).get('uri', '')
+            for replacement in change.get('replacements', []):
+                fix_file, fix_line, fix_column = _sarif_location({'physicalLocation': {
+                    'artifactLocation': {'uri': uri}, 'region': replacement.get('deletedRegion', {})
+                }})
+                text = replacement.get('insertedContent', {}).get('text', '')
+                context.append(f'fix-it: {fix_file}:{fix_line}:{fix_column}: replace with "{text}"')
+    rule = result.get('ruleId', '')
+    return {
+        'type': {'none': 'note'}.get(result.get('level', 'warning'), result.get('level', 'warning')),
+        'file': file,
+        'line': line,
+        'column': column,
+        'message': result.get('message', {}).get('text', ''),
+        'code': rule if rule.startswith('-W') else '',
+        'context': '\n'.join(context)
+    }
 
-    patterns = [
-        re.compile(  # GCC/Clang compile
-            r'^(?P<file>.+?):'
-            r'(?P<line>\d+):'
-            r'(?P<column>\d+): '
-            r'(?P<type>fatal error|error|warning|note): '
-            r'(?P<message>.+)'
-        ),
-        re.compile(  # MSVC compile
-            r'^(?P<file>.+?)'
-            r'\((?P<line>\d+),(?P<column>\d+)\): '
-            r'(?P<type>error|warning) (?P<code>C\d+): '
-            r'(?P<message>.+)'
-        ),
-        re.compile(  # Common link
-            r'^(?P<type>LINK|ld): '
-            r'(?P<message>.*)'
-        ),
-        re.compile(  # MSVC link
-            r'^(?P<file>.+?): '
-            r'(?P<type>warning|fatal error) (?P<code>LNK\d+): '
-            r'(?P<message>.+)'
-        ),
-        re.compile(  # GCC/Clang link
-            r'^undefined reference to `(?P<symbol>.+)\''
-        )
-    ]
 
+def parse_structured_diagnostics(text: str) -> list[dict] | None:
+    # Машиночитаемая диагностика GCC (JSON) или SARIF; None — если это не она
+    try:
+        document = json.loads(text)
+    except ValueError:
+        return None
+    try:
+        if isinstance(document, list):
+            return [_from_gcc_json(diagnostic) for diagnostic in document]
+        if isinstance(document, dict) and 'runs' in document:
+            return [_from_sarif(result) for run in document['runs'] for result in run.get('results', [])]
+    except (KeyError, TypeError, AttributeError, IndexError):
+        pass
+    return None
+
+
+def iter_compiler_output(lines: typing.Iterable[str]) -> typing.Iterator[dict]:
+    # Потоковый разбор: одна комбинированная регулярка на строку, диагностика отдаётся,
+    # как только закончились её строки контекста. JSON/SARIF-документы в потоке разбираются
+    # целиком, остальные строки (компоновщик, сбои драйвера) — регуляркой
     current_entry = None
     context_lines = []
 
-    for line in output.split('\n'):
-        line = line.strip()
+    for raw in lines:
+        line = raw.strip()
+
+        if line.startswith(('[{', '[]', '{"')):
+            # GCC и clang печатают документ одной строкой в конце работы
+            structured = parse_structured_diagnostics(line)
+            if structured is not None:
+                if current_entry:
+                    current_entry['context'] = '\n'.join(context_lines)
+                    yield current_entry
+                    current_entry = None
+                    context_lines = []
+                yield from structured
+                continue
 
         if current_entry:
-            if any(c in line for c in ('^', '~', '>')) or line.startswith('   '):
+            # Отступ проверяется до strip: строки исходника и продолжения сообщений идут с отступом
+            if any(c in line for c in ('^', '~', '>')) or raw.startswith('   ') or _SOURCE_LINE.match(raw):
                 context_lines.append(line)
                 continue
             else:
                 # Фиксация собранного контекста
                 current_entry['context'] = '\n'.join(context_lines)
-                if 'error' in current_entry['type'].lower():
-                    errors.append(current_entry)
-                else:
-                    warnings.append(current_entry)
+                yield current_entry
                 current_entry = None
                 context_lines = []
 
-        for pattern in patterns:
-            if match := pattern.search(line):
-                groups = match.groupdict()
-                entry = {
-                    'type': groups.get('type', 'error').lower(),
-                    'file': os.path.normpath(groups.get('file', '')),
-                    'line': int(groups.get('line', 0)),
-                    'column': int(groups.get('column', 0)),
-                    'message': groups.get('message', line),
-                    'code': groups.get('code', ''),
-                    'context': ''
-                }
+        match = _DIAGNOSTIC.search(line)
+        if match is not None and match.start() == 0 and match.lastgroup in _WITH_FILE:
+            match = _DIAGNOSTIC.search(line, 1)  # имя файла не может быть пустым
+        if match is None:
+            continue
+        kind = match.lastgroup.split('_', 1)[0]
+        entry = {
+            'type': (match[kind + '_type'] or 'error').lower() if kind != 'undefined' else 'error',
+            'file': os.path.normpath(line[:match.start()] if match.lastgroup in _WITH_FILE else ''),
+            'line': int(match[kind + '_line'] or 0) if kind in ('gnu', 'msvc') else 0,
+            'column': int(match[kind + '_column'] or 0) if kind in ('gnu', 'msvc') else 0,
+            'message': match[kind + '_message'] if kind != 'undefined' else line,
+            'code': match[kind + '_code'] or '' if kind in ('msvc', 'lnk') else '',
+            'context': ''
+        }
 
-                if 'LNK' in entry['code'] or 'LINK' in entry['type']:
-                    entry['stage'] = 'linking'
-                elif 'undefined reference' in line:
-                    entry.update({
-                        'type': 'error',
-                        'stage': 'linking',
-                        'message': f"Undefined symbol: {groups['symbol']}"
-                    })
+        if 'LNK' in entry['code'] or 'LINK' in entry['type']:
+            entry['stage'] = 'linking'
+        elif kind == 'undefined':
+            entry.update({
+                'type': 'error',
+                'stage': 'linking',
+                'message': f"Undefined symbol: {match['undefined_symbol']}"
+            })
 
-                current_entry = entry
-                break
+        current_entry = entry
 
     if current_entry:
         current_entry['context'] = '\n'.join(context_lines)
-        if 'error' in current_entry['type'].lower():
-            errors.append(current_entry)
-        else:
-            warnings.append(current_entry)
+        yield current_entry
+
 
+def parse_compiler_output(output: str) -> tuple[list[dict], list[dict]]:
+    errors = []
+    warnings = []
+    for entry in iter_compiler_output(output.split('\n')):
+        if 'error' in entry['type']:
+            errors.append(entry)
+        else:
+            warnings.append(entry)
     return errors, warnings
 
 
+_QUOTED = re.compile(r"[‘'\"]([^’'\"\n]+)[’'\"]")
+_NOT_SYMBOLS = {
+    'int', 'char', 'bool', 'void', 'auto', 'long', 'short', 'float', 'double', 'unsigned', 'signed', 'const',
+    'std', 'class', 'struct', 'return', 'if', 'else', 'for', 'while', 'operator', 'this', 'size_t'
+}
+
+
+class DiagnosticsReducer:
+    # Сжимает поток диагностик для промпта исправления: одинаковые (по нормализованному сообщению
+    # и месту) сливаются со счётчиком, ошибки про тот же символ, что и более ранняя, считаются её
+    # каскадом. Память ограничена: не больше max_groups корневых записей и max_cascade примеров на
+    # каждую, остальное только подсчитывается
+    def __init__(self, max_groups: int = 50, max_cascade: int = 5, max_context_lines: int = 8):
+        self.max_groups = max_groups
+        self.max_cascade = max_cascade
+        self.max_context_lines = max_context_lines
+        self.groups: list[dict] = []
+        self.omitted = 0
+        self._keys: dict[tuple, tuple[dict, str]] = {}  # ключ дубликата -> (корневая запись, счётчик)
+        self._symbols: dict[str, dict] = {}  # символ -> корневая запись, где он встретился первым
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        message = re.sub(r'\s*\[-W[\w=+-]+]$', '', message)
+        return ' '.join(message.translate(str.maketrans('‘’“”', "''\"\"")).split())
+
+    def _symbols_of(self, message: str) -> set[str]:
+        message = message.split('; did you mean')[0]  # подсказка — не предмет ошибки
+        return {
+            symbol for symbol in (m.split('::')[-1].split('(')[0].strip() for m in _QUOTED.findall(message))
+            if symbol.isidentifier() and symbol not in _NOT_SYMBOLS
+        }
+
+    def _cap(self, context: str) -> str:
+        lines = context.split('\n')
+        if len(lines) > self.max_context_lines:
+            lines = lines[:self.max_context_lines] + [f'... {len(lines) - self.max_context_lines} more lines']
+        return '\n'.join(line[:200] for line in lines)
+
+    def add(self, entry: dict) -> None:
+        message = self.normalize(entry.get('message', ''))
+        key = (entry.get('type'), entry.get('file'), entry.get('line'), message)
+        count = entry.get('count', 1)
+        if key in self._keys:
+            group, counter = self._keys[key]
+            group[counter] += count
+            group['cascade_count'] += entry.get('cascade_count', 0)
+            if counter == 'count':
+                group['cascade'] += entry.get('cascade', [])[:self.max_cascade - len(group['cascade'])]
+            return
+        symbols = self._symbols_of(message)
+        root = next((self._symbols[symbol] for symbol in symbols if symbol in self._symbols), None)
+        if root is not None:
+            root['cascade_count'] += count + entry.get('cascade_count', 0)
+            if len(root['cascade']) < self.max_cascade:
+                root['cascade'].append(f'{entry.get("file")}:{entry.get("line")}: {message}')
+                self._keys[key] = root, 'cascade_count'
+            return
+        if len(self.groups) >= self.max_groups:
+            self.omitted += count + entry.get('cascade_count', 0)
+            return
+        group = {
+            **entry,
+            'message': message,
+            'context': self._cap(entry.get('context', '')),
+            'count': count,
+            'cascade': list(entry.get('cascade', []))[:self.max_cascade],
+            'cascade_count': entry.get('cascade_count', 0)
+        }
+        self.groups.append(group)
+        self._keys[key] = group, 'count'
+        for symbol in symbols:
+            self._symbols.setdefault(symbol, group)
+
+    def extend(self, entries: typing.Iterable[dict]) -> 'DiagnosticsReducer':
+        for entry in entries:
+            self.add(entry)
+        return self
+
+    def summary(self, limit: int) -> str:
+        # Не длиннее limit символов; корневые причины идут первыми, каскады — одной строкой на пример
+        parts = []
+        size = 0
+        for shown, group in enumerate(self.groups):
+            header = f'{group["file"]}:{group["line"]}:{group["column"]}: {group["type"]}: {group["message"]}'
+            if group['count'] > 1:
+                header += f' (x{group["count"]})'
+            lines = [header]
+            if group['context']:
+                lines.append(group['context'])
+            if group['cascade_count']:
+                lines.append(f'  {group["cascade_count"]} follow-up diagnostics caused by this one, e.g.:')
+                lines += [f'    {cascade}' for cascade in group['cascade']]
+            text = '\n'.join(lines)
+            if size + len(text) + 1 > limit and parts:
+                rest = sum(g['count'] + g['cascade_count'] for g in self.groups[shown:]) + self.omitted
+                parts.append(f'... {rest} more diagnostics omitted')
+                break
+            parts.append(text[:limit])
+            size += len(text) + 1
+        else:
+            if self.omitted:
+                parts.append(f'... {self.omitted} more diagnostics omitted')
+        return '\n'.join(parts)
+
+
+def parse_depfile(text: str) -> list[str]:
+    # Make-совместимый depfile (-MMD): "target: dep1 dep2 \\\n dep3"; пробелы в путях экранируются
+    text = text.replace('\\\r\n', ' ').replace('\\\n', ' ')
+    deps = []
+    for line in text.splitlines():
+        _, separator, rest = line.partition(': ')
+        if not separator:
+            continue
+        deps += [dep.replace('\\ ', ' ') for dep in re.split(r'(?<!\\) +', rest.strip()) if dep]
+    return deps
+
+
+def find_local_symbols(code: str) -> set[str]:
+    # Имена с внутренним связыванием (анонимные пространства имён и static на уровне файла),
+    # которые могут конфликтовать, если несколько .cpp склеить в одну единицу трансляции
+    code = re.sub(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', ' ', code, flags=re.DOTALL)
+    code = re.sub(r'^\s*#[^\n]*', '', code, flags=re.MULTILINE)
+    declaration = re.compile(
+        r'(?:\b(?:class|struct|union|enum(?:\s+class)?|using|namespace)\s+(?P<type>\w+))'
+        r'|(?P<name>\w+)\s*(?:\(|=|\[|$)'
+    )
+    symbols = set()
+    depth = 0
+    anonymous = []  # глубины, на которых открыты анонимные пространства имён
+    statement = ''
+    for token in re.finditer(r'[{};]|[^{};]+', code):
+        text = token.group()
+        local = bool(anonymous) and depth == anonymous[-1] + 1
+        if text == '{' and re.search(r'\bnamespace\s*$', statement):
+            anonymous.append(depth)
+            depth += 1
+            statement = ''
+        elif text in ('{', ';'):
+            if depth == 0 or local:
+                is_static = re.match(r'\s*static\b', statement) is not None
+                if local or is_static:
+                    if match := declaration.search(statement):
+                        symbols.add(match.group('type') or match.group('name'))
+            if text == '{':
+                depth += 1
+            statement = ''
+        elif text == '}':
+            depth -= 1
+            if anonymous and depth == anonymous[-1]:
+                anonymous.pop()
+            statement = ''
+        else:
+            statement += text
+    return symbols
+
+
 def parse_gtest_output(output: str) -> dict:
     result = {
         'total': 0,
@@ -98,48 +350,100 @@ def parse_gtest_output(output: str) -> dict:
     }
 
     test_case_pattern = re.compile(
-        r'^\[\s*(RUN|OK|FAILED)\s*] (\w+\.\w+)'
-    )
-
-    fail_pattern = re.compile(
-        r'^\[\s*FAILED\s*] (\w+\.\w+).*?(\d+ ms)'
+        r'^\[\s*(RUN|OK|FAILED)\s*] (\w+(?:/\w+)?\.\w+(?:/\w+)?)(?:.*?\((\d+ ms)\))?'
     )
 
     current_test = None
 
     for line in output.split('\n'):
         if line.startswith('[==========]'):
-            if m := re.search(r'(\d+) tests? from (\d+) test case', line):
+            if m := re.search(r'(\d+) tests? from (\d+) test (?:case|suite)s? ran', line):
                 result['total'] = int(m.group(1))
         elif match := test_case_pattern.match(line):
-            status, name = match.groups()
-            current_test = {
-                'name': name,
-                'status': 'RUNNING',
-                'errors': []
-            }
+            status, name, duration = match.groups()
+            if status == 'RUN':
+                current_test = {
+                    'name': name,
+                    'status': 'RUNNING',
+                    'errors': []
+                }
+            elif current_test is not None and current_test['name'] == name:
+                # Итог теста; строки FAILED из финальной сводки (без времени) сюда не попадают
+                current_test['status'] = 'PASSED' if status == 'OK' else 'FAILED'
+                current_test['time'] = int(duration.split()[0]) / 1000 if duration else 0.0
+                result['details'].append(current_test)
+                if status == 'OK':
+                    result['passed'] += 1
+                else:
+                    result['failed'].append({
+                        'name': name,
+                        'duration': duration or '',
+                        'output': '\n'.join(current_test['errors'] + [line.strip()])
+                    })
+                current_test = None
 
-        elif line.startswith('error:'):
-            if current_test:
-                current_test['errors'].append(line.strip())
+        elif current_test is not None and line.strip():
+            # Всё между RUN и итогом — сообщения проверок (Failure, Expected ..., пользовательский текст)
+            current_test['errors'].append(line.strip())
 
-        elif match := fail_pattern.match(line):
-            name, duration = match.groups()
-            result['failed'].append({
-                'name': name,
-                'duration': duration,
-                'output': line.strip()
-            })
-            result['details'].append(current_test)
-            current_test = None
+    if current_test is not None:
+        # Процесс упал или был убит посреди теста
+        current_test['status'] = 'CRASHED'
+        current_test['time'] = 0.0
+        result['details'].append(current_test)
+        result['failed'].append({
+            'name': current_test['name'],
+            'duration': '',
+            'output': '\n'.join(current_test['errors'])
+        })
+    if not result['total']:
+        result['total'] = len(result['details'])  # итоговой строки нет, если процесс не завершился сам
+    return result
 
-        elif 'PASSED' in line:
-            result['passed'] += 1
-            if current_test:
-                current_test['status'] = 'PASSED'
-                result['details'].append(current_test)
-                current_test = None
 
+def parse_gtest_report(path: str) -> dict | None:
+    # XML-отчёт --gtest_output=xml:path, разбираемый потоково: обработанные testcase сразу
+    # освобождаются. None — отчёта нет или он оборван (процесс упал), тогда нужен разбор текста
+    result = {
+        'total': 0,
+        'passed': 0,
+        'failed': [],
+        'details': []
+    }
+    try:
+        for _, element in ElementTree.iterparse(path, events=('end',)):
+            if element.tag != 'testcase':
+                if element.tag == 'testsuite':
+                    element.clear()
+                continue
+            if element.get('status', 'run') != 'run':  # DISABLED_ тесты
+                element.clear()
+                continue
+            name = f'{element.get("classname")}.{element.get("name")}'
+            time = float(element.get('time', 0) or 0)
+            failures = [
+                (failure.text or failure.get('message', '')).strip()
+                for failure in element if failure.tag in ('failure', 'error')
+            ]
+            skipped = element.get('result') == 'skipped' or element.find('skipped') is not None
+            result['total'] += 1
+            result['details'].append({
+                'name': name,
+                'status': 'FAILED' if failures else 'SKIPPED' if skipped else 'PASSED',
+                'errors': [line.strip() for failure in failures for line in failure.split('\n') if line.strip()],
+                'time': time
+            })
+            if failures:
+                result['failed'].append({
+                    'name': name,
+                    'duration': f'{round(time * 1000)} ms',
+                    'output': '\n'.join(failures)
+                })
+            elif not skipped:
+                result['passed'] += 1
+            element.clear()
+    except (OSError, ElementTree.ParseError):
+        return None
     return result
 
 
@@ -152,3 +456,208 @@ def parse_qa(text: str) -> list[list[str]]:
         answers = [ans.strip() for ans in re.findall(r'-\s*(.*?)\s*$', q, re.MULTILINE)]
         result.append([question] + answers)
     return result
+
+
+def parse_multi_file(text: str, expected: list[str]) -> dict[str, str]:
+    # Формат ответа: <<<FILE path>>> ... <<<END FILE>>>; файлы, которые не удалось выделить, не попадают в результат
+    pattern = re.compile(
+        r'^<<<FILE\s+(?P<path>[^>\n]+?)\s*>>>[ \t]*\n'
+        r'(?P<code>.*?)'
+        r'^<<<END FILE>>>',
+        re.DOTALL | re.MULTILINE
+    )
+    expected_paths = set(expected)
+    result = {}
+    for match in pattern.finditer(text):
+        path = match.group('path').strip().replace('\\', '/')
+        if path not in expected_paths or path in result:
+            continue
+        code = match.group('code').strip()
+        if code.startswith('```'):
+            code = code[code.find('\n') + 1:code.rfind('```')].strip()
+        if code:
+            result[path] = code
+    return result
+
+
+_MODULE = ('project', 'modules', '[]')
+_FILE = _MODULE + ('files', '[]')
+# Ожидаемый тип значения по пути от корня; элементы массивов обозначаются '[]'
+_STRUCTURE_TYPES = {
+    (): dict,
+    ('project',): dict,
+    ('project', 'modules'): list,
+    _MODULE: dict,
+    _MODULE + ('name',): str,
+    _MODULE + ('files',): list,
+    _FILE: dict,
+    _FILE + ('name',): str,
+    _FILE + ('is_template',): bool,
+    _FILE + ('deps',): list,
+    _FILE + ('deps', '[]'): str
+}
+_STRUCTURE_REQUIRED = {
+    (): ('project',),
+    ('project',): ('modules',),
+    _MODULE: ('name', 'files'),
+    _FILE: ('name', 'is_template', 'deps')
+}
+_WHITESPACE = frozenset(' \t\r\n')
+_SCALAR_END = _WHITESPACE | frozenset(',]}')
+
+
+def is_project_dependency(name: str) -> bool:
+    # Системные и сторонние заголовки (<cmath>, "boost/asio.hpp", std::vector) — не файлы проекта:
+    # ProjectTree их пропускает, и ошибкой считаются только голые имена, которых нет среди файлов
+    return not name.startswith('<') and not any(char in name for char in './:\\')
+
+
+class ProjectStructureParser:
+    # Потоковый разбор ответа ProjectStructure: feed принимает куски текста по мере прихода и бросает
+    # ValueError, как только JSON сломан или нарушает схему project.modules[].files[]. Неизвестные deps
+    # проверяются при закрытии modules — файл может ссылаться на объявленный позже; системные заголовки
+    # и прочие внешние зависимости не проверяются.
+    # Текст до первой '{' и после корневого объекта (ограждение ```json) пропускается.
+
+    def __init__(self):
+        self.result = None
+        self._stack = []  # [контейнер, путь, текущий ключ]
+        self._expect = 'value'
+        self._token = None
+        self._string = False
+        self._escape = False
+        self._position = 0
+        self._names = set()
+        self._deps = set()
+
+    def feed(self, chunk: str) -> None:
+        for char in chunk:
+            self._position += 1
+            if self._string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._string = False
+                    self._close_string()
+                    continue
+                self._token.append(char)
+                continue
+            if self._token is not None:
+                if char not in _SCALAR_END:
+                    self._token.append(char)
+                    continue
+                token, self._token = ''.join(self._token), None
+                try:
+                    self._value(json.loads(token))
+                except json.JSONDecodeError:
+                    self._fail(f'invalid literal {token!r}')
+            if char in _WHITESPACE or self.result is not None:
+                continue
+            if not self._stack:
+                if char == '{':
+                    self._open({})
+                continue
+            self._char(char)
+
+    def close(self) -> dict:
+        if self.result is None:
+            self._fail('unexpected end of JSON')
+        return self.result
+
+    def _char(self, char: str) -> None:
+        expect = self._expect
+        if expect in ('value', 'value_or_end'):
+            if char == '{':
+                self._open({})
+            elif char == '[':
+                self._open([])
+            elif char == '"':
+                self._start_string()
+            elif char == ']' and expect == 'value_or_end':
+                self._pop()
+            elif char in '-0123456789tfn':
+                self._token = [char]
+            else:
+                self._fail(f'unexpected {char!r}')
+        elif expect in ('key', 'key_or_end'):
+            if char == '"':
+                self._start_string()
+            elif char == '}' and expect == 'key_or_end':
+                self._pop()
+            else:
+                self._fail(f'expected a key, got {char!r}')
+        elif expect == 'colon':
+            if char != ':':
+                self._fail(f'expected \':\', got {char!r}')
+            self._expect = 'value'
+        elif char == ',':
+            self._expect = 'key' if isinstance(self._stack[-1][0], dict) else 'value'
+        elif char == ('}' if isinstance(self._stack[-1][0], dict) else ']'):
+            self._pop()
+        else:
+            self._fail(f'expected \',\' or the end of a container, got {char!r}')
+
+    def _start_string(self) -> None:
+        self._string = True
+        self._token = []
+
+    def _close_string(self) -> None:
+        raw, self._token = ''.join(self._token), None
+        try:
+            text = json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            self._fail(f'invalid string "{raw}"')
+        if self._expect in ('key', 'key_or_end'):
+            self._stack[-1][2] = text
+            self._expect = 'colon'
+        else:
+            self._value(text)
+
+    def _child_path(self) -> tuple:
+        container, path, key = self._stack[-1]
+        return path + (key if isinstance(container, dict) else '[]',)
+
+    def _attach(self, value) -> tuple:
+        if not self._stack:
+            return ()
+        container, path, key = self._stack[-1]
+        child = self._child_path()
+        expected = _STRUCTURE_TYPES.get(child)
+        if expected is not None and type(value) is not expected:
+            self._fail(f'"{"/".join(child)}" must be {expected.__name__}, got {type(value).__name__}')
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+        if child == _FILE + ('name',):
+            self._names.add(value)
+        elif child == _FILE + ('deps', '[]'):
+            self._deps.add(value)
+        return child
+
+    def _value(self, value) -> None:
+        self._attach(value)
+        self._expect = 'comma'
+
+    def _open(self, container: dict | list) -> None:
+        path = self._attach(container)
+        self._stack.append([container, path, None])
+        self._expect = 'key_or_end' if isinstance(container, dict) else 'value_or_end'
+
+    def _pop(self) -> None:
+        container, path, _ = self._stack.pop()
+        missing = [key for key in _STRUCTURE_REQUIRED.get(path, ()) if key not in container]
+        if missing:
+            self._fail(f'"{"/".join(path) or "root"}" has no {", ".join(missing)}')
+        if path == ('project', 'modules'):
+            unknown = sorted(name for name in self._deps - self._names if is_project_dependency(name))
+            if unknown:
+                self._fail(f'unknown dependencies: {", ".join(unknown)}')
+        self._expect = 'comma'
+        if not self._stack:
+            self.result = container
+
+    def _fail(self, message: str) -> typing.NoReturn:
+        raise ValueError(f'{message} (character {self._position})')
@@ -1,16 +1,74 @@
 import os
 import json
+import socket
+import threading
 import traceback
-from time import time as now
+from time import time as now, sleep
 from typing import Callable
 import shutil
+import tempfile
 
 import aggregators.utils
-from aggregators.model_aggregator import ask, simply
+from aggregators.model_aggregator import ask, ask_stream, simply
 from aggregators.utils import *
-from aggregators.parse_aggregator import parse_qa
+from aggregators.parse_aggregator import parse_qa, parse_multi_file, ProjectStructureParser
 import translate
-from aggregators.project_tree import ProjectTree
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from aggregators.project_tree import ProjectTree, FileNode
+from aggregators.build_aggregator import select_cpp_compiler, syntax_check_file
+from aggregators.job_queue import JobQueue
+
+
+def load_translations(path: Path) -> dict[str, str]:
+    try:
+        return json.loads(path.read_text(encoding='UTF-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+# MyMemory, провайдер translate по умолчанию, отклоняет запросы длиннее 500 символов
+TRANSLATION_CHUNK = 450
+# Так MyMemory сообщает об ошибке вместо перевода: превышен лимит длины запроса или дневная квота
+TRANSLATION_ERRORS = ('MYMEMORY WARNING', 'QUERY LENGTH LIMIT', 'INVALID LANGUAGE PAIR')
+
+
+def chunk_texts(texts: list[str], limit: int) -> list[list[str]]:
+    # Пачки строк, которые вместе с переводами строк не длиннее limit; длинный текст идёт отдельной пачкой
+    chunks = []
+    size = 0
+    for text in texts:
+        if not chunks or size + len(text) > limit:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(text)
+        size += len(text) + 1
+    return chunks
+
+
+def fetch_translations(texts: list[str], path: Path) -> dict[str, str]:
+    # Строки уходят пачками по строке на текст; кэш на диске — по исходному тексту, и в него попадают
+    # только пачки, переведённые без ошибки
+    translator = translate.Translator('ru')
+    result = {}
+    error = None
+    for chunk in chunk_texts(texts, TRANSLATION_CHUNK):
+        try:
+            translated = translator.translate('\n'.join(chunk)).split('\n')
+            if any(marker in line.upper() for line in translated for marker in TRANSLATION_ERRORS):
+                raise ValueError(translated[0])
+            if len(translated) != len(chunk):
+                raise ValueError(f'expected {len(chunk)} lines, got {len(translated)}')
+        except Exception as e:
+            error = e
+            continue
+        result.update(zip(chunk, (line.strip() for line in translated)))
+    if result:
+        cache = load_translations(path)
+        cache.update(result)
+        path.write_text(json.dumps(cache, indent=1, ensure_ascii=False), encoding='UTF-8')
+    if error is not None and not result:
+        raise error
+    return result
 
 
 @logged
@@ -20,23 +78,31 @@ def specify_task() -> bool:
     if not questions or any(not i for i in questions):
         return False
     answers = []
-    ru = translate.Translator('ru').translate
+    # Перевод идёт в фоне, пока пользователь отвечает; не успевшие переводы просто не показываются
+    translations_path = workspace_path / 'translations.json'
+    translations = load_translations(translations_path)
+    missing = list(dict.fromkeys(text for question in questions for text in question if text not in translations))
+    translator = ThreadPoolExecutor(max_workers=1)
+    pending = translator.submit(fetch_translations, missing, translations_path) if missing else None
+    translator.shutdown(wait=False)
     start_time = now()
     for i, question in enumerate(questions):
         to_ask = f'{i + 1}/{len(questions)}. {question[0]}\n' \
                  '    0. Make the best decision possible!\n' \
                  f'    {f"{chr(10)}    ".join(f"{j}. {a}" for j, a in enumerate(question[1:], 1))}\n' \
                  f'    {len(question)}. Custom answer'
-        try:
-            to_translate = [i.split('. ', 1)[1] for i in to_ask.strip().split('\n')]
-            to_translate = '\n'.join([to_translate[0]] + to_translate[2:-1])
-            translated = ru(to_translate).split('\n')
+        if pending is not None and pending.done():
+            try:
+                translations.update(pending.result())
+            except Exception as e:
+                wrn('Can not translate Q&A: {}', str(e)[:29] + '...')
+            pending = None
+        if all(text in translations for text in question):
+            translated = [translations[text] for text in question]
             translated = [translated[0]] + ['Прими наилучшее решение!'] + translated[1:] + ['Пользовательский ответ']
             translated = f'{i + 1}/{len(questions)}. {translated[0]}\n' + \
-                         '\n'.join(f'    {i}. {s}' for i, s in enumerate(translated[1:]))
+                         '\n'.join(f'    {j}. {s}' for j, s in enumerate(translated[1:]))
             to_ask += '\nПеревод:\n' + translated
-        except Exception as e:
-            wrn('Can not translate Q&A: {}', e[:29] + '...')
         answer = input(to_ask + '\n>>> ').strip()
         while not (answer.isdigit() and 0 <= int(answer) <= len(question)):
             print(f'Wrong answer! Please, enter number between 0 and {len(question)}!')
@@ -66,27 +132,100 @@ def rewrite_task_for_ai() -> bool:
 
 
 @logged
-def create_project_tree() -> bool:
-    response = ask(simply(prompt('ProjectStructure')), 'project structure')
-    if is_json(response) is False:
-        response = response[response.find('```') + 3:response.rfind('```')].removeprefix('json').strip()
+def repair_project_structure(project_structure: dict, project_tree: ProjectTree,
+                             attempts: int = 3) -> ProjectTree | None:
+    # Модели отправляются только файлы из циклов; остальная структура не перегенерируется
+    for attempt in range(1, attempts + 1):
+        cyclic = {node.name for component in project_tree.cycles for node in component}
+        files = {}
+        for module in project_structure['project']['modules']:
+            for file_info in module['files']:
+                if file_info['name'] in cyclic and file_info['name'] not in files:
+                    files[file_info['name']] = file_info
+        context['cycles'] = project_tree.describe_cycles()
+        context['cycle_files'] = [
+            {'module': project_tree[name].module, 'name': name,
+             'description': file_info.get('description', ''), 'deps': file_info['deps']}
+            for name, file_info in files.items()
+        ]
+        log('{}/{} repairing {} cyclic dependencies...', attempt, attempts, len(project_tree.cycle_edges))
+        response = ask(simply(prompt('RepairStructure')), 'project structure repair')
         if is_json(response) is False:
-            err('Response is not in JSON format')
-            return False
-    project_structure = json.loads(response)
+            response = response[response.find('```') + 3:response.rfind('```')].removeprefix('json').strip()
+            if is_json(response) is False:
+                wrn('Repair response is not in JSON format')
+                continue
+        repaired = json.loads(response)
+        if not isinstance(repaired, dict) or not isinstance(repaired.get('files'), list):
+            wrn('Repair response does not follow the schema')
+            continue
+        for fix in repaired['files']:
+            if isinstance(fix, dict) and fix.get('name') in files and isinstance(fix.get('deps'), list):
+                files[fix['name']]['deps'] = [dep for dep in fix['deps'] if isinstance(dep, str)]
+        project_tree = ProjectTree(project_structure)
+        if project_tree.has_cycle is False:
+            log('Project tree cycles were repaired')
+            return project_tree
+        wrn('Project tree still has cycle:\n{}', project_tree.describe_cycles())
+    err('Can not repair project tree cycles')
+    return None
+
+
+@logged
+def create_project_tree() -> bool:
+    # Схема проверяется по мере прихода ответа, и запрос обрывается на первой ошибке
+    parser = ProjectStructureParser()
+    try:
+        ask_stream(simply(prompt('ProjectStructure')), parser.feed, 'project structure')
+        project_structure = parser.close()
+    except (ValueError, ConnectionError) as e:
+        err('Response is not a valid project structure: {}', e)
+        return False
     project_tree = ProjectTree(project_structure)
     if project_tree.has_cycle is True:
-        err('Project tree has cycle')
-        return False
+        err('Project tree has cycle:\n{}', project_tree.describe_cycles())
+        project_tree = repair_project_structure(project_structure, project_tree)
+        if project_tree is None:
+            return False
     context['project_structure'] = project_structure
     context['project_tree'] = project_tree
-    if write_to_file('project_structure.json', response) is False:
+    if write_to_file('project_structure.json', json.dumps(project_structure, indent=1, ensure_ascii=False)) is False:
         return False
+    project_tree.save(workspace_path / 'project_structure.bin')
     shutil.rmtree(project_path)
+    (workspace_path / 'jobs.sqlite3').unlink(missing_ok=True)  # задачи старой структуры больше не нужны
     create_project_structure(project_structure, project_path)
     return True
 
 
+@logged
+def load_project_tree() -> bool:
+    # Возобновление работы: бинарный граф грузится сразу, JSON разбирается только если он новее
+    json_path = workspace_path / 'project_structure.json'
+    bin_path = workspace_path / 'project_structure.bin'
+    if bin_path.exists() and (not json_path.exists() or bin_path.stat().st_mtime >= json_path.stat().st_mtime):
+        try:
+            project_tree = ProjectTree.load(bin_path)
+        except (ValueError, OSError) as e:
+            wrn('Can not load "{}": {}', bin_path, e)
+        else:
+            context['project_structure'] = project_tree.project_data
+            context['project_tree'] = project_tree
+            log('Project tree was loaded from "{}"', bin_path)
+            return True
+    response = read_from_file('project_structure.json')
+    if response is None or is_json(response) is False:
+        raise RuntimeError('There is no valid project structure to resume from')
+    project_structure = json.loads(response)
+    project_tree = ProjectTree(project_structure)
+    if project_tree.has_cycle is True:
+        raise RuntimeError('Saved project tree has cycle')
+    context['project_structure'] = project_structure
+    context['project_tree'] = project_tree
+    project_tree.save(bin_path)
+    return True
+
+
 @logged
 def write_files_instructions() -> bool:
     project_tree: ProjectTree = context['project_tree']
@@ -106,24 +245,374 @@ def write_files_instructions() -> bool:
     return True
 
 
+def write_single_implementation(file: FileNode, is_header: bool) -> bool:
+    context['current_node'] = file
+    name = file.name + get_ext(is_header, file.is_template)
+    path = Path(file.module) / name
+    context['current_file'] = name
+    response = ask(simply(prompt('FileImplementation')), 'file implementation')
+    if '```' in response:
+        response = response[response.find('```') + 3:response.rfind('```')].removeprefix('cpp').strip()
+    return write_to_file(str(project_path / path), response)
+
+
+def implementation_batches(project_tree: ProjectTree) -> list[list[FileNode]]:
+    # Узлы одного уровня не зависят друг от друга, поэтому их можно генерировать одним запросом
+    budget = int(config['BATCH_TOKENS'])
+    batches = []
+    for level in project_tree.levels:
+        modules: dict[str, list[FileNode]] = {}
+        for file in level:
+            modules.setdefault(file.module, []).append(file)
+        for files in modules.values():
+            batch, size = [], 0
+            for file in files:
+                instruction = read_from_file(str((project_path / file.module / file.name).with_suffix('.md')))
+                tokens = estimate_tokens(instruction or '') * 2
+                if tokens > budget // 2:
+                    batches.append([file])
+                    continue
+                if batch and size + tokens > budget:
+                    batches.append(batch)
+                    batch, size = [], 0
+                batch.append(file)
+                size += tokens
+            if batch:
+                batches.append(batch)
+    return batches
+
+
+@logged
+def write_batch_implementation(batch: list[FileNode]) -> list[tuple[FileNode, bool]]:
+    targets = {}
+    for file in batch:
+        for is_header in (True, False):
+            targets[f'{file.module}/{file.name}{get_ext(is_header, file.is_template)}'] = (file, is_header)
+    project_tree: ProjectTree = context['project_tree']
+    names = {file.name for file in batch}
+    dependencies = {}
+    for file in batch:
+        for dependency in project_tree.get_subtree(file.name):
+            if dependency.name not in names:
+                dependencies[dependency.name] = dependency
+    text = '## Target Files\n'
+    for path, (file, is_header) in targets.items():
+        instruction = read_from_file(str((project_path / file.module / file.name).with_suffix('.md')))
+        text += f'### {path}\n```markdown\n{(instruction or "").strip()}\n```\n'
+    context['batch'] = text + render_dependencies(list(dependencies.values())[::-1])
+    response = ask(simply(prompt('BatchImplementation')), f'batch implementation of {len(targets)} files')
+    files = parse_multi_file(response, list(targets.keys()))
+    failed = []
+    for path, (file, is_header) in targets.items():
+        if path not in files or write_to_file(str(project_path / path), files[path]) is False:
+            failed.append((file, is_header))
+    if failed:
+        wrn('{}/{} files were not parsed from batch response', len(failed), len(targets))
+    return failed
+
+
+def implementation_path(file: FileNode, is_header: bool) -> Path:
+    return project_path / file.module / (file.name + get_ext(is_header, file.is_template))
+
+
+@logged
+def repair_implementation(file: FileNode, is_header: bool, errors: list[dict], attempts: int = 2) -> bool:
+    # Переспрашивает только сломанный файл, передавая модели его код и диагностики
+    compiler_info, include_dirs = context['syntax_check']
+    path = implementation_path(file, is_header)
+    for attempt in range(1, attempts + 1):
+        context['current_node'] = file
+        context['current_file'] = path.name
+        context['diagnostics'] = format_diagnostics(errors)
+        context['current_code'] = read_from_file(str(path)) or ''
+        log('{}/{} repairing "{}" ({} errors)...', attempt, attempts, path.name, len(errors))
+        response = ask(simply(prompt('FixImplementation')), 'file repair')
+        if '```' in response:
+            response = response[response.find('```') + 3:response.rfind('```')].removeprefix('cpp').strip()
+        if write_to_file(str(path), response) is False:
+            return False
+        errors, _ = syntax_check_file(compiler_info, str(path), include_dirs)
+        if not errors:
+            log('"{}" was repaired', path.name)
+            return True
+    wrn('"{}" still has {} errors after repair', path.name, len(errors))
+    return False
+
+
+@logged
+def write_candidates_implementation(file: FileNode,
+                                    is_header: bool,
+                                    k: int,
+                                    checker: ThreadPoolExecutor) -> tuple[list[dict], list[dict]] | None:
+    # k параллельных запросов; каждый ответ проверяется компилятором, как только пришёл.
+    # Остаётся первый (по приходу) вариант без ошибок с наименьшим числом предупреждений,
+    # а если таких нет — вариант с наименьшим числом ошибок, его дальше чинит repair_implementation
+    # Кандидаты лежат во временной папке под именем целевого файла: после падения они не остаются
+    # в проекте, а свои заголовки находят через include_dirs. Промпт и модель фиксируются до запуска
+    # потоков, чтобы запросы не зависели от context, который меняют другие вызовы
+    start = now()
+    context['current_node'] = file
+    path = implementation_path(file, is_header)
+    context['current_file'] = path.name
+    messages = simply(prompt('FileImplementation'))
+    model = context['model']
+    compiler_info, include_dirs = context['syntax_check']
+    candidates = []
+    with tempfile.TemporaryDirectory(prefix='candidates_') as directory:
+        with ThreadPoolExecutor(max_workers=k) as requests_pool:
+            responses = [
+                requests_pool.submit(ask, messages, f'file implementation, candidate {i + 1}/{k}', model)
+                for i in range(k)
+            ]
+            for index, future in enumerate(as_completed(responses)):
+                response = future.result()
+                if '```' in response:
+                    response = response[response.find('```') + 3:response.rfind('```')].removeprefix('cpp').strip()
+                candidate = Path(directory) / str(index) / path.name
+                candidate.parent.mkdir()
+                if write_to_file(str(candidate), response) is False:
+                    continue
+                check = checker.submit(syntax_check_file, compiler_info, str(candidate), include_dirs)
+                candidates.append((response, check))
+        if not candidates:
+            return None
+
+        results = []
+        for order, (response, check) in enumerate(candidates):
+            try:
+                errors, warnings = check.result()
+            except OSError as e:
+                wrn('Syntax check is unavailable: {}', e)
+                errors, warnings = [], []
+            # Диагностики ссылаются на временную копию, а чинить будут сам файл проекта
+            for diagnostic in errors + warnings:
+                if diagnostic.get('file', '').startswith(directory):
+                    diagnostic['file'] = str(path)
+            results.append((len(errors), len(warnings), order, response, errors, warnings))
+    valid = sum(1 for result in results if result[0] == 0)
+    _, _, _, response, errors, warnings = min(results, key=lambda result: result[:3])
+    if write_to_file(str(path), response) is False:
+        return None
+
+    elapsed = now() - start
+    stats = context.setdefault('candidate_stats', {'files': 0, 'solved': 0, 'candidates': 0, 'valid': 0, 'time': 0.0})
+    stats['files'] += 1
+    stats['solved'] += valid > 0
+    stats['candidates'] += len(results)
+    stats['valid'] += valid
+    stats['time'] += elapsed
+    log('"{}": {}/{} candidates valid, {:.1f}s', path.name, valid, len(results), elapsed)
+    return errors, warnings
+
+
+def resolve_syntax_checks(checks: dict[tuple[str, bool], tuple[FileNode, Future]], names: set[str] | None) -> None:
+    # Дожидается проверок файлов из names (None — всех) и чинит упавшие до генерации зависимых
+    for key in [key for key in checks if names is None or key[0] in names]:
+        file, future = checks.pop(key)
+        try:
+            errors, _ = future.result()
+        except OSError as e:
+            wrn('Syntax check is unavailable: {}', e)
+            continue
+        if errors:
+            wrn('"{}" has {} syntax errors', file.name + get_ext(key[1], file.is_template), len(errors))
+            repair_implementation(file, key[1], errors)
+
+
+def prepare_syntax_check(project_tree: ProjectTree) -> None:
+    include_dirs = sorted({str(project_path / file.module) for file in project_tree})
+    context['syntax_check'] = (select_cpp_compiler(config['COMPILER'], []), include_dirs)
+
+
 @logged
 def write_file_implementation() -> bool:
+    # Кандидатов выбирает синтаксическая проверка в этом процессе; без неё (и в очереди задач) их не из чего выбрать
+    if int(config['CANDIDATES']) > 1 and (config['SYNTAX_CHECK'] != 'true' or config['JOB_QUEUE'] == 'true'):
+        wrn('CANDIDATES = {} needs SYNTAX_CHECK = true and JOB_QUEUE = false, generating one implementation per file',
+            config['CANDIDATES'])
+    if config['JOB_QUEUE'] == 'true':
+        return distribute_file_implementation()
     project_tree: ProjectTree = context['project_tree']
     counter = 0
+    if config['BATCHING'] == 'true':
+        batches = implementation_batches(project_tree)
+    else:
+        batches = [[file] for file in project_tree]
+    checker = None
+    checks: dict[tuple[str, bool], tuple[FileNode, Future]] = {}
+    candidates = int(config['CANDIDATES'])
+    if config['SYNTAX_CHECK'] == 'true':
+        prepare_syntax_check(project_tree)
+        # Проверки идут в дочерних процессах компилятора, пока модель генерирует следующие файлы
+        checker = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    try:
+        for batch in batches:
+            if checker is not None:
+                names = {file.name for file in batch}
+                resolve_syntax_checks(checks, {
+                    dependency.name
+                    for file in batch
+                    for dependency in project_tree.get_subtree(file.name)
+                    if dependency.name not in names
+                })
+            if len(batch) > 1:
+                log('{}/{} writing batch of {} files...', counter + 1, project_tree.total_files, len(batch) * 2)
+                pending = write_batch_implementation(batch)
+            else:
+                pending = [(file, is_header) for file in batch for is_header in (True, False)]
+            for file, is_header in pending:
+                log('{}/{} writing "{}" implementation...', counter + 1, project_tree.total_files,
+                    file.name + get_ext(is_header, file.is_template))
+                # .ipp проверяется через свой .hpp, который включает именно X.ipp, а не кандидатов
+                if candidates > 1 and checker is not None and (is_header or not file.is_template):
+                    result = write_candidates_implementation(file, is_header, candidates, checker)
+                    if result is None:
+                        return False
+                    checks[(file.name, is_header)] = (file, Future())  # уже проверен среди кандидатов
+                    checks[(file.name, is_header)][1].set_result(result)
+                elif write_single_implementation(file, is_header) is False:
+                    return False
+            if checker is not None:
+                compiler_info, include_dirs = context['syntax_check']
+                for file in batch:
+                    for is_header in (True, False):
+                        if (file.name, is_header) in checks:
+                            continue
+                        checks[(file.name, is_header)] = (file, checker.submit(
+                            syntax_check_file, compiler_info, str(implementation_path(file, is_header)), include_dirs
+                        ))
+            counter += len(batch) * 2
+            log('{}/{} files implementations were written', counter, project_tree.total_files)
+        if checker is not None:
+            resolve_syntax_checks(checks, None)
+        if stats := context.get('candidate_stats'):
+            log('Candidates: {:.0%} valid, {}/{} files had a valid one, {:.1f}s per file on average',
+                stats['valid'] / stats['candidates'], stats['solved'], stats['files'], stats['time'] / stats['files'])
+    finally:
+        if checker is not None:
+            checker.shutdown(cancel_futures=True)
+    return True
+
+
+def project_jobs(project_tree: ProjectTree, syntax_check: bool) -> list[dict]:
+    # Задачи идут в топологическом порядке. Файл генерируется после того, как проверены (или, без проверок,
+    # написаны) файлы, от которых он зависит, — как в write_file_implementation
+    ready = 'check' if syntax_check else 'implement'
+    jobs = []
     for file in project_tree:
-        context['current_node'] = file
+        dependencies = [
+            f'{ready}:{name}{get_ext(is_header, project_tree[name].is_template)}'
+            for name in sorted(file.dependencies)
+            for is_header in (True, False)
+        ]
         for is_header in (True, False):
-            counter += 1
             name = file.name + get_ext(is_header, file.is_template)
-            path = Path(file.module) / name
-            context['current_file'] = name
-            log('{}/{} writing "{}" implementation...', counter, project_tree.total_files, name)
-            response = ask(simply(prompt('FileImplementation')), 'file implementation')
-            if '```' in response:
-                response = response[response.find('```') + 3:response.rfind('```')].removeprefix('cpp').strip()
-            if write_to_file(str(project_path / path), response) is False:
-                return False
-            log('{}/{} files implementations were written', counter, project_tree.total_files)
+            payload = {'file': file.name, 'is_header': is_header}
+            deps = dependencies if is_header else dependencies + [f'implement:{file.name}.hpp']
+            jobs.append({'id': f'implement:{name}', 'kind': 'implement', 'payload': payload, 'deps': deps})
+            if syntax_check:
+                jobs.append({'id': f'check:{name}', 'kind': 'check', 'payload': payload, 'deps': [f'implement:{name}']})
+    return jobs
+
+
+def run_job(job: dict) -> dict:
+    file = context['project_tree'][job['payload']['file']]
+    is_header = job['payload']['is_header']
+    if job['kind'] == 'implement':
+        if write_single_implementation(file, is_header) is False:
+            raise RuntimeError(f'"{file.name}{get_ext(is_header, file.is_template)}" was not written')
+        return {}
+    compiler_info, include_dirs = context['syntax_check']
+    errors, warnings = syntax_check_file(compiler_info, str(implementation_path(file, is_header)), include_dirs)
+    repaired = False
+    if errors:
+        wrn('"{}" has {} syntax errors', file.name + get_ext(is_header, file.is_template), len(errors))
+        repaired = repair_implementation(file, is_header, errors)
+    return {'errors': len(errors), 'warnings': len(warnings), 'repaired': repaired}
+
+
+def keep_lease(queue: JobQueue, job: dict, worker: str, lease: float, stop: threading.Event) -> None:
+    while not stop.wait(lease / 3):
+        if queue.heartbeat(job['id'], worker, lease) is False:
+            wrn('Lease of job "{}" was lost', job['id'])
+            return
+
+
+@logged
+def work_on_jobs(queue: JobQueue) -> int:
+    # Берёт готовые задачи, пока в очереди есть невыполненные; задачи, ждущие чужих зависимостей, ждёт
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    lease = float(config['JOB_LEASE'])
+    attempts = int(config['JOB_ATTEMPTS'])
+    done = 0
+    while True:
+        job = queue.lease(worker, lease)
+        if job is None:
+            if queue.remaining() == 0:
+                return done
+            sleep(1)
+            continue
+        if job['attempts'] > attempts:
+            # Аренда истекала слишком часто: воркеры падают на этой задаче
+            queue.fail(job['id'], worker, 'lease expired too many times', attempts)
+            continue
+        log('{} took job "{}" (attempt {}/{})', worker, job['id'], job['attempts'], attempts)
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=keep_lease, args=(queue, job, worker, lease, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = run_job(job)
+        except Exception as e:
+            wrn('Job "{}" failed: {}', job['id'], e)
+            queue.fail(job['id'], worker, str(e), attempts)
+            continue
+        finally:
+            stop.set()
+            heartbeat.join()
+        if queue.complete(job['id'], worker, result) is False:
+            wrn('Job "{}" was taken over by another worker, the result is dropped', job['id'])
+            continue
+        done += 1
+        log('Jobs: {}', queue.counts())
+
+
+@logged
+def distribute_file_implementation() -> bool:
+    # Координатор: задачи генерации и проверки файлов кладутся в очередь рабочей папки, и этот процесс
+    # выполняет их вместе с воркерами. Очередь переживает падения: повторный запуск продолжит с того же места.
+    # False, если хоть одна задача упала: pipeline повторит этап, и упавшие задачи получат новые попытки.
+    # Когда упавшим задачам не осталось попыток из JOB_TOTAL_ATTEMPTS, этап завершается ошибкой
+    project_tree: ProjectTree = context['project_tree']
+    syntax_check = config['SYNTAX_CHECK'] == 'true'
+    if syntax_check:
+        prepare_syntax_check(project_tree)
+    queue = JobQueue(workspace_path / 'jobs.sqlite3')
+    added = queue.add(project_jobs(project_tree, syntax_check))
+    retried = queue.retry_failed(int(config['JOB_TOTAL_ATTEMPTS']))
+    if retried:
+        log('{} failed jobs were returned to the queue', retried)
+    elif failed := queue.failed():
+        raise RuntimeError(f'{len(failed)} jobs failed and have no attempts left, see the errors in "{queue.path}"')
+    log('{} jobs were queued, more workers: python main.py --worker --section={}', added, config.name)
+    done = work_on_jobs(queue)
+    failed = queue.failed()
+    for job in failed:
+        wrn('Job "{}" failed: {}', job['id'], job.get('error'))
+    log('{} jobs were done by this process, {} failed', done, len(failed))
+    return not failed
+
+
+@logged
+def run_worker() -> bool:
+    # python main.py --worker --section=NAME: ждёт, пока координатор заполнит очередь, и выполняет задачи
+    path = workspace_path / 'jobs.sqlite3'
+    while not path.exists() or not JobQueue(path).counts():
+        log('Waiting for jobs in "{}"...', path)
+        sleep(5)
+    load_project_tree()
+    if config['SYNTAX_CHECK'] == 'true':
+        prepare_syntax_check(context['project_tree'])
+    log('{} jobs were done by this worker', work_on_jobs(JobQueue(path)))
     return True
 
 
@@ -150,6 +639,6 @@ def pipeline(*pipes: Callable) -> bool:
         traceback.print_exc()
         success = False
     finally:
-        aggregators.utils.stack.clear()
+        aggregators.utils.stack.calls.clear()
         aggregators.utils.log('PIPELINE FINISHED')
         return success
@@ -1,158 +1,404 @@
-from dataclasses import dataclass, replace
+import json
+import struct
+from array import array
+from pathlib import Path
 from typing import Tuple, Dict, FrozenSet, Iterator, List, Deque
 from functools import cached_property
 from collections import deque
+from itertools import compress
 
 
-@dataclass(frozen=True)
 class FileNode:
-    __slots__ = ('name', 'is_template', 'module', 'dependencies', 'dependents', 'depth')
-    name: str
-    is_template: bool
-    module: str
-    dependencies: FrozenSet[str]
-    dependents: FrozenSet[str]
-    depth: int
+    __slots__ = ('_tree', '_id')
+
+    def __init__(self, tree: 'ProjectTree', id_: int):
+        self._tree = tree
+        self._id = id_
+
+    @property
+    def name(self) -> str:
+        return self._tree._names[self._id]
+
+    @property
+    def is_template(self) -> bool:
+        return self._tree._templates[self._id] == 1
+
+    @property
+    def module(self) -> str:
+        return self._tree.module_names[self._tree._modules[self._id]]
+
+    @property
+    def dependencies(self) -> FrozenSet[str]:
+        return frozenset(self._tree._names[i] for i in self._tree._dependency_ids(self._id))
+
+    @property
+    def dependents(self) -> FrozenSet[str]:
+        return frozenset(self._tree._names[i] for i in self._tree._dependent_ids(self._id))
+
+    @property
+    def depth(self) -> int:
+        return self._tree._depths[self._id]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FileNode):
+            return NotImplemented
+        return self._tree is other._tree and self._id == other._id
+
+    def __hash__(self) -> int:
+        return hash((id(self._tree), self._id))
+
+    def __repr__(self) -> str:
+        return f'FileNode(name={self.name!r}, module={self.module!r}, is_template={self.is_template}, ' \
+               f'depth={self.depth})'
+
+
+# Переводит двоичную запись маски (младший бит первым) в селектор для compress
+_BITS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+def _csr(adjacency: List[List[int]]) -> Tuple[array, array]:
+    offsets = array('I', [0])
+    indices = array('I')
+    for targets in adjacency:
+        indices.extend(targets)
+        offsets.append(len(indices))
+    return offsets, indices
+
+
+# magic, version, files, modules, dependency edges, acyclic files, names, module names, json (bytes)
+_HEADER = struct.Struct('<4sHIIIIIII')
+_MAGIC = b'VGPT'
+_VERSION = 1
 
 
 class ProjectTree:
-    __slots__ = ('_project_data', 'FileNodes', '_dependency_graph', '__dict__')
+    # Граф хранится в CSR-виде: узел i (id = позиция в топологическом порядке) зависит от
+    # _dep_indices[_dep_offsets[i]:_dep_offsets[i + 1]], обратные рёбра — в _rev_*.
+    __slots__ = ('_project_data', '_project_json', '_names', '_modules', '_templates', '_depths',
+                 '_dep_offsets', '_dep_indices', '_rev_offsets', '_rev_indices', '_acyclic_count',
+                 '_index', '__dict__')
 
     def __init__(self, project_data: Dict):
         self._project_data = project_data
-        self._nodes, self._dependency_graph = self._build_graph()
-
-    def _build_graph(self) -> Tuple[Dict[str, FileNode], Dict[str, List[str]]]:
-        nodes = {}
-        dependency_graph = {}
-
-        file_names = set()
-        for module in self._project_data['project']['modules']:
-            for file in module['files']:
-                file_names.add(file['name'])
-        for module in self._project_data['project']['modules']:
-            module_name = module['name']
+        self._project_json = None
+        self._build_graph()
+
+    def _build_graph(self) -> None:
+        modules = self._project_data['project']['modules']
+        self.__dict__['module_names'] = tuple(module['name'] for module in modules)
+
+        # Первичная нумерация — в порядке объявления, первое объявление файла побеждает
+        index: Dict[str, int] = {}
+        files = []
+        for module_id, module in enumerate(modules):
             for file_info in module['files']:
-                if file_info['name'] in nodes:
-                    continue
-                name = file_info['name']
-                is_template = file_info['is_template']
-                deps = [d for d in file_info['deps'] if d in file_names]
-
-                nodes[name] = FileNode(
-                    name=name,
-                    is_template=is_template,
-                    module=module_name,
-                    dependencies=frozenset(deps),
-                    dependents=frozenset(),
-                    depth=0
-                )
-
-        for node in nodes.values():
-            dependency_graph[node.name] = list(node.dependencies)
-
-        for node_name, deps in dependency_graph.items():
+                if file_info['name'] not in index:
+                    index[file_info['name']] = len(files)
+                    files.append((file_info, module_id))
+
+        dependencies = [
+            list(dict.fromkeys(index[d] for d in file_info['deps'] if d in index))
+            for file_info, _ in files
+        ]
+        dependents: List[List[int]] = [[] for _ in files]
+        for node, deps in enumerate(dependencies):
             for dep in deps:
-                nodes[dep] = replace(
-                    nodes[dep],
-                    dependents=nodes[dep].dependents | {node_name}
-                )
+                dependents[dep].append(node)
+
+        # Алгоритм Кана с подсчётом уровней; узлы вне порядка (циклы) идут в конце
+        in_degree = [len(deps) for deps in dependencies]
+        levels = [0] * len(files)
+        queue: Deque[int] = deque(node for node, degree in enumerate(in_degree) if degree == 0)
+        order: List[int] = []
+        while queue:
+            current = queue.popleft()
+            order.append(current)
+            for dependent in dependents[current]:
+                levels[dependent] = max(levels[dependent], levels[current] + 1)
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    queue.append(dependent)
+        self._acyclic_count = len(order)
+        placed = set(order)
+        order += [node for node in range(len(files)) if node not in placed]
+        for node in order[self._acyclic_count:]:
+            levels[node] = 0
+
+        new_id = [0] * len(files)
+        for i, node in enumerate(order):
+            new_id[node] = i
+        self._names = tuple(files[node][0]['name'] for node in order)
+        self._modules = array('I', (files[node][1] for node in order))
+        self._templates = bytes(files[node][0]['is_template'] is True for node in order)
+        self._depths = array('I', (levels[node] for node in order))
+        self._dep_offsets, self._dep_indices = _csr([[new_id[d] for d in dependencies[node]] for node in order])
+        # Обратные рёбра по возрастанию id, как их восстанавливает load: загруженное дерево совпадает с исходным
+        self._rev_offsets, self._rev_indices = _csr([sorted(new_id[d] for d in dependents[node]) for node in order])
+        self._index = {name: i for i, name in enumerate(self._names)}
+
+    def _dependency_ids(self, i: int) -> array:
+        return self._dep_indices[self._dep_offsets[i]:self._dep_offsets[i + 1]]
+
+    def _dependent_ids(self, i: int) -> array:
+        return self._rev_indices[self._rev_offsets[i]:self._rev_offsets[i + 1]]
+
+    @property
+    def project_data(self) -> Dict:
+        if self._project_data is None:
+            self._project_data = json.loads(self._project_json)
+        return self._project_data
+
+    def save(self, path: str | Path) -> None:
+        names = '\0'.join(self._names).encode('UTF-8')
+        module_names = '\0'.join(self.module_names).encode('UTF-8')
+        project_json = self._project_json
+        if project_json is None:
+            project_json = json.dumps(self._project_data, ensure_ascii=False)
+        project_json = project_json.encode('UTF-8')
+        with open(path, 'wb') as file:
+            file.write(_HEADER.pack(
+                _MAGIC, _VERSION, len(self._names), len(self.module_names), len(self._dep_indices),
+                self._acyclic_count, len(names), len(module_names), len(project_json)
+            ))
+            for data in (self._modules, self._depths, self._dep_offsets, self._dep_indices):
+                file.write(data.tobytes())
+            file.write(self._templates)
+            file.write(names)
+            file.write(module_names)
+            file.write(project_json)
+
+    @classmethod
+    def load(cls, path: str | Path) -> 'ProjectTree':
+        with open(path, 'rb') as file:
+            data = memoryview(file.read())
+        # Обрезанный или повреждённый файл — такая же ошибка формата, как чужая версия
+        try:
+            magic, version, n, m, e, acyclic, names, module_names, project_json = _HEADER.unpack_from(data)
+        except struct.error as error:
+            raise ValueError(f'"{path}" is not a project tree file: {error}') from error
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'"{path}" is not a project tree file of version {_VERSION}')
+        if len(data) != _HEADER.size + 4 * (3 * n + 1 + e) + n + names + module_names + project_json:
+            raise ValueError(f'"{path}" is truncated or corrupted')
+        tree = cls.__new__(cls)
+        tree._project_data = None
+        tree._acyclic_count = acyclic
+        offset = _HEADER.size
+        arrays = []
+        for count in (n, n, n + 1, e):
+            arrays.append(array('I'))
+            arrays[-1].frombytes(data[offset:offset + count * 4])
+            offset += count * 4
+        tree._modules, tree._depths, tree._dep_offsets, tree._dep_indices = arrays
+        if tree._dep_offsets[-1] != e or any(dep >= n for dep in tree._dep_indices):
+            raise ValueError(f'"{path}" is truncated or corrupted')
+        tree._templates = bytes(data[offset:offset + n])
+        offset += n
+        tree._names = tuple(str(data[offset:offset + names], 'UTF-8').split('\0')) if n else ()
+        offset += names
+        tree.__dict__['module_names'] = tuple(str(data[offset:offset + module_names], 'UTF-8').split('\0')) \
+            if m else ()
+        offset += module_names
+        tree._project_json = str(data[offset:offset + project_json], 'UTF-8')
+        tree._index = {name: i for i, name in enumerate(tree._names)}
+
+        # Обратные рёбра восстанавливаются из прямых за O(V + E)
+        counts = [0] * (n + 1)
+        for dep in tree._dep_indices:
+            counts[dep + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        tree._rev_offsets = array('I', counts)
+        rev_indices = [0] * e
+        for node in range(n):
+            for dep in tree._dependency_ids(node):
+                rev_indices[counts[dep]] = node
+                counts[dep] += 1
+        tree._rev_indices = array('I', rev_indices)
+        return tree
+
+    def _closures(self, offsets: array, indices: array, reverse: bool) -> Tuple[int, ...]:
+        ids = range(len(self._names))
+        if reverse is True:
+            ids = ids[::-1]
+        closures = [1 << i for i in range(len(self._names))]
+        while True:
+            changed = False
+            for i in ids:
+                mask = closures[i]
+                for j in indices[offsets[i]:offsets[i + 1]]:
+                    mask |= closures[j]
+                if mask != closures[i]:
+                    closures[i] = mask
+                    changed = True
+            # Для ациклического графа одного прохода в топологическом порядке достаточно
+            if changed is False or self.has_cycle is False:
+                break
+        return tuple(closures)
 
-        return nodes, dependency_graph
+    @cached_property
+    def _ancestors(self) -> Tuple[int, ...]:
+        return self._closures(self._dep_offsets, self._dep_indices, reverse=False)
 
     @cached_property
-    def _in_degree(self) -> Dict[str, int]:
-        return {node: len(deps) for node, deps in self._dependency_graph.items()}
+    def _descendants(self) -> Tuple[int, ...]:
+        return self._closures(self._rev_offsets, self._rev_indices, reverse=True)
+
+    @cached_property
+    def _cyclic_mask(self) -> int:
+        return ((1 << len(self._names)) - 1) ^ ((1 << self._acyclic_count) - 1)
+
+    def _id(self, name: str) -> int:
+        if name not in self._index:
+            raise KeyError(f"Node '{name}' not found.")
+        return self._index[name]
+
+    def _select(self, mask: int) -> List[FileNode]:
+        return list(compress(self._indexed_nodes, bin(mask)[:1:-1].encode().translate(_BITS)))
 
     @cached_property
     def roots(self) -> Tuple[FileNode, ...]:
         return tuple(
-            self._nodes[node]
-            for node, count in self._in_degree.items()
-            if count == 0
+            node
+            for node in self._indexed_nodes
+            if self._dep_offsets[node._id] == self._dep_offsets[node._id + 1]
         )
 
+    @cached_property
+    def _indexed_nodes(self) -> Tuple[FileNode, ...]:
+        return tuple(FileNode(self, i) for i in range(len(self._names)))
+
+    @cached_property
+    def _topological_order(self) -> Tuple[FileNode, ...]:
+        return self._indexed_nodes[:self._acyclic_count]
+
     def __iter__(self) -> Iterator[FileNode]:
-        in_degree = self._in_degree.copy()
-        queue: Deque[str] = deque([node for node, degree in in_degree.items() if degree == 0])
-        result: List[FileNode] = []
+        return iter(self._topological_order)
 
-        while queue:
-            current = queue.popleft()
-            result.append(self._nodes[current])
-            for dependent in self._nodes[current].dependents:
-                in_degree[dependent] -= 1
-                if in_degree[dependent] == 0:
-                    queue.append(dependent)
+    def __len__(self) -> int:
+        return len(self._names)
 
-        return iter(result)
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
 
     @cached_property
     def has_cycle(self) -> bool:
-        in_degree = self._in_degree.copy()
-        queue: Deque[str] = deque([node for node, degree in in_degree.items() if degree == 0])
-        count = 0
+        return self._acyclic_count != len(self._names)
 
-        while queue:
-            current = queue.popleft()
-            count += 1
-            for dependent in self._nodes[current].dependents:
-                in_degree[dependent] -= 1
-                if in_degree[dependent] == 0:
-                    queue.append(dependent)
+    @cached_property
+    def _components(self) -> Tuple[Tuple[int, ...], ...]:
+        # Итеративный алгоритм Тарьяна только по узлам вне порядка Кана: все циклы лежат там
+        index: Dict[int, int] = {}
+        low: Dict[int, int] = {}
+        stack: List[int] = []
+        on_stack = set()
+        components = []
+        for start in range(self._acyclic_count, len(self._names)):
+            if start in index:
+                continue
+            work = [(start, 0)]
+            while work:
+                node, edge = work.pop()
+                if edge == 0:
+                    index[node] = low[node] = len(index)
+                    stack.append(node)
+                    on_stack.add(node)
+                deps = self._dependency_ids(node)
+                while edge < len(deps):
+                    dep = deps[edge]
+                    edge += 1
+                    if dep < self._acyclic_count:
+                        continue
+                    if dep not in index:
+                        work.append((node, edge))
+                        work.append((dep, 0))
+                        break
+                    if dep in on_stack:
+                        low[node] = min(low[node], index[dep])
+                else:
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        if len(component) > 1 or node in self._dependency_ids(node):
+                            components.append(tuple(sorted(component)))
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+        return tuple(components)
 
-        return count != len(self._nodes)
+    @cached_property
+    def cycles(self) -> Tuple[Tuple[FileNode, ...], ...]:
+        # Сильно связные компоненты, образующие циклы зависимостей
+        return tuple(tuple(self._indexed_nodes[i] for i in component) for component in self._components)
 
-    def get_subtree(self, name: str) -> List[FileNode]:
-        if name not in self._nodes:
-            raise KeyError(f"Node '{name}' not found.")
+    @cached_property
+    def cycle_edges(self) -> Tuple[Tuple[str, str], ...]:
+        # Рёбра (файл, зависимость) внутри циклических компонент — только их и нужно чинить
+        edges = []
+        for component in self._components:
+            members = set(component)
+            for node in component:
+                edges.extend((self._names[node], self._names[dep])
+                             for dep in self._dependency_ids(node) if dep in members)
+        return tuple(edges)
 
-        # 1. Собираем ВСЕ узлы поддерева (name + все его зависимости)
-        subtree = set()
-        stack = [name]
-        while stack:
-            current = stack.pop()
-            if current not in subtree:
-                subtree.add(current)
-                # Добавляем зависимости текущего узла
-                stack.extend(self._nodes[current].dependencies)
-
-        # 2. Строим in_degree для ПОДДЕРЕВА
-        in_degree = {node: 0 for node in subtree}
-        for node in subtree:
-            for dep in self._nodes[node].dependencies:
-                if dep in subtree:
-                    in_degree[node] += 1  # Учитываем только зависимости внутри поддерева
-
-        # 3. Алгоритм Кана для поддерева
-        queue = deque([node for node, cnt in in_degree.items() if cnt == 0])
-        result = []
-        while queue:
-            current = queue.popleft()
-            result.append(self._nodes[current])
-            # Обходим ЗАВИСИМЫЕ узлы (dependents)
-            for dep_node in self._nodes[current].dependents:
-                if dep_node in subtree:
-                    in_degree[dep_node] -= 1
-                    if in_degree[dep_node] == 0:
-                        queue.append(dep_node)
-
-        # Проверка на циклы в поддереве
-        if len(result) != len(subtree):
+    def _find_cycle(self, component: Tuple[int, ...]) -> List[int]:
+        members = set(component)
+        path = [component[0]]
+        position = {component[0]: 0}
+        while True:
+            dep = next(d for d in self._dependency_ids(path[-1]) if d in members)
+            if dep in position:
+                return path[position[dep]:] + [dep]
+            position[dep] = len(path)
+            path.append(dep)
+
+    def describe_cycles(self) -> str:
+        lines = []
+        for n, component in enumerate(self._components, 1):
+            cycle = ' -> '.join(f'{self.module_names[self._modules[i]]}/{self._names[i]}'
+                                for i in self._find_cycle(component))
+            lines.append(f'{n}. {cycle}')
+        return '\n'.join(lines)
+
+    @cached_property
+    def levels(self) -> Tuple[Tuple[FileNode, ...], ...]:
+        levels: List[List[FileNode]] = []
+        for node in self._topological_order:
+            while len(levels) <= node.depth:
+                levels.append([])
+            levels[node.depth].append(node)
+        return tuple(tuple(level) for level in levels)
+
+    def get_subtree(self, name: str) -> List[FileNode]:
+        mask = self._ancestors[self._id(name)]
+        if mask & self._cyclic_mask:
             raise ValueError("Subtree contains cycles")
+        return self._select(mask)
+
+    def get_dependents(self, name: str) -> List[FileNode]:
+        # Замыкание зависимых узлов (включая сам узел) в топологическом порядке
+        mask = self._descendants[self._id(name)]
+        if mask & self._cyclic_mask:
+            raise ValueError("Dependents closure contains cycles")
+        return self._select(mask)
 
-        return result
+    def is_reachable(self, source: str, target: str) -> bool:
+        # True, если source (транзитивно) зависит от target
+        return bool(self._ancestors[self._id(source)] >> self._id(target) & 1)
 
     @cached_property
     def module_names(self) -> Tuple[str, ...]:
-        return tuple(module['name'] for module in self._project_data['project']['modules'])
+        return tuple(module['name'] for module in self.project_data['project']['modules'])
 
     @cached_property
     def total_files(self) -> int:
-        count = 0
-        for node in self._nodes.values():
-            count += 1 if node.is_template is True else 2
-        return count
+        return len(self._names) * 2 - self._templates.count(1)
 
     def __getitem__(self, name: str) -> FileNode:
-        return self._nodes[name]
+        return self._indexed_nodes[self._index[name]]
@@ -1,5 +1,19 @@
+import os
+import sys
+import json
+import shutil
+import subprocess
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from aggregators.config import config
+from aggregators.build_aggregator import (
+    find_cpp_source_files, select_cpp_compiler, build_cpp_flags, compile_cpp_project,
+    newest_header_mtime
+)
+from aggregators.parse_aggregator import parse_gtest_output, parse_gtest_report, parse_compiler_output, parse_depfile
+from aggregators.project_tree import ProjectTree
+from aggregators.utils import log, wrn
 
 
 def find_test_cases(project_root: Path) -> list[Path]:
@@ -14,133 +28,472 @@ def find_test_cases(project_root: Path) -> list[Path]:
     return test_sources
 
 
-def build_test_command(compiler_info: dict, sources: list[str], output_path: str) -> list[str]:
+def build_test_command(compiler_info: dict,
+                       sources: list[str],
+                       output_path: str,
+                       include_dirs: list[str] = ()) -> list[str]:
     is_cpp = any(f.endswith(('.cpp', '.cc', '.cxx')) for f in sources)
     compiler = compiler_info['cpp'] if is_cpp else compiler_info['c']
 
     cmd = [compiler]
-    cmd += compiler_info['flags']
-
-    # Пути к GTest (измените на свои!)
-    GTEST_INCLUDE_DIR = "C:/includes/googletest/include"
-    GTEST_LIB_DIR = "C:/includes/googletest/lib"
+    cmd += build_cpp_flags(compiler_info, is_cpp, [config['GTEST_INCLUDE_DIR'], *include_dirs])
 
     if compiler_info['type'] == 'msvc':
-        # Стандартные пути MSVC (проверьте актуальность!)
-        vc_include = r"D:\Applications\Visual Studio\2022\Preview\VC\Tools\MSVC\14.44.35128\include"
-        win_sdk_include = r"C:\Program Files (x86)\Windows Kits\10\Include\10.0.26100.0\ucrt"
         cmd += [
             '/MT',
-            f'/I{GTEST_INCLUDE_DIR}',
-            f'/I{vc_include}',
-            f'/I{win_sdk_include}',
-            '/std:c++latest',
             '/EHsc',
-            '/nologo',
-            *sources,  # Исходные файлы должны быть здесь!
+            *sources,
             f'/Fe{output_path}',
             '/link',  # Разделитель для линкера
-            f'/LIBPATH:{GTEST_LIB_DIR}',
+            f'/LIBPATH:{config["GTEST_LIB_DIR"]}',
             'gtest.lib',
             'gtest_main.lib'
         ]
     else:
         cmd += [
-            f'-I{GTEST_INCLUDE_DIR}',
-            f'-L{GTEST_LIB_DIR}',
-            '-lgtest',
+            *sources,
+            f'-L{config["GTEST_LIB_DIR"]}',
             '-lgtest_main',
+            '-lgtest',
             '-pthread',
-            '-std=c++23',
-            *sources,
             '-o', output_path
         ]
 
     return cmd
 
 
-def compile_and_run_test(test_source: Path) -> dict:
+def memory_limited(command: list[str], memory_limit: int) -> list[str]:
+    # memory_limit в МиБ, 0 — без ограничения. Лимит ставит обёртка, которая затем делает exec теста:
+    # preexec_fn небезопасен, пока работают потоки пула. Только POSIX
+    if not memory_limit or os.name != 'posix':
+        return command
+    if shutil.which('prlimit') is not None:
+        return ['prlimit', f'--as={memory_limit * 2 ** 20}', '--', *command]
+    return ['sh', '-c', f'ulimit -v {memory_limit * 1024} && exec "$0" "$@"', *command]
+
+
+def run_test_binary(executable: str,
+                    timeout: float,
+                    memory_limit: int,
+                    args: list[str] = (),
+                    env: dict | None = None) -> dict:
+    process = subprocess.Popen(
+        memory_limited([executable, *args], memory_limit),
+        cwd=Path(executable).parent,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        env={**os.environ, **(env or {})}
+    )
+    start = perf_counter()
+    timed_out = False
+    try:
+        output, _ = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        output, _ = process.communicate()
+        timed_out = True
+    return {
+        'exit_code': process.returncode,
+        'output': output,
+        'timed_out': timed_out,
+        'duration': perf_counter() - start
+    }
+
+
+def list_gtest_cases(executable: str, timeout: float, memory_limit: int) -> list[str]:
+    # Вывод --gtest_list_tests: "Suite." и под ним "  Test" (параметризованные — с комментарием после #)
+    run = run_test_binary(executable, timeout, memory_limit, ['--gtest_list_tests'])
+    cases = []
+    suite = ''
+    for line in run['output'].split('\n'):
+        name = line.split('#')[0].rstrip()
+        if not name or name.startswith('Running main()'):
+            continue
+        if not line.startswith(' '):
+            suite = name
+        else:
+            cases.append(suite + name.strip())
+    return cases
+
+
+def merge_gtest_results(results: list[dict]) -> dict:
+    merged = {
+        'total': 0,
+        'passed': 0,
+        'failed': [],
+        'details': []
+    }
+    for result in results:
+        for key in merged:
+            merged[key] += result[key]
+    return merged
+
+
+def run_gtest(executable: str,
+              report: Path,
+              timeout: float,
+              memory_limit: int,
+              args: list[str] = (),
+              env: dict | None = None) -> tuple[dict, dict]:
+    # Результаты берутся из XML-отчёта; если его нет (процесс упал или убит), — из текста
+    report.unlink(missing_ok=True)
+    run = run_test_binary(executable, timeout, memory_limit, [f'--gtest_output=xml:{report}', *args], env)
+    results = parse_gtest_report(str(report)) if not run['timed_out'] else None
+    if results is None:
+        results = parse_gtest_output(run['output'])
+    return run, results
+
+
+def run_sharded(executable: str, shards: int, timeout: float, memory_limit: int) -> tuple[dict, dict]:
+    # Бинарник делится на shards процессов через GTEST_TOTAL_SHARDS/GTEST_SHARD_INDEX; упавшие
+    # тесты перезапускаются поодиночке, и в failed остаются только подтвердившиеся
+    shards = min(shards, len(list_gtest_cases(executable, timeout, memory_limit))) if shards > 1 else 1
+    if shards <= 1:
+        shard_runs = [run_gtest(executable, Path(f'{executable}.xml'), timeout, memory_limit)]
+    else:
+        with ThreadPoolExecutor(max_workers=shards) as executor:
+            shard_runs = list(executor.map(
+                lambda index: run_gtest(executable, Path(f'{executable}.{index}.xml'), timeout, memory_limit, env={
+                    'GTEST_TOTAL_SHARDS': str(shards),
+                    'GTEST_SHARD_INDEX': str(index)
+                }),
+                range(shards)
+            ))
+    runs = [run for run, _ in shard_runs]
+    run = {
+        'exit_code': next((r['exit_code'] for r in runs if r['exit_code'] != 0), 0),
+        'output': ''.join(r['output'] for r in runs),
+        'timed_out': any(r['timed_out'] for r in runs),
+        'duration': max(r['duration'] for r in runs),
+        'shards': shards
+    }
+    gtest_results = merge_gtest_results([results for _, results in shard_runs])
+    gtest_results['flaky'] = []
+
+    confirmed = []
+    for failure in gtest_results['failed']:
+        rerun, alone = run_gtest(
+            executable, Path(f'{executable}.rerun.xml'), timeout, memory_limit, [f'--gtest_filter={failure["name"]}']
+        )
+        if rerun['exit_code'] == 0 and not rerun['timed_out'] and alone['passed'] == 1:
+            gtest_results['flaky'].append(failure['name'])
+            gtest_results['passed'] += 1
+            for detail in gtest_results['details']:
+                if detail['name'] == failure['name']:
+                    detail['status'] = 'FLAKY'
+        else:
+            confirmed.append(failure)
+    gtest_results['failed'] = confirmed
+    if gtest_results['flaky'] and not confirmed and not run['timed_out']:
+        run['exit_code'] = 0  # все падения были только в общем прогоне
+    return run, gtest_results
+
+
+def compile_and_run_test(test_source: Path,
+                         compiler_info: dict,
+                         library: str,
+                         include_dirs: list[str],
+                         build_dir: Path,
+                         timeout: float,
+                         memory_limit: int,
+                         shards: int = 1) -> dict:
     test_result = {
         'name': test_source.name,
         'success': False,
         'output': '',
         'errors': [],
+        'warnings': [],
         'gtest_results': {},
         'executable': '',
-        'exit_code': -1
+        'exit_code': -1,
+        'timed_out': False,
+        'duration': 0.0,
+        'shards': 0
     }
 
-    # TODO: Complete
-    # try:
-    #     build_dir = test_source.parent / 'build'
-    #     build_dir.mkdir(exist_ok=True)
-    #     compile_cmd = build_test_command(
-    #         select_compiler('msvc', os.listdir(test_source.parent)),
-    #         [str(test_source)],
-    #         str(build_dir / 'gtest_test')
-    #     )
-    #     process = subprocess.run(
-    #         compile_cmd,
-    #         capture_output=True,
-    #         text=True,
-    #         encoding='utf-8',
-    #         errors='replace'
-    #     )
-    #     if process.returncode != 0:
-    #         full_output = process.stdout + "\n" + process.stderr
-    #         print(full_output)
-    #         test_result['errors'], test_result['warnings'] = parse_compiler_output(full_output)
-    #         return test_result
-    #     test_exe = build_dir / 'gtest_test'
-    #     test_result['executable'] = str(test_exe)
-    #     run_process = subprocess.run(
-    #         [str(test_exe), '--gtest_brief=1'],
-    #         capture_output=True,
-    #         text=True,
-    #         encoding='utf-8'
-    #     )
-    #     gtest_results = parse_gtest_output(run_process.stdout)
-    #     test_result.update({
-    #         'success': run_process.returncode == 0 and len(gtest_results['failed']) == 0,
-    #         'output': run_process.stdout + run_process.stderr,
-    #         'exit_code': run_process.returncode,
-    #         'gtest_results': gtest_results
-    #     })
-    # except Exception as e:
-    #     test_result['errors'].append({
-    #         'type': 'system',
-    #         'message': str(e),
-    #         'file': str(test_source),
-    #         'line': 0,
-    #         'column': 0
-    #     })
+    try:
+        build_dir.mkdir(parents=True, exist_ok=True)
+        test_exe = build_dir / test_source.stem
+        if compiler_info['type'] == 'msvc':
+            test_exe = test_exe.with_suffix('.exe')
+        # Компилируется только TU теста; проект берётся из собранной один раз статической библиотеки
+        # Команда сравнивается с <exe>.json, поэтому порядок -I не должен меняться между запусками
+        compile_cmd = build_test_command(
+            compiler_info, [str(test_source), library], str(test_exe), sorted(include_dirs)
+        )
+        if compiler_info['type'] != 'msvc':
+            compile_cmd += ['-MMD', '-MF', str(build_dir / f'{test_source.stem}.d')]  # для анализа влияния
+        state_path = test_exe.with_suffix('.json')
+        try:
+            state = json.loads(state_path.read_text(encoding='UTF-8'))
+        except (OSError, ValueError):
+            state = {}
+        fresh = (
+            state.get('command') == compile_cmd
+            and test_exe.exists()
+            and test_exe.stat().st_mtime >= max(
+                test_source.stat().st_mtime, Path(library).stat().st_mtime, newest_header_mtime(include_dirs)
+            )
+        )
+        if not fresh:
+            process = subprocess.run(
+                compile_cmd,
+                cwd=build_dir,
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace'
+            )
+            if process.returncode != 0:
+                test_result['output'] = process.stdout + process.stderr
+                test_result['errors'], test_result['warnings'] = parse_compiler_output(test_result['output'])
+                return test_result
+            state_path.write_text(json.dumps({'command': compile_cmd}, indent=1), encoding='UTF-8')
+        test_result['executable'] = str(test_exe)
+
+        run, gtest_results = run_sharded(str(test_exe), shards, timeout, memory_limit)
+        test_result.update({
+            'success': run['exit_code'] == 0 and not run['timed_out'] and len(gtest_results['failed']) == 0,
+            'output': run['output'],
+            'exit_code': run['exit_code'],
+            'timed_out': run['timed_out'],
+            'duration': run['duration'],
+            'shards': run['shards'],
+            'gtest_results': gtest_results
+        })
+        if run['timed_out']:
+            test_result['errors'].append({
+                'type': 'error',
+                'message': f'Test timed out after {timeout:g}s',
+                'file': str(test_source),
+                'line': 0,
+                'column': 0
+            })
+        elif run['exit_code'] != 0 and not gtest_results['failed']:
+            test_result['errors'].append({
+                'type': 'error',
+                'message': f'Test crashed with exit code {run["exit_code"]}'
+                           + (f' (memory limit {memory_limit} MiB)' if memory_limit else ''),
+                'file': str(test_source),
+                'line': 0,
+                'column': 0
+            })
+    except Exception as e:
+        test_result['errors'].append({
+            'type': 'system',
+            'message': str(e),
+            'file': str(test_source),
+            'line': 0,
+            'column': 0
+        })
 
     return test_result
 
 
-def run_tests(project_root: Path) -> dict:
+def project_files(sources: list[str], include_dirs: list[str]) -> dict[str, float]:
+    files = {source: Path(source).stat().st_mtime for source in sources}
+    for include in include_dirs:
+        for path in Path(include).iterdir():
+            if path.suffix.lower() in {'.h', '.hpp', '.hh', '.hxx', '.inc', '.ipp', '.tpp'} and path.is_file():
+                files[str(path)] = path.stat().st_mtime
+    return files
+
+
+def affected_names(changed: set[str],
+                   sources: list[str],
+                   project_root: Path,
+                   project_tree: ProjectTree | None) -> set[str] | None:
+    # Имена узлов (stem файлов), поведение которых могло измениться. X.cpp и X.hpp — один узел, поэтому
+    # замыкание по include_graph.json учитывает и компоновку: тест, включающий B.hpp, зависит от B.cpp,
+    # а значит, и от всего, что включает B.cpp. Плюс зависимые по ProjectTree.
+    # None — замыкание построить нельзя (нет графа для какого-то TU или цикл), под подозрением все тесты
+    names = {Path(file).stem for file in changed}
+    try:
+        include_graph = json.loads((project_root / 'bin' / 'include_graph.json').read_text(encoding='UTF-8'))
+    except (OSError, ValueError):
+        return None
+    graph = {str(Path(source).resolve()): dependencies for source, dependencies in include_graph.items()}
+    if any(str(Path(source).resolve()) not in graph for source in sources):
+        return None
+    grown = True
+    while grown:
+        grown = False
+        for source, dependencies in graph.items():
+            stem = Path(source).stem
+            if stem not in names and any(Path(dependency).stem in names for dependency in dependencies):
+                names.add(stem)
+                grown = True
+    if project_tree is not None:
+        try:
+            for name in [name for name in names if name in project_tree]:
+                names.update(node.name for node in project_tree.get_dependents(name))
+        except ValueError:
+            return None
+    return names
+
+
+def select_tests(test_sources: list[Path],
+                 files: dict[str, float],
+                 impact: dict,
+                 changed: list[str] | None,
+                 project_root: Path,
+                 build_dir: Path,
+                 project_tree: ProjectTree | None) -> tuple[list[Path], list[dict]]:
+    # Тест запускается, если он новый, менялся, в прошлый раз не прошёл или включает
+    # (транзитивно, по depfile) файл проекта, на который могли повлиять изменения
+    modified = {file for file, mtime in files.items() if impact['mtimes'].get(file) != mtime}
+    modified |= {file for file in files if Path(file).stem in set(changed or ())}
+    sources = [file for file in files if Path(file).suffix.lower() in {'.c', '.cpp', '.cc', '.cxx', '.c++'}]
+    names = affected_names(modified, sources, project_root, project_tree)
+    selected = []
+    skipped = []
+    for test_source in test_sources:
+        dependencies = impact['tests'].get(str(test_source))
+        if (
+            names is None
+            or dependencies is None
+            or str(test_source) in impact['failed']
+            or impact['mtimes'].get(str(test_source)) != test_source.stat().st_mtime
+            or not (build_dir / f'{test_source.stem}.d').exists()
+        ):
+            selected.append(test_source)
+            continue
+        if any(Path(dependency).stem in names for dependency in dependencies):
+            selected.append(test_source)
+        else:
+            skipped.append({'test': test_source.name, 'reason': 'none of its includes were affected by changes'})
+    return selected, skipped
+
+
+def run_tests(project_root: Path,
+              compiler: str = 'auto',
+              jobs: int | None = None,
+              timeout: float | None = None,
+              memory_limit: int | None = None,
+              shards: int | None = None,
+              project_tree: ProjectTree | None = None,
+              changed: list[str] | None = None,
+              run_all: bool | None = None) -> dict:
+    '''
+    :param changed: имена перегенерированных узлов ProjectTree (к ним добавляются файлы,
+        изменившиеся с прошлого запуска)
+    :param run_all: запустить все тесты без анализа влияния; по умолчанию — флаг --all
+    :return: {
+        'total': int,
+        'passed': int,
+        'failed': List[Dict],
+        'details': List[Dict],
+        'skipped': List[Dict]
+    }
+    '''
     test_results = {
         'total': 0,
         'passed': 0,
         'failed': [],
-        'details': []
+        'details': [],
+        'skipped': []
     }
 
+    project_root = Path(project_root).resolve()
     test_sources = find_test_cases(project_root)
-
-    for test_source in test_sources:
-        test_result = compile_and_run_test(test_source)
-        test_results['details'].append(test_result)
-
-        if test_result['success']:
-            test_results['passed'] += 1
-        else:
+    if not test_sources:
+        return test_results
+    sources, include_dirs = find_cpp_source_files(project_root)
+    compiler_info = select_cpp_compiler(compiler, sources)
+    build_dir = project_root / 'bin' / 'tests'
+    build = compile_cpp_project(str(project_root), compiler_info['name'], project_tree=project_tree)
+    if not build['library']:
+        # Без библиотеки проекта ни один тест не слинкуется
+        test_results['total'] = len(test_sources)
+        for test_source in test_sources:
             test_results['failed'].append({
                 'test': test_source.name,
-                'output': test_result['output'],
-                'errors': test_result['errors'],
-                'gtest_failures': test_result['gtest_results'].get('failed', [])
+                'output': build['output'],
+                'errors': build['errors'] or [{
+                    'type': 'system',
+                    'message': 'Project library was not built',
+                    'file': '',
+                    'line': 0,
+                    'column': 0
+                }],
+                'gtest_failures': []
             })
+        wrn('Tests were not run: the project does not build')
+        return test_results
+    timeout = timeout or float(config['TEST_TIMEOUT'])
+    memory_limit = int(config['TEST_MEMORY_LIMIT']) if memory_limit is None else memory_limit
+    jobs = jobs or int(config['TEST_JOBS']) or os.cpu_count() or 1
+
+    impact_path = build_dir / 'impact.json'
+    try:
+        impact = json.loads(impact_path.read_text(encoding='UTF-8'))
+    except (OSError, ValueError):
+        impact = {'mtimes': {}, 'tests': {}, 'failed': []}
+    files = project_files(sources, include_dirs)
+    if run_all is None:
+        run_all = '--all' in sys.argv
+    if run_all is True:
+        skipped = []
+    else:
+        test_sources, skipped = select_tests(
+            test_sources, files, impact, changed, project_root, build_dir, project_tree
+        )
+    test_results['skipped'] = skipped
+    for test in skipped:
+        log('Skipping "{}": {}', test['test'], test['reason'])
+    # По умолчанию ядра делятся между одновременно работающими бинарниками, иначе каждый из jobs
+    # бинарников запустил бы cpu_count шардов
+    running = max(1, min(jobs, len(test_sources)))
+    shards = shards or int(config['TEST_SHARDS']) or max(1, (os.cpu_count() or 1) // running)
+
+    # Как и при сборке, потоки только ждут дочерние процессы компилятора и тестов
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            lambda test: compile_and_run_test(
+                test, compiler_info, build['library'], include_dirs, build_dir, timeout, memory_limit, shards
+            ),
+            test_sources
+        )
+        for test_source, test_result in zip(test_sources, results):
+            test_results['details'].append(test_result)
+
+            if test_result['success']:
+                test_results['passed'] += 1
+            else:
+                test_results['failed'].append({
+                    'test': test_source.name,
+                    'output': test_result['output'],
+                    'errors': test_result['errors'],
+                    'gtest_failures': test_result['gtest_results'].get('failed', [])
+                })
 
     test_results['total'] = len(test_sources)
-    return test_results
\ No newline at end of file
+    for test_source in test_sources:
+        depfile = build_dir / f'{test_source.stem}.d'
+        if depfile.exists():
+            impact['tests'][str(test_source)] = [
+                str((build_dir / d).resolve()) for d in parse_depfile(depfile.read_text(encoding='UTF-8'))
+            ]
+        impact['mtimes'][str(test_source)] = test_source.stat().st_mtime
+    impact['mtimes'].update(files)
+    failed = {str(test) for test, result in zip(test_sources, test_results['details']) if not result['success']}
+    impact['failed'] = sorted(set(impact['failed']) - {str(t) for t in test_sources} | failed)
+    impact_path.write_text(json.dumps(impact, indent=1), encoding='UTF-8')
+    log('Tests: {}/{} passed, {} skipped', test_results['passed'], test_results['total'], len(skipped))
+    for test_result in test_results['details']:
+        if test_result['timed_out']:
+            wrn('"{}" timed out', test_result['name'])
+        for name in test_result['gtest_results'].get('flaky', []):
+            wrn('"{}" failed only when run in a shard, passed on its own', name)
+    slowest = sorted(
+        (detail for result in test_results['details'] for detail in result['gtest_results'].get('details', [])),
+        key=lambda detail: detail['time'],
+        reverse=True
+    )[:5]
+    for detail in slowest:
+        if detail['time'] >= 1:
+            log('Slow test "{}": {:.2f}s', detail['name'], detail['time'])
+    return test_results
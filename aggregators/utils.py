@@ -2,9 +2,11 @@ import json
 import traceback
 import typing
 import random
+import threading
 import datetime
 from aggregators.config import *
 from aggregators.project_tree import *
+from aggregators.parse_aggregator import DiagnosticsReducer
 
 P = typing.ParamSpec('P')
 R = typing.TypeVar('R')
@@ -40,7 +42,14 @@ def get_https_proxies() -> str:
     return ('https://' + random.choice(context['proxies'])) if config['PROXIES'] else ''
 
 
-stack = []
+class CallStack(threading.local):
+    # Стек @logged-вызовов для отступов в журнале. У каждого потока свой: параллельные запросы
+    # (кандидаты, фоновый перевод) иначе снимали бы со стека чужие вызовы
+    def __init__(self):
+        self.calls = []
+
+
+stack = CallStack()
 
 if config['PROXIES']:
     with open(config['PROXIES'], 'r', encoding='UTF-8') as file:
@@ -74,7 +83,7 @@ def logging(method: typing.Callable[P, str]) -> typing.Callable[P, str]:
 @logging
 def log(msg: str, *args, **kwargs) -> str:
     model, msg = context['model'], msg.format(*args, **kwargs).strip()
-    line = f'{model:<17} | LOG ' + ('---+' * remove_recursion(stack))[:-1] + '| ' + msg
+    line = f'{model:<17} | LOG ' + ('---+' * remove_recursion(stack.calls))[:-1] + '| ' + msg
     print(line)
     return line
 
@@ -82,7 +91,7 @@ def log(msg: str, *args, **kwargs) -> str:
 @logging
 def wrn(msg: str, *args, **kwargs) -> str:
     model, msg = context['model'], msg.format(*args, **kwargs).strip()
-    line = f'{model:<17} | WRN ' + ('---+' * remove_recursion(stack))[:-1] + '| ' + msg
+    line = f'{model:<17} | WRN ' + ('---+' * remove_recursion(stack.calls))[:-1] + '| ' + msg
     print(line)
     return line
 
@@ -92,7 +101,7 @@ def err(msg: str, *args, e: Exception = None, **kwargs) -> str:
     if e is not None:
         traceback.print_exception(e)
     model, msg = context['model'], msg.format(*args, **kwargs).strip()
-    line = f'{model:<17} | ERR ' + ('---+' * remove_recursion(stack))[:-1] + '| ' + msg
+    line = f'{model:<17} | ERR ' + ('---+' * remove_recursion(stack.calls))[:-1] + '| ' + msg
     print(line)
     return line
 
@@ -101,12 +110,12 @@ def logged(method: typing.Callable[P, R]) -> typing.Callable[P, R]:
     def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
         try:
             log(f'Entering the "{method.__name__}" function...')
-            stack.append(method)
+            stack.calls.append(method)
             result = method(*args, **kwargs)
         except Exception as e:
             raise e
         finally:
-            stack.pop()
+            stack.calls.pop()
             log(f'Exit from the "{method.__name__}" function')
         return result
 
@@ -167,6 +176,34 @@ def create_project_structure(project_config: dict, root_dir: str = '.') -> None:
                 file_path.with_suffix('.cpp').touch()
 
 
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def render_dependencies(dependencies: list[FileNode]) -> str:
+    if not dependencies:
+        return ''
+    codes = list[str]()
+    for file in dependencies:
+        name = file.name + '.hpp'
+        path = Path(file.module) / name
+        code = read_from_file(str(project_path / path))
+        if code is not None:
+            codes.append(code)
+        else:
+            codes.append('')  # TODO: error
+    result = '## Dependencies\n'
+    for file, code in zip(dependencies, codes):
+        result += f'### {file.module}/{file.name}.hpp\n```cpp\n{code.strip()}\n```\n'
+    return result
+
+
+def format_diagnostics(diagnostics: list[dict], limit: int | None = None) -> str:
+    # Сводка для промпта исправления не длиннее DIAGNOSTICS_LIMIT символов
+    reducer = DiagnosticsReducer().extend(diagnostics)
+    return reducer.summary(limit or int(config['DIAGNOSTICS_LIMIT']))
+
+
 def query_context(text: str) -> str:
     if '{task}' in text:
         task = read_from_file(context['task'])
@@ -186,6 +223,10 @@ def query_context(text: str) -> str:
             text = text.replace('{project_structure}', project_structure)
         else:
             pass  # TODO: error
+    if '{cycles}' in text:
+        text = text.replace('{cycles}', context['cycles'])
+    if '{cycle_files}' in text:
+        text = text.replace('{cycle_files}', json.dumps(context['cycle_files'], ensure_ascii=False))
     if '{target_file}' in text:
         text = text.replace('{target_file}', context['current_file'])
     if '{realization_instruction}' in text:
@@ -200,32 +241,50 @@ def query_context(text: str) -> str:
     if '{dependencies}' in text:
         project_tree: ProjectTree = context['project_tree']
         name: str = context['current_node'].name
-        dependencies = project_tree.get_subtree(name)[::-1]
-        if not dependencies:
-            text = text.replace('{dependencies}', '')
-        else:
-            codes = list[str]()
-            for file in dependencies:
-                name = file.name + '.hpp'
-                path = Path(file.module) / name
-                code = read_from_file(str(project_path / path))
-                if code is not None:
-                    codes.append(code)
-                else:
-                    codes.append('')  # TODO: error
-            result = '## Dependencies\n'
-            for file, code in zip(dependencies, codes):
-                result += f'### {file.module}/{file.name}.hpp\n```cpp\n{code.strip()}\n```\n'
-            text = text.replace('{dependencies}', result)
+        text = text.replace('{dependencies}', render_dependencies(project_tree.get_subtree(name)[::-1]))
+    if '{batch}' in text:
+        text = text.replace('{batch}', context['batch'])
+    if '{diagnostics}' in text:
+        text = text.replace('{diagnostics}', context['diagnostics'])
+    if '{current_code}' in text:
+        text = text.replace('{current_code}', context['current_code'])
     return text
 
 
-def prompt(name: str) -> str | None:
+# Плейсхолдеры, значение которых меняется от файла к файлу внутри одного этапа
+per_file_placeholders = (
+    '{target_file}', '{realization_instruction}', '{implementation_instruction}', '{dependencies}', '{batch}',
+    '{cycles}', '{cycle_files}', '{diagnostics}', '{current_code}'
+)
+
+
+def split_prompt(text: str) -> tuple[str, str]:
+    # Разбивает шаблон по markdown-заголовкам и отдельно стоящим плейсхолдерам (вне блоков кода):
+    # разделы с пофайловыми плейсхолдерами уходят в суффикс, остальные образуют общий для этапа префикс
+    sections = [[]]
+    fenced = False
+    for line in text.splitlines(keepends=True):
+        if line.startswith('```'):
+            fenced = not fenced
+        elif not fenced and (line.startswith('#') or line.strip() in per_file_placeholders):
+            sections.append([])
+        sections[-1].append(line)
+    prefix, suffix = [], []
+    for section in map(''.join, sections):
+        (suffix if any(p in section for p in per_file_placeholders) else prefix).append(section)
+    return ''.join(prefix), ''.join(suffix)
+
+
+def prompt(name: str) -> str | tuple[str, str] | None:
     path = Path(sys.argv[0]).parent / 'prompts' / (name + '.md')
     if not path.exists() or not path.is_file():
         return None
     with open(path, 'r', encoding='UTF-8') as file:
-        return query_context(file.read())
+        text = file.read()
+    if config['PROMPT_LAYOUT'] == 'prefix':
+        prefix, suffix = split_prompt(text)
+        return query_context(prefix), query_context(suffix)
+    return query_context(text)
 
 
 @logged
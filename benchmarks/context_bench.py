@@ -0,0 +1,87 @@
+import contextlib
+import io
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter as now
+
+from project_tree_bench import chain, random_dag
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_utils():
+    # config ищет config.ini рядом с sys.argv[0] и без --section спрашивает секцию
+    argv = sys.argv
+    sys.argv = [str(ROOT / 'main.py'), '--section=DEFAULT']
+    sys.path.insert(0, str(ROOT))
+    try:
+        import aggregators.utils as utils
+    finally:
+        sys.argv = argv
+    return utils
+
+
+def prepare(utils, directory: Path, project: dict, task_kb: int, header_kb: int) -> str:
+    # Рабочая папка с задачей, заголовками всех файлов и инструкцией для последнего узла
+    tree = utils.ProjectTree(project)
+    project_path = directory / 'project'
+    header = ('// declaration line of a generated header\n' * (header_kb * 1024 // 42 + 1))[:header_kb * 1024]
+    for node in tree:
+        (project_path / node.module).mkdir(parents=True, exist_ok=True)
+        (project_path / node.module / f'{node.name}.hpp').write_text(header, encoding='UTF-8')
+    target = list(tree)[-1]
+    (project_path / target.module / f'{target.name}.md').write_text('Implement the target.\n', encoding='UTF-8')
+    task = directory / 'task.md'
+    task.write_text(('Lorem ipsum task requirement sentence. ' * (task_kb * 1024 // 39 + 1))[:task_kb * 1024],
+                    encoding='UTF-8')
+
+    utils.workspace_path = directory
+    utils.project_path = project_path
+    utils.config['SYSTEM_LOG'] = str(directory / 'logs.txt')
+    utils.context.update({
+        'task': str(task),
+        'project_structure': project,
+        'project_tree': tree,
+        'current_file': target.name,
+        'current_node': target
+    })
+    return target.name
+
+
+def best(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = now()
+        with contextlib.redirect_stdout(io.StringIO()):  # read_from_file логирует каждый вызов
+            function()
+        timings.append(now() - start)
+    return min(timings)
+
+
+def measure(task_kb: int = 512, depth: int = 500, files: int = 5000, header_kb: int = 4,
+            repeat: int = 3) -> dict[str, float]:
+    utils = load_utils()
+    templates = {
+        name: (ROOT / 'prompts' / f'{name}.md').read_text(encoding='UTF-8')
+        for name in ('HppImplementation', 'CppImplementation')
+    }
+    timings = {}
+    for label, project in ((f'chain({depth})', chain(depth)), (f'random_dag({files})', random_dag(files))):
+        with tempfile.TemporaryDirectory() as directory:
+            prepare(utils, Path(directory), project, task_kb, header_kb)
+            for name, text in templates.items():
+                timings[f'query_context {name} {label}'] = best(lambda: utils.query_context(text), repeat)
+            text = templates['HppImplementation']
+            timings[f'split_prompt+query_context {label}'] = best(
+                lambda: [utils.query_context(part) for part in utils.split_prompt(text)], repeat
+            )
+
+    print(f'query_context (task {task_kb} KiB, headers {header_kb} KiB):')
+    for key, value in timings.items():
+        print(f'    {key:<52} {value * 1000:10.2f} ms')
+    return timings
+
+
+if __name__ == '__main__':
+    measure()
@@ -0,0 +1,157 @@
+import json
+import random
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter as now
+
+# parse_aggregator зависит только от стандартной библиотеки и импортируется напрямую,
+# как project_tree в project_tree_bench
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'aggregators'))
+from parse_aggregator import (  # noqa: E402
+    parse_compiler_output, parse_gtest_output, parse_gtest_report, parse_qa, DiagnosticsReducer, iter_compiler_output,
+    ProjectStructureParser
+)
+from project_tree_bench import random_dag  # noqa: E402
+
+
+def compiler_log(megabytes: float, seed: int = 0) -> str:
+    # Смесь диагностик GCC/Clang с контекстом, MSVC и компоновщика
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    while size < megabytes * 2 ** 20:
+        file = f'src/module_{rng.randrange(50)}/file_{rng.randrange(500)}.cpp'
+        line, column = rng.randrange(1, 2000), rng.randrange(1, 120)
+        kind = rng.random()
+        if kind < 0.6:
+            symbol = f'symbol_{rng.randrange(5000)}'
+            text = (f'{file}:{line}:{column}: error: \'{symbol}\' was not declared in this scope\n'
+                    f'  {line} |     return {symbol} + value;\n'
+                    f'      |            ^~~~~~~~~~\n')
+        elif kind < 0.8:
+            text = (f'{file}:{line}:{column}: warning: unused variable \'tmp_{rng.randrange(100)}\' '
+                    f'[-Wunused-variable]\n  {line} |     int tmp;\n      |         ^~~\n')
+        elif kind < 0.9:
+            text = f'{file}({line},{column}): error C2065: \'x_{rng.randrange(100)}\': undeclared identifier\n'
+        elif kind < 0.95:
+            text = f'In file included from {file}:{line}:\n'
+        else:
+            text = f'undefined reference to `function_{rng.randrange(1000)}()\'\n'
+        parts.append(text)
+        size += len(text)
+    return ''.join(parts)
+
+
+def compiler_json_log(megabytes: float, seed: int = 0) -> str:
+    # То же в формате GCC -fdiagnostics-format=json: один массив на единицу трансляции
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    while size < megabytes * 2 ** 20:
+        diagnostics = []
+        for _ in range(rng.randrange(1, 40)):
+            file = f'src/module_{rng.randrange(50)}/file_{rng.randrange(500)}.cpp'
+            caret = {'file': file, 'line': rng.randrange(1, 2000), 'column': rng.randrange(1, 120)}
+            diagnostics.append({
+                'kind': rng.choice(('error', 'warning')),
+                'message': f'\'symbol_{rng.randrange(5000)}\' was not declared in this scope',
+                'locations': [{'caret': caret}],
+                'children': [{'kind': 'note', 'message': 'declared here', 'locations': [{'caret': caret}]}],
+                'column-origin': 1,
+                'escape-source': False
+            })
+        text = json.dumps(diagnostics) + '\n'
+        lines.append(text)
+        size += len(text)
+    return ''.join(lines)
+
+
+def gtest_log(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = ['[==========] Running tests.\n']
+    size = 0
+    count = 0
+    while size < megabytes * 2 ** 20:
+        name = f'Suite{count // 50}.Case{count}'
+        if rng.random() < 0.1:
+            text = (f'[ RUN      ] {name}\n'
+                    f'tests/test_{count % 20}.cpp:{rng.randrange(1, 500)}: Failure\n'
+                    'Expected equality of these values:\n  actual\n    Which is: 4\n  expected\n'
+                    f'[  FAILED  ] {name} ({rng.randrange(100)} ms)\n')
+        else:
+            text = f'[ RUN      ] {name}\n[       OK ] {name} ({rng.randrange(100)} ms)\n'
+        parts.append(text)
+        size += len(text)
+        count += 1
+    parts.append(f'[==========] {count} tests from {count // 50 + 1} test suites ran. (1000 ms total)\n')
+    return ''.join(parts)
+
+
+def gtest_report(tests: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    cases = []
+    for i in range(tests):
+        failure = '<failure message="boom"><![CDATA[test.cpp:1\nExpected equality]]></failure>' \
+            if rng.random() < 0.1 else ''
+        cases.append(f'<testcase name="Case{i}" status="run" result="completed" time="0.0{rng.randrange(10)}" '
+                     f'classname="Suite{i // 50}">{failure}</testcase>')
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n<testsuites tests="{tests}" name="AllTests">\n'
+            f'<testsuite name="All">\n' + '\n'.join(cases) + '\n</testsuite>\n</testsuites>\n')
+
+
+def qa_text(questions: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for i in range(1, questions + 1):
+        lines.append(f'{i}. Which storage backend should module {rng.randrange(100)} use for the cache?')
+        for j in range(rng.randrange(2, 6)):
+            lines.append(f'- Option {j}: a reasonably long answer describing trade-offs number {rng.randrange(1000)}')
+    return '\n'.join(lines)
+
+
+def stream_structure(text: str, chunk: int = 16) -> dict:
+    # Ответ модели приходит кусками по несколько символов
+    parser = ProjectStructureParser()
+    for i in range(0, len(text), chunk):
+        parser.feed(text[i:i + chunk])
+    return parser.close()
+
+
+def best(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = now()
+        function()
+        timings.append(now() - start)
+    return min(timings)
+
+
+def measure(megabytes: float = 4, repeat: int = 3) -> dict[str, float]:
+    timings = {}
+    text_log = compiler_log(megabytes)
+    json_log = compiler_json_log(megabytes)
+    test_log = gtest_log(megabytes)
+    qa = qa_text(2000)
+    timings[f'parse_compiler_output text {megabytes:g}MB'] = best(lambda: parse_compiler_output(text_log), repeat)
+    timings[f'parse_compiler_output json {megabytes:g}MB'] = best(lambda: parse_compiler_output(json_log), repeat)
+    timings[f'DiagnosticsReducer {megabytes:g}MB'] = best(
+        lambda: DiagnosticsReducer().extend(iter_compiler_output(text_log.split('\n'))), repeat
+    )
+    timings[f'parse_gtest_output {megabytes:g}MB'] = best(lambda: parse_gtest_output(test_log), repeat)
+    with tempfile.TemporaryDirectory() as directory:
+        report = Path(directory) / 'report.xml'
+        report.write_text(gtest_report(20000), encoding='UTF-8')
+        timings['parse_gtest_report 20000 tests'] = best(lambda: parse_gtest_report(str(report)), repeat)
+    timings['parse_qa 2000 questions'] = best(lambda: parse_qa(qa), repeat)
+    structure = json.dumps(random_dag(2000), indent=1)
+    timings['ProjectStructureParser 2000 files'] = best(lambda: stream_structure(structure), repeat)
+
+    print('parsers:')
+    for key, value in timings.items():
+        print(f'    {key:<36} {value * 1000:10.2f} ms')
+    return timings
+
+
+if __name__ == '__main__':
+    measure(float(sys.argv[1]) if len(sys.argv) > 1 else 4)
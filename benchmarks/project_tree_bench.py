@@ -0,0 +1,98 @@
+import random
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter as now
+
+# aggregators/__init__ тянет config (интерактивный выбор секции) и сетевые модули,
+# поэтому project_tree импортируется напрямую как самостоятельный модуль
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'aggregators'))
+from project_tree import ProjectTree  # noqa: E402
+
+
+def synthetic_project(files: list[tuple[str, list[str]]], module_size: int = 100) -> dict:
+    modules = []
+    for i in range(0, len(files), module_size):
+        modules.append({
+            'name': f'module_{i // module_size}',
+            'description': '',
+            'files': [
+                {'name': name, 'is_template': j % 3 == 0, 'deps': deps, 'description': ''}
+                for j, (name, deps) in enumerate(files[i:i + module_size], i)
+            ]
+        })
+    return {'project': {'global_rules': {}, 'modules': modules}}
+
+
+def chain(n: int) -> dict:
+    return synthetic_project([(f'F{i}', [f'F{i - 1}'] if i else []) for i in range(n)])
+
+
+def fan_out(n: int) -> dict:
+    return synthetic_project([('F0', [])] + [(f'F{i}', ['F0']) for i in range(1, n)])
+
+
+def random_dag(n: int, max_deps: int = 4, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    files = []
+    for i in range(n):
+        deps = {f'F{rng.randrange(i)}' for _ in range(rng.randint(0, max_deps))} if i else set()
+        files.append((f'F{i}', sorted(deps)))
+    return synthetic_project(files)
+
+
+def measure(name: str, project: dict, queries: int = 1000) -> dict[str, float]:
+    timings = {}
+    start = now()
+    tree = ProjectTree(project)
+    timings['construct'] = now() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'project_structure.bin'
+        start = now()
+        tree.save(path)
+        timings['save'] = now() - start
+        start = now()
+        ProjectTree.load(path)
+        timings['load'] = now() - start
+
+    start = now()
+    for _ in range(10):
+        for _ in tree:
+            pass
+    timings['iterate x10'] = now() - start
+
+    names = [node.name for node in tree]
+    rng = random.Random(1)
+    sample = [rng.choice(names) for _ in range(queries)]
+
+    start = now()
+    tree.get_subtree(names[0])
+    timings['closures'] = now() - start
+
+    start = now()
+    for file in sample:
+        tree.get_subtree(file)
+    timings[f'get_subtree x{queries}'] = now() - start
+
+    start = now()
+    for file in sample:
+        tree.get_dependents(file)
+    timings[f'get_dependents x{queries}'] = now() - start
+
+    start = now()
+    for source, target in zip(sample, reversed(sample)):
+        tree.is_reachable(source, target)
+    timings[f'is_reachable x{queries}'] = now() - start
+
+    print(f'{name}:')
+    for key, value in timings.items():
+        print(f'    {key:<24} {value * 1000:10.2f} ms')
+    return timings
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    measure(f'chain({size})', chain(size))
+    measure(f'fan_out({size})', fan_out(size))
+    measure(f'random_dag({size})', random_dag(size))
@@ -0,0 +1,78 @@
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import parse_bench
+import project_tree_bench
+
+# Изменения меньше этого (в секундах) считаются шумом, даже если относительная разница велика:
+# бенчмарки в доли миллисекунды между запусками на одной машине гуляют на десятки процентов
+MIN_DELTA = 0.005
+
+
+def run(sizes: list[int], megabytes: float, repeat: int) -> dict[str, float]:
+    results = {}
+    for size in sizes:
+        for label, generator in (('chain', project_tree_bench.chain),
+                                 ('fan_out', project_tree_bench.fan_out),
+                                 ('random_dag', project_tree_bench.random_dag)):
+            project = generator(size)
+            runs = [project_tree_bench.measure(f'{label}({size})', project) for _ in range(repeat)]
+            for metric in runs[0]:
+                results[f'ProjectTree {label}({size}) {metric}'] = min(r[metric] for r in runs)
+    results.update(parse_bench.measure(megabytes, repeat))
+    # query_context тянет весь пакет aggregators (config, модели), поэтому импортируется последним
+    import context_bench
+    results.update(context_bench.measure(repeat=repeat))
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float,
+            min_delta: float = MIN_DELTA) -> list[str]:
+    regressions = []
+    print(f'{"benchmark":<64} {"baseline":>10} {"current":>10} {"change":>8}')
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        previous = baseline[name]
+        change = current / previous - 1 if previous else 0.0
+        regressed = change > threshold and current - previous > min_delta
+        mark = '  REGRESSION' if regressed else ''
+        print(f'{name:<64} {previous * 1000:8.2f}ms {current * 1000:8.2f}ms {change:+8.1%}{mark}')
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of ProjectTree, prompt rendering and parsers')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help='ProjectTree graph sizes')
+    parser.add_argument('--megabytes', type=float, default=4, help='size of synthetic compiler and GTest logs')
+    parser.add_argument('--repeat', type=int, default=7, help='runs per benchmark, the best one is kept')
+    parser.add_argument('--output', type=Path, default=Path('benchmark_results.json'), help='where to save results')
+    parser.add_argument('--compare', type=Path, help='baseline results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.3, help='allowed slowdown, 0.3 = 30%%')
+    parser.add_argument('--min-delta', type=float, default=MIN_DELTA,
+                        help='smaller absolute slowdowns in seconds are treated as noise')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.megabytes, args.repeat)
+    args.output.write_text(json.dumps({
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }, indent=1), encoding='UTF-8')
+    print(f'Results saved to {args.output}')
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding='UTF-8'))['results']
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f'{len(regressions)} regressions over {args.threshold:.0%}')
+            sys.exit(1)
+        print('No regressions')
@@ -1,7 +1,11 @@
+import sys
 from aggregators.pipeline_aggregator import *
 import aggregators
 
 if __name__ == '__main__':
+    if '--worker' in sys.argv[1:]:
+        pipeline(run_worker)
+        sys.exit()
     a = {
         "project": {
             "global_rules": {
@@ -62,6 +66,7 @@ if __name__ == '__main__':
         # specify_task,
         # rewrite_task_for_ai,
         create_project_tree,
+        # load_project_tree,
         write_files_instructions,
         write_file_implementation
     )
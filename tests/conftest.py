@@ -0,0 +1,28 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope='session')
+def aggregators(tmp_path_factory):
+    # Пакет aggregators тянет model_aggregator, а config ищет config.ini рядом с sys.argv[0]
+    # и без --section спрашивает секцию
+    pytest.importorskip('requests')
+    argv = sys.argv
+    sys.argv = [str(ROOT / 'main.py'), '--section=DEFAULT']
+    sys.path.insert(0, str(ROOT))
+    try:
+        config = importlib.import_module('aggregators.config').config
+    finally:
+        sys.argv = argv
+    # Журнал, ответы моделей и кэш сборки пишутся во временную папку, чтобы тесты не оставляли файлов в репозитории
+    logs = tmp_path_factory.mktemp('logs')
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setitem(config, 'SYSTEM_LOG', str(logs / 'logs.txt'))
+        patch.setitem(config, 'ANSWER_LOG', str(logs))
+        patch.setitem(config, 'BUILD_CACHE', str(logs / 'cache'))
+        yield importlib.import_module('aggregators')
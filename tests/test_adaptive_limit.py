@@ -0,0 +1,124 @@
+import importlib
+from time import perf_counter
+
+import pytest
+
+
+@pytest.fixture
+def model_aggregator(aggregators, monkeypatch):
+    model_aggregator = importlib.import_module('aggregators.model_aggregator')
+    monkeypatch.setattr(model_aggregator, 'limits', {})
+    monkeypatch.setitem(model_aggregator.utils.context, 'model', 'test-model')
+    return model_aggregator
+
+
+def finish(limit, outcome: str, latency: float = 0.1) -> None:
+    # Запрос с заданным исходом и задержкой; start в прошлом, чтобы задержка не зависела от скорости теста
+    limit.acquire()
+    limit.release(outcome, perf_counter() - latency)
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, lines: list[str] | None = None, error: Exception | None = None):
+        self.status_code = status_code
+        self.headers = {'Content-Type': 'text/event-stream'}
+        self.lines = lines or []
+        self.error = error
+        self.closed = False
+
+    def iter_lines(self, decode_unicode: bool = False):
+        yield from self.lines
+        if self.error is not None:
+            raise self.error
+
+    def close(self) -> None:
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def test_success_raises_limit_by_one_per_window(model_aggregator):
+    limit = model_aggregator.AdaptiveLimit('test', initial=2.0, maximum=16.0)
+    finish(limit, 'ok')
+    assert limit.limit == pytest.approx(2.5)
+    finish(limit, 'ok')
+    assert limit.limit == pytest.approx(2.9)
+    assert limit.in_flight == 0
+
+
+def test_slow_responses_do_not_raise_limit(model_aggregator):
+    limit = model_aggregator.AdaptiveLimit('test', initial=2.0, maximum=16.0)
+    finish(limit, 'ok', latency=0.1)
+    before = limit.limit
+    for _ in range(10):
+        finish(limit, 'ok', latency=10.0)
+    assert limit.limit == before
+
+
+def test_overload_halves_limit_once_per_window(model_aggregator):
+    limit = model_aggregator.AdaptiveLimit('test', initial=8.0, maximum=16.0)
+    start = perf_counter()
+    for _ in range(3):
+        limit.acquire()
+    limit.release('overload', start)
+    assert limit.limit == 4.0
+    # Запросы, ушедшие до сокращения, окно повторно не режут
+    limit.release('overload', start)
+    limit.release('overload', start)
+    assert limit.limit == 4.0
+    finish(limit, 'overload', latency=0.0)
+    assert limit.limit == 2.0
+
+
+def test_error_keeps_limit(model_aggregator):
+    limit = model_aggregator.AdaptiveLimit('test', initial=4.0, maximum=16.0)
+    finish(limit, 'error')
+    assert limit.limit == 4.0
+
+
+def test_limit_stays_between_one_and_maximum(model_aggregator):
+    assert model_aggregator.AdaptiveLimit('test', initial=8.0, maximum=4.0).limit == 4.0
+    limit = model_aggregator.AdaptiveLimit('test', initial=2.0, maximum=4.0)
+    for _ in range(100):
+        finish(limit, 'ok')
+    assert limit.limit == 4.0
+    for _ in range(10):
+        finish(limit, 'overload', latency=0.0)
+    assert limit.limit == 1.0
+
+
+def test_429_and_timeout_halve_limit(model_aggregator, monkeypatch):
+    limit = model_aggregator.current_limit()
+    limit.limit = 8.0
+    monkeypatch.setattr(model_aggregator.requests, 'post', lambda *args, **kwargs: FakeResponse(429))
+    assert model_aggregator.post({'model': 'test-model'}).status_code == 429
+    assert limit.limit == 4.0
+
+    def timeout(*args, **kwargs):
+        raise model_aggregator.requests.exceptions.Timeout('timed out')
+
+    monkeypatch.setattr(model_aggregator.requests, 'post', timeout)
+    with pytest.raises(model_aggregator.requests.exceptions.Timeout):
+        model_aggregator.post({'model': 'test-model'})
+    assert limit.limit == 2.0
+    assert limit.in_flight == 0
+
+
+def test_interrupted_stream_releases_slot(model_aggregator, monkeypatch):
+    monkeypatch.setitem(model_aggregator.config, 'STREAMING', 'true')
+    limit = model_aggregator.current_limit()
+    limit.limit = 4.0
+    lines = ['data: {"choices": [{"delta": {"content": "Hello"}}]}']
+    response = FakeResponse(200, lines, model_aggregator.requests.exceptions.RequestException('connection reset'))
+    monkeypatch.setattr(model_aggregator.requests, 'post', lambda *args, **kwargs: response)
+    parts = []
+    with pytest.raises(ConnectionError, match='Stream was interrupted'):
+        model_aggregator.ask_stream([{'role': 'user', 'content': 'Hi'}], parts.append)
+    assert parts == ['Hello']
+    assert response.closed
+    assert limit.in_flight == 0
+    assert limit.limit == 2.0
@@ -0,0 +1,100 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# parse_aggregator зависит только от стандартной библиотеки и импортируется напрямую, как в benchmarks
+sys.path.insert(0, str(ROOT / 'aggregators'))
+from parse_aggregator import parse_multi_file  # noqa: E402
+
+
+def block(path: str, code: str) -> str:
+    return f'<<<FILE {path}>>>\n{code}\n<<<END FILE>>>\n'
+
+
+def test_multi_file_response_is_split_by_path():
+    text = 'Here are the files:\n' + block('core/A.hpp', '#pragma once\nint a();') + \
+        block('core\\A.cpp', '```cpp\n#include "A.hpp"\nint a() { return 1; }\n```')
+    assert parse_multi_file(text, ['core/A.hpp', 'core/A.cpp']) == {
+        'core/A.hpp': '#pragma once\nint a();',
+        'core/A.cpp': '#include "A.hpp"\nint a() { return 1; }',
+    }
+
+
+def test_multi_file_response_skips_unknown_repeated_and_empty_files():
+    text = block('core/A.hpp', 'first') + block('core/A.hpp', 'second') + block('core/Other.hpp', 'other') + \
+        block('core/A.cpp', '') + '<<<FILE core/B.hpp>>>\nunterminated'
+    assert parse_multi_file(text, ['core/A.hpp', 'core/A.cpp', 'core/B.hpp']) == {'core/A.hpp': 'first'}
+
+
+@pytest.fixture(scope='module')
+def pipeline_aggregator(aggregators):
+    pytest.importorskip('translate')
+    return importlib.import_module('aggregators.pipeline_aggregator')
+
+
+@pytest.fixture
+def project(pipeline_aggregator, monkeypatch, tmp_path):
+    # Base — общая зависимость; Left, Right и Huge на одном уровне модуля core, Other — в другом модуле
+    files = {'core': [('Base', []), ('Left', ['Base']), ('Right', ['Base']), ('Huge', ['Base'])],
+             'extra': [('Other', ['Base'])]}
+    tree = pipeline_aggregator.ProjectTree({'project': {'modules': [
+        {'name': module, 'files': [
+            {'name': name, 'is_template': False, 'deps': deps, 'description': ''} for name, deps in names
+        ]} for module, names in files.items()
+    ]}})
+    for module, names in files.items():
+        (tmp_path / module).mkdir()
+        for name, _ in names:
+            instruction = 'x' * 4000 if name == 'Huge' else f'Implement {name}.'
+            (tmp_path / module / f'{name}.md').write_text(instruction, encoding='UTF-8')
+    (tmp_path / 'core' / 'Base.hpp').write_text('#pragma once\nint base();\n', encoding='UTF-8')
+    utils = importlib.import_module('aggregators.utils')
+    monkeypatch.setattr(utils, 'project_path', tmp_path)
+    monkeypatch.setattr(pipeline_aggregator, 'project_path', tmp_path)
+    monkeypatch.setattr(pipeline_aggregator, 'prompt', lambda name: f'{name} prompt')
+    monkeypatch.setitem(pipeline_aggregator.context, 'project_tree', tree)
+    monkeypatch.setitem(pipeline_aggregator.config, 'BATCH_TOKENS', '1000')
+    return tree
+
+
+def batch_names(batches) -> list[list[str]]:
+    return [[file.name for file in batch] for batch in batches]
+
+
+def test_batches_group_one_level_of_one_module(pipeline_aggregator, project):
+    # Huge превышает половину бюджета и идёт отдельным запросом
+    assert batch_names(pipeline_aggregator.implementation_batches(project)) == [
+        ['Base'], ['Huge'], ['Left', 'Right'], ['Other']
+    ]
+
+
+def test_small_budget_splits_batches(pipeline_aggregator, project, monkeypatch):
+    # Каждая инструкция (8 токенов на .hpp и .cpp) больше половины бюджета, и пакетов не остаётся
+    monkeypatch.setitem(pipeline_aggregator.config, 'BATCH_TOKENS', '12')
+    batches = batch_names(pipeline_aggregator.implementation_batches(project))
+    assert sorted(batches) == [['Base'], ['Huge'], ['Left'], ['Other'], ['Right']]
+    monkeypatch.setitem(pipeline_aggregator.config, 'BATCH_TOKENS', '20')
+    assert ['Left', 'Right'] in batch_names(pipeline_aggregator.implementation_batches(project))
+
+
+def test_batch_writes_parsed_files_and_returns_missing(pipeline_aggregator, project, monkeypatch, tmp_path):
+    requests = []
+
+    def ask(messages, what=None, model=None):
+        requests.append(pipeline_aggregator.context['batch'])
+        return block('core/Left.hpp', '#pragma once\nint left();') + \
+            block('core/Left.cpp', 'int left() { return 0; }') + block('core/Right.hpp', '#pragma once\nint right();')
+
+    monkeypatch.setattr(pipeline_aggregator, 'ask', ask)
+    monkeypatch.setitem(pipeline_aggregator.context, 'batch', '')
+    failed = pipeline_aggregator.write_batch_implementation([project['Left'], project['Right']])
+    assert [(file.name, is_header) for file, is_header in failed] == [('Right', False)]
+    assert (tmp_path / 'core' / 'Left.cpp').read_text(encoding='UTF-8') == 'int left() { return 0; }'
+    assert (tmp_path / 'core' / 'Right.hpp').exists()
+    # Общая зависимость попадает в запрос один раз вместе с инструкциями обоих файлов
+    assert requests[0].count('### core/Base.hpp') == 1
+    assert 'int base();' in requests[0]
+    assert 'Implement Left.' in requests[0] and 'Implement Right.' in requests[0]
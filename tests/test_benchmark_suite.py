@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Бенчмарки запускаются из своего каталога и импортируют друг друга напрямую
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+import parse_bench  # noqa: E402
+import project_tree_bench  # noqa: E402
+import suite  # noqa: E402
+
+
+def test_compare_reports_only_real_regressions(capsys):
+    baseline = {'slow': 0.100, 'noise': 0.001, 'faster': 0.100, 'zero': 0.0, 'removed': 1.0}
+    results = {'slow': 0.150, 'noise': 0.003, 'faster': 0.050, 'zero': 0.010, 'new': 1.0}
+    assert suite.compare(results, baseline, 0.3) == ['slow']
+    table = capsys.readouterr().out.splitlines()
+    # Новые и удалённые бенчмарки не сравниваются
+    assert [line.split()[0] for line in table[1:]] == ['slow', 'noise', 'faster', 'zero']
+    assert table[1].endswith('REGRESSION') and '+50.0%' in table[1]
+    assert suite.compare(results, baseline, 0.3, min_delta=0) == ['slow', 'noise']
+    assert suite.compare(results, baseline, 0.6) == []
+
+
+def test_benchmarks_produce_timings():
+    results = parse_bench.measure(megabytes=0.01, repeat=1)
+    results.update(project_tree_bench.measure('chain(50)', project_tree_bench.chain(50), queries=10))
+    assert results and all(isinstance(value, float) and value >= 0 for value in results.values())
+
+
+def test_synthetic_inputs_parse():
+    errors, warnings = parse_bench.parse_compiler_output(parse_bench.compiler_log(0.01))
+    assert errors and warnings
+    assert parse_bench.parse_gtest_output(parse_bench.gtest_log(0.01))['total']
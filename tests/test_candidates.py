@@ -0,0 +1,88 @@
+import importlib
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def pipeline_aggregator(aggregators):
+    pytest.importorskip('translate')
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    return importlib.import_module('aggregators.pipeline_aggregator')
+
+
+@pytest.fixture
+def project(pipeline_aggregator, monkeypatch, tmp_path):
+    structure = {'project': {'modules': [{'name': 'core', 'files': [
+        {'name': 'Counter', 'is_template': False, 'deps': [], 'description': ''}
+    ]}]}}
+    tree = pipeline_aggregator.ProjectTree(structure)
+    (tmp_path / 'core').mkdir()
+    (tmp_path / 'core' / 'Counter.hpp').write_text('#pragma once\nint count();\n', encoding='UTF-8')
+    monkeypatch.setattr(pipeline_aggregator, 'project_path', tmp_path)
+    monkeypatch.setattr(pipeline_aggregator, 'prompt', lambda name: f'{name} prompt')
+    monkeypatch.setitem(pipeline_aggregator.context, 'project_tree', tree)
+    monkeypatch.setitem(pipeline_aggregator.context, 'model', 'gpt-4o')
+    pipeline_aggregator.prepare_syntax_check(tree)
+    monkeypatch.setitem(pipeline_aggregator.context, 'syntax_check', (
+        pipeline_aggregator.select_cpp_compiler('gcc', []), pipeline_aggregator.context['syntax_check'][1]
+    ))
+    return tmp_path, tree['Counter']
+
+
+def test_candidates_stay_out_of_project(pipeline_aggregator, project, monkeypatch):
+    project_root, file = project
+    answers = iter(['int count() { return missing; }', '#include "Counter.hpp"\nint count() { return 1; }',
+                    '#include "Counter.hpp"\nint count() { return x; }'])
+    models = []
+    lock = threading.Lock()
+
+    def ask(messages, what=None, model=None):
+        # Смена модели в общем context посреди генерации не должна менять уже запущенные запросы
+        with lock:
+            models.append(model)
+            pipeline_aggregator.context['model'] = 'deepseek-v3'
+            return next(answers)
+
+    monkeypatch.setattr(pipeline_aggregator, 'ask', ask)
+    with ThreadPoolExecutor(max_workers=2) as checker:
+        errors, _ = pipeline_aggregator.write_candidates_implementation(file, False, 3, checker)
+    assert models == ['gpt-4o'] * 3
+    assert errors == []
+    assert (project_root / 'core' / 'Counter.cpp').read_text(encoding='UTF-8').endswith('return 1; }')
+    assert sorted(path.name for path in (project_root / 'core').iterdir()) == ['Counter.cpp', 'Counter.hpp']
+
+
+def test_candidates_without_syntax_check_warn(pipeline_aggregator, project, monkeypatch):
+    warnings = []
+    written = []
+    monkeypatch.setitem(pipeline_aggregator.config, 'CANDIDATES', '3')
+    monkeypatch.setitem(pipeline_aggregator.config, 'SYNTAX_CHECK', 'false')
+    monkeypatch.setitem(pipeline_aggregator.config, 'JOB_QUEUE', 'false')
+    monkeypatch.setitem(pipeline_aggregator.config, 'BATCHING', 'false')
+    monkeypatch.setattr(pipeline_aggregator, 'wrn', lambda message, *args: warnings.append(message.format(*args)))
+    monkeypatch.setattr(pipeline_aggregator, 'write_single_implementation',
+                        lambda file, is_header: written.append((file.name, is_header)))
+    assert pipeline_aggregator.write_file_implementation() is True
+    assert written == [('Counter', True), ('Counter', False)]
+    assert any('CANDIDATES = 3 needs SYNTAX_CHECK = true' in warning for warning in warnings)
+
+
+def test_logged_call_stack_is_per_thread(pipeline_aggregator):
+    utils = importlib.import_module('aggregators.utils')
+    depths = []
+    barrier = threading.Barrier(4)
+
+    @utils.logged
+    def nested():
+        barrier.wait()
+        depths.append(len(utils.stack.calls))
+        barrier.wait()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: nested(), range(4)))
+    assert depths == [1] * 4
+    assert utils.stack.calls == []
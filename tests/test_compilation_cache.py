@@ -0,0 +1,57 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# cache_aggregator зависит только от стандартной библиотеки и импортируется напрямую, как в benchmarks
+sys.path.insert(0, str(ROOT / 'aggregators'))
+from cache_aggregator import CompilationCache  # noqa: E402
+
+
+def cache_key(cache: CompilationCache, project_root: Path, code: str) -> str:
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    (project_root / 'src').mkdir(parents=True)
+    (project_root / 'src' / 'a.hpp').write_text('#pragma once\nint a();\n', encoding='UTF-8')
+    source = project_root / 'src' / 'a.cpp'
+    source.write_text('#include "a.hpp"\n' + code, encoding='UTF-8')
+    command = ['g++', '-std=c++20', '-c', str(source), '-o', str(project_root / 'a.o')]
+    return cache.key(command, {'type': 'gcc'}, str(source), project_root)
+
+
+def test_key_is_shared_between_project_roots(tmp_path):
+    cache = CompilationCache(tmp_path / 'cache', 2 ** 20)
+    code = 'int a() { return 1; }\n'
+    assert cache_key(cache, tmp_path / 'one', code) == cache_key(cache, tmp_path / 'two', code)
+
+
+@pytest.mark.parametrize('code', [
+    'const char* a_file() { return __FILE__; }\n',
+    '#include <source_location>\nconst char* a_file() { return std::source_location::current().file_name(); }\n'
+])
+def test_key_keeps_embedded_paths(tmp_path, code):
+    # Объект хранит путь своего проекта, поэтому другой проект не должен получить его из кэша
+    cache = CompilationCache(tmp_path / 'cache', 2 ** 20)
+    assert cache_key(cache, tmp_path / 'one', code) != cache_key(cache, tmp_path / 'two', code)
+
+
+def test_save_scans_cache_only_when_over_limit(tmp_path, monkeypatch):
+    cache = CompilationCache(tmp_path / 'cache', 10000)
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, 'evict', lambda: scans.append(1) or evict())
+    object_path = tmp_path / 'a.o'
+    object_path.write_bytes(b'\0' * 1000)
+    cache.save()
+    for i in range(9):
+        cache.put(f'{i:064x}', object_path, '', tmp_path)
+        cache.save()
+    assert len(scans) == 1
+    for i in range(9, 11):
+        cache.put(f'{i:064x}', object_path, '', tmp_path)
+        cache.save()
+    assert len(scans) == 2
+    assert sum(f.stat().st_size for f in (tmp_path / 'cache').glob('*/*/*')) <= 10000
+    assert cache.stats['evictions'] > 0
@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# parse_aggregator зависит только от стандартной библиотеки и импортируется напрямую, как в benchmarks
+sys.path.insert(0, str(ROOT / 'aggregators'))
+from parse_aggregator import iter_compiler_output, parse_compiler_output, parse_structured_diagnostics  # noqa: E402
+
+GCC_OUTPUT = '''\
+src/Matrix.cpp: In member function 'int Matrix::rows() const':
+src/Matrix.cpp:12:16: error: 'count' was not declared in this scope
+   12 |         return count;
+      |                ^~~~~
+src/Matrix.cpp:20:9: warning: unused variable 'tmp' [-Wunused-variable]
+   20 |     int tmp = 0;
+      |         ^~~
+/usr/bin/ld: main.o: in function `main':
+main.cpp:(.text+0x9): undefined reference to `Matrix::size() const'
+collect2: error: ld returned 1 exit status
+'''
+
+
+def test_gcc_diagnostics_keep_their_context():
+    errors, warnings = parse_compiler_output(GCC_OUTPUT)
+    assert [(e['file'], e['line'], e['column'], e['message']) for e in errors[:1]] == [
+        ('src/Matrix.cpp', 12, 16, "'count' was not declared in this scope")
+    ]
+    assert errors[0]['context'] == '12 |         return count;\n|                ^~~~~'
+    assert [(w['line'], w['message']) for w in warnings] == [(20, "unused variable 'tmp' [-Wunused-variable]")]
+
+
+def test_msvc_and_link_diagnostics():
+    output = '\n'.join([
+        r'C:\project\src\Matrix.cpp(12,16): error C2065: ' + "'count': undeclared identifier",
+        r'C:\project\src\Matrix.cpp(20,9): warning C4101: ' + "'tmp': unreferenced local variable",
+        r'main.obj : error LNK2019: unresolved external symbol "int __cdecl size(void)"',
+        'undefined reference to `Matrix::size() const\'',
+        'LINK : fatal error LNK1120: 1 unresolved externals',
+    ])
+    errors, warnings = parse_compiler_output(output)
+    assert (errors[0]['line'], errors[0]['column'], errors[0]['code']) == (12, 16, 'C2065')
+    assert errors[0]['file'].endswith('Matrix.cpp')
+    assert (warnings[0]['code'], warnings[0]['type']) == ('C4101', 'warning')
+    linking = [error for error in errors if error.get('stage') == 'linking']
+    assert [error['message'] for error in linking][1] == 'Undefined symbol: Matrix::size() const'
+    assert len(linking) == 3
+
+
+def test_diagnostics_are_yielded_while_output_is_still_coming():
+    consumed = []
+
+    def lines():
+        for line in GCC_OUTPUT.split('\n'):
+            consumed.append(line)
+            yield line
+
+    entries = iter_compiler_output(lines())
+    first = next(entries)
+    assert first['line'] == 12
+    # Ошибка отдаётся, как только началась следующая диагностика, не дожидаясь конца вывода
+    assert len(consumed) == 5
+    assert [entry['line'] for entry in entries][:1] == [20]
+
+
+def test_streaming_and_whole_output_parse_the_same():
+    assert parse_compiler_output(GCC_OUTPUT) == parse_compiler_output(GCC_OUTPUT.replace('\n', '\r\n'))
+    streamed = list(iter_compiler_output(GCC_OUTPUT.splitlines(keepends=True)))
+    errors, warnings = parse_compiler_output(GCC_OUTPUT)
+    assert sorted(map(repr, streamed)) == sorted(map(repr, errors + warnings))
+
+
+GCC_JSON = json.dumps([{
+    'kind': 'error',
+    'message': "'count' was not declared in this scope",
+    'option': '',
+    'locations': [{'caret': {'file': 'src/Matrix.cpp', 'line': 12, 'column': 16}}],
+    'children': [{'kind': 'note', 'message': "suggested alternative: 'cout'",
+                  'locations': [{'caret': {'file': '/usr/include/c++/12/iostream', 'line': 61, 'column': 18}}]}],
+    'fixits': [{'start': {'file': 'src/Matrix.cpp', 'line': 12, 'column': 16}, 'string': 'cout'}],
+}, {
+    'kind': 'warning',
+    'message': "unused variable 'tmp'",
+    'option': '-Wunused-variable',
+    'locations': [{'caret': {'file': 'src/Matrix.cpp', 'line': 20, 'column': 9}}],
+}])
+
+SARIF = json.dumps({'version': '2.1.0', 'runs': [{'results': [{
+    'ruleId': '-Wunused-variable',
+    'level': 'warning',
+    'message': {'text': "unused variable 'tmp'"},
+    'locations': [{'physicalLocation': {
+        'artifactLocation': {'uri': 'file:///project/src/My%20Matrix.cpp'},
+        'region': {'startLine': 20, 'startColumn': 9}
+    }}],
+    'fixes': [{'artifactChanges': [{
+        'artifactLocation': {'uri': 'file:///project/src/My%20Matrix.cpp'},
+        'replacements': [{'deletedRegion': {'startLine': 20, 'startColumn': 5}, 'insertedContent': {'text': ''}}]
+    }]}],
+}, {
+    'ruleId': 'error',
+    'level': 'error',
+    'message': {'text': "use of undeclared identifier 'count'"},
+    'locations': [{'physicalLocation': {
+        'artifactLocation': {'uri': 'src/Matrix.cpp'}, 'region': {'startLine': 12, 'startColumn': 16}
+    }}],
+    'relatedLocations': [{'physicalLocation': {
+        'artifactLocation': {'uri': 'src/Matrix.hpp'}, 'region': {'startLine': 3, 'startColumn': 1}
+    }, 'message': {'text': 'declared here'}}],
+}, {
+    'level': 'none',
+    'message': {'text': 'in instantiation of template'},
+}]}]})
+
+
+def test_gcc_json_diagnostics():
+    diagnostics = parse_structured_diagnostics(GCC_JSON)
+    assert [(d['type'], d['file'], d['line'], d['column'], d['code']) for d in diagnostics] == [
+        ('error', 'src/Matrix.cpp', 12, 16, ''), ('warning', 'src/Matrix.cpp', 20, 9, '-Wunused-variable')
+    ]
+    assert diagnostics[0]['context'].splitlines() == [
+        "/usr/include/c++/12/iostream:61:18: note: suggested alternative: 'cout'",
+        'fix-it: src/Matrix.cpp:12:16: replace with "cout"',
+    ]
+
+
+def test_sarif_diagnostics():
+    diagnostics = parse_structured_diagnostics(SARIF)
+    path = os.path.normpath('/project/src/My Matrix.cpp')
+    assert [(d['type'], d['file'], d['line'], d['code']) for d in diagnostics] == [
+        ('warning', path, 20, '-Wunused-variable'),
+        ('error', 'src/Matrix.cpp', 12, ''),
+        ('note', '.', 0, ''),
+    ]
+    assert diagnostics[0]['context'] == f'fix-it: {path}:20:5: replace with ""'
+    assert diagnostics[1]['context'] == 'src/Matrix.hpp:3:1: note: declared here'
+
+
+def test_other_json_is_not_a_diagnostic_document():
+    assert parse_structured_diagnostics('{"name": "value"}') is None
+    assert parse_structured_diagnostics('[1, 2]') is None
+    assert parse_structured_diagnostics('[{"kind": "error"') is None
+
+
+def test_text_and_structured_output_in_one_stream():
+    errors, warnings = parse_compiler_output(f'main.cpp:1:1: error: expected declaration\n{GCC_JSON}\n')
+    assert [error['message'] for error in errors] == ['expected declaration', "'count' was not declared in this scope"]
+    assert len(warnings) == 1
+
+
+def test_real_gcc_json_output(tmp_path):
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    source = tmp_path / 'broken.cpp'
+    source.write_text('int f() {\n    int unused = 0;\n    return missing;\n}\n', encoding='UTF-8')
+    process = subprocess.run(['g++', '-Wall', '-fdiagnostics-format=json', '-fsyntax-only', str(source)],
+                             capture_output=True, text=True)
+    if process.stderr.startswith('g++: error: unrecognized'):
+        pytest.skip('g++ has no JSON diagnostics')
+    errors, warnings = parse_compiler_output(process.stdout + process.stderr)
+    assert [(error['file'], error['line']) for error in errors] == [(str(source), 3)]
+    assert [warning['line'] for warning in warnings] == [2]
@@ -0,0 +1,32 @@
+import importlib
+import shutil
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def build_aggregator(aggregators):
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    return importlib.import_module('aggregators.build_aggregator')
+
+
+def test_build_result_keeps_every_diagnostic(build_aggregator, monkeypatch, tmp_path):
+    # 60 ошибок про один и тот же символ: в результате сборки каждая по отдельности, а свёртка каскадов
+    # и лимит групп применяются только к сводке для промпта исправления
+    for key, value in {'UNITY_BUILD': 'false', 'PCH': 'false', 'MAX_ERRORS': '0'}.items():
+        monkeypatch.setitem(build_aggregator.config, key, value)
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'broken.cpp').write_text(
+        'int unused_value() { int missing = 0; return 1; }\n'
+        + ''.join(f'int f{i}() {{ return missing({i}); }}\n' for i in range(60)),
+        encoding='UTF-8'
+    )
+    result = build_aggregator.compile_cpp_project(str(tmp_path), 'gcc')
+    assert len(result['errors']) == 60
+    assert len({error['line'] for error in result['errors']}) == 60
+    assert any('unused variable' in warning['message'] for warning in result['warnings'])
+
+    utils = importlib.import_module('aggregators.utils')
+    summary = utils.format_diagnostics(result['errors'])
+    assert '59 follow-up diagnostics' in summary
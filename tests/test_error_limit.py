@@ -0,0 +1,36 @@
+import importlib
+import shutil
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def build_aggregator(aggregators):
+    return importlib.import_module('aggregators.build_aggregator')
+
+
+@pytest.fixture
+def compiler_info(build_aggregator):
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    return {**build_aggregator.select_cpp_compiler('gcc', []), 'flags': '-fmax-errors=0'}
+
+
+def test_error_limit_keeps_text_diagnostics(build_aggregator, monkeypatch, compiler_info):
+    monkeypatch.setitem(build_aggregator.config, 'DIAGNOSTICS_FORMAT', 'structured')
+    monkeypatch.setitem(build_aggregator.config, 'MAX_ERRORS', '5')
+    flags = build_aggregator.build_cpp_flags(compiler_info, True, [])
+    assert not any(flag.startswith('-fdiagnostics-format') for flag in flags)
+
+
+def test_error_limit_kills_compiler_midway(build_aggregator, compiler_info, tmp_path):
+    # Десятки тысяч ошибок: без отмены компилятор работал бы до конца и завершился с кодом 1
+    source = tmp_path / 'broken.cpp'
+    source.write_text(''.join(f'int f{i}() {{ return missing_{i}; }}\n' for i in range(50000)), encoding='UTF-8')
+    command = [compiler_info['cpp'], *build_aggregator.build_cpp_flags(compiler_info, True, []),
+               '-fsyntax-only', str(source)]
+    error_limit = build_aggregator.ErrorLimit(5)
+    returncode, _, errors, _ = build_aggregator.compile_cpp_object(command, tmp_path, error_limit)
+    assert error_limit.cancelled.is_set()
+    assert returncode < 0
+    assert errors
@@ -0,0 +1,155 @@
+import importlib
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# parse_aggregator зависит только от стандартной библиотеки и импортируется напрямую, как в benchmarks
+sys.path.insert(0, str(ROOT / 'aggregators'))
+from parse_aggregator import parse_gtest_output, parse_gtest_report  # noqa: E402
+
+REPORT = '''\
+<?xml version="1.0" encoding="UTF-8"?>
+<testsuites tests="4" failures="1" disabled="1" errors="0" time="0.25" name="AllTests">
+  <testsuite name="Matrix" tests="4" failures="1" disabled="1" skipped="1" errors="0" time="0.25">
+    <testcase name="Rows" status="run" result="completed" time="0.001" classname="Matrix" />
+    <testcase name="Multiply" status="run" result="completed" time="0.24" classname="Matrix">
+      <failure message="Expected equality" type=""><![CDATA[Matrix_test.cpp:12
+Expected equality of these values:
+  m.rows()
+    Which is: 3
+  4]]></failure>
+    </testcase>
+    <testcase name="Inverse" status="run" result="skipped" time="0" classname="Matrix">
+      <skipped message="not implemented" />
+    </testcase>
+    <testcase name="DISABLED_Slow" status="notrun" result="suppressed" time="0" classname="Matrix" />
+  </testsuite>
+</testsuites>
+'''
+
+OUTPUT = '''\
+[==========] Running 3 tests from 1 test suite.
+[ RUN      ] Matrix.Rows
+[       OK ] Matrix.Rows (1 ms)
+[ RUN      ] Matrix.Multiply
+Matrix_test.cpp:12: Failure
+Expected equality of these values:
+[  FAILED  ] Matrix.Multiply (240 ms)
+[ RUN      ] Matrix.Inverse
+'''
+
+
+def test_report_is_read_from_xml(tmp_path):
+    path = tmp_path / 'report.xml'
+    path.write_text(REPORT, encoding='UTF-8')
+    result = parse_gtest_report(str(path))
+    assert (result['total'], result['passed']) == (3, 1)
+    assert [(d['name'], d['status']) for d in result['details']] == [
+        ('Matrix.Rows', 'PASSED'), ('Matrix.Multiply', 'FAILED'), ('Matrix.Inverse', 'SKIPPED')
+    ]
+    assert result['failed'] == [{
+        'name': 'Matrix.Multiply',
+        'duration': '240 ms',
+        'output': 'Matrix_test.cpp:12\nExpected equality of these values:\n  m.rows()\n    Which is: 3\n  4'
+    }]
+    assert result['details'][1]['errors'][:2] == ['Matrix_test.cpp:12', 'Expected equality of these values:']
+
+
+def test_missing_or_truncated_report(tmp_path):
+    assert parse_gtest_report(str(tmp_path / 'missing.xml')) is None
+    path = tmp_path / 'report.xml'
+    path.write_text(REPORT[:REPORT.index('<testcase name="Inverse"')], encoding='UTF-8')
+    assert parse_gtest_report(str(path)) is None
+
+
+def test_output_of_crashed_binary():
+    result = parse_gtest_output(OUTPUT)
+    # Итоговой строки нет: процесс упал на Matrix.Inverse
+    assert (result['total'], result['passed']) == (3, 1)
+    assert [(d['name'], d['status']) for d in result['details']] == [
+        ('Matrix.Rows', 'PASSED'), ('Matrix.Multiply', 'FAILED'), ('Matrix.Inverse', 'CRASHED')
+    ]
+    assert result['failed'][0]['output'].splitlines() == [
+        'Matrix_test.cpp:12: Failure', 'Expected equality of these values:', '[  FAILED  ] Matrix.Multiply (240 ms)'
+    ]
+    assert result['failed'][1] == {'name': 'Matrix.Inverse', 'duration': '', 'output': ''}
+
+
+def test_summary_failures_are_not_counted_twice():
+    summary = '[==========] 3 tests from 1 test suite ran. (241 ms total)\n[  FAILED  ] Matrix.Multiply\n'
+    result = parse_gtest_output(OUTPUT.replace('[ RUN      ] Matrix.Inverse\n', '') + summary)
+    assert result['total'] == 3
+    assert [failure['name'] for failure in result['failed']] == ['Matrix.Multiply']
+
+
+@pytest.fixture(scope='module')
+def test_aggregator(aggregators):
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    return importlib.import_module('aggregators.test_aggregator')
+
+
+def gtest_binary(source: Path, code: str) -> Path:
+    source.write_text(code, encoding='UTF-8')
+    executable = source.with_suffix('')
+    process = subprocess.run(['g++', str(source), '-lgtest_main', '-lgtest', '-pthread', '-o', str(executable)],
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        pytest.skip('GoogleTest is not installed')
+    return executable
+
+
+GTEST = '''\
+#include <cstdlib>
+#include <gtest/gtest.h>
+TEST(Matrix, Rows) { EXPECT_EQ(1, 1); }
+TEST(Matrix, Multiply) { EXPECT_EQ(2 * 2, 5) << "custom message"; }
+TEST(Matrix, Inverse) { if (std::getenv("CRASH")) std::abort(); }
+'''
+
+
+def test_real_gtest_binary(test_aggregator, tmp_path):
+    executable = gtest_binary(tmp_path / 'matrix_test.cpp', GTEST)
+    run, results = test_aggregator.run_gtest(str(executable), tmp_path / 'report.xml', 60, 0)
+    assert run['exit_code'] != 0
+    assert (results['total'], results['passed']) == (3, 2)
+    assert [failure['name'] for failure in results['failed']] == ['Matrix.Multiply']
+    assert 'custom message' in results['failed'][0]['output']
+    # Упавший процесс не дописывает отчёт: результаты берутся из текста
+    run, results = test_aggregator.run_gtest(str(executable), tmp_path / 'report.xml', 60, 0, env={'CRASH': '1'})
+    assert [(d['name'], d['status']) for d in results['details']][-1] == ('Matrix.Inverse', 'CRASHED')
+    assert not (tmp_path / 'report.xml').exists()
+
+
+SHARDED = '''\
+#include <cstdlib>
+#include <gtest/gtest.h>
+TEST(Suite, First) {}
+TEST(Suite, Second) {}
+TEST(Suite, Broken) { FAIL() << "always"; }
+// Падает только в общем прогоне, при запуске в одиночку проходит
+TEST(Suite, Flaky) { EXPECT_EQ(std::getenv("GTEST_TOTAL_SHARDS"), nullptr); }
+'''
+
+
+def test_shards_and_flaky_failures(test_aggregator, tmp_path):
+    executable = gtest_binary(tmp_path / 'suite_test.cpp', SHARDED)
+    assert test_aggregator.list_gtest_cases(str(executable), 60, 0) == [
+        'Suite.First', 'Suite.Second', 'Suite.Broken', 'Suite.Flaky'
+    ]
+    run, results = test_aggregator.run_sharded(str(executable), 3, 60, 0)
+    assert run['shards'] == 3 and run['exit_code'] != 0
+    assert sorted(detail['name'] for detail in results['details']) == [
+        'Suite.Broken', 'Suite.First', 'Suite.Flaky', 'Suite.Second'
+    ]
+    assert [failure['name'] for failure in results['failed']] == ['Suite.Broken']
+    assert results['flaky'] == ['Suite.Flaky']
+    assert (results['total'], results['passed']) == (4, 3)
+    # Шардов не больше, чем тестов
+    assert test_aggregator.run_sharded(str(executable), 16, 60, 0)[0]['shards'] == 4
+    run, results = test_aggregator.run_sharded(str(executable), 1, 60, 0)
+    assert run['shards'] == 1 and results['flaky'] == []
@@ -0,0 +1,122 @@
+import importlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def build_aggregator(aggregators):
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    return importlib.import_module('aggregators.build_aggregator')
+
+
+@pytest.fixture
+def project(build_aggregator, monkeypatch, tmp_path):
+    # Без общего кэша: переиспользование объектов проверяется отдельно от него
+    monkeypatch.setattr(build_aggregator, 'cache', None)
+    monkeypatch.setitem(build_aggregator.config, 'BUILD_CACHE_SIZE', '0')
+    (tmp_path / 'src').mkdir()
+    for name in ('A', 'B', 'C', 'D'):
+        (tmp_path / 'src' / f'{name}.hpp').write_text(f'#pragma once\nint {name.lower()}();\n', encoding='UTF-8')
+        (tmp_path / 'src' / f'{name}.cpp').write_text(
+            f'#include "{name}.hpp"\nint {name.lower()}() {{ return 1; }}\n', encoding='UTF-8'
+        )
+    (tmp_path / 'bin').mkdir()
+    return tmp_path
+
+
+def build(build_aggregator, project, **kwargs) -> dict[str, dict]:
+    sources, include_dirs = build_aggregator.find_cpp_source_files(project)
+    compiler_info = build_aggregator.select_cpp_compiler('gcc', sources)
+    units = build_aggregator.compile_cpp_objects(compiler_info, sources, include_dirs, project, project / 'bin',
+                                                 **kwargs)
+    return {os.path.basename(unit['source']): unit for unit in units}
+
+
+def touch(path, seconds: float = 10) -> None:
+    # Время изменения в будущем: сравнение с объектом не зависит от точности часов файловой системы
+    moment = time.time() + seconds
+    os.utime(path, (moment, moment))
+
+
+def compiled(units: dict[str, dict]) -> list[str]:
+    return sorted(name for name, unit in units.items() if not unit['skipped'])
+
+
+def test_unchanged_objects_are_reused(build_aggregator, project):
+    first = build(build_aggregator, project)
+    assert compiled(first) == ['A.cpp', 'B.cpp', 'C.cpp', 'D.cpp']
+    assert all(unit['success'] and os.path.exists(unit['object']) for unit in first.values())
+    assert compiled(build(build_aggregator, project)) == []
+    touch(project / 'src' / 'B.cpp')
+    assert compiled(build(build_aggregator, project)) == ['B.cpp']
+
+
+def test_changed_command_and_failed_units_are_rebuilt(build_aggregator, project):
+    (project / 'src' / 'D.cpp').write_text('int d() { return missing; }\n', encoding='UTF-8')
+    first = build(build_aggregator, project)
+    assert not first['D.cpp']['success'] and first['D.cpp']['errors']
+    # Ошибка компиляции не запоминается как готовый объект
+    second = build(build_aggregator, project)
+    assert compiled(second) == ['D.cpp']
+    assert second['D.cpp']['errors']
+    assert compiled(build(build_aggregator, project, pch_flags=['-DCHANGED'])) == ['A.cpp', 'B.cpp', 'C.cpp', 'D.cpp']
+
+
+def test_units_compile_in_parallel(build_aggregator, project, monkeypatch):
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+    compile_cpp_object = build_aggregator.compile_cpp_object
+
+    def tracked(*args, **kwargs):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        try:
+            time.sleep(0.2)
+            return compile_cpp_object(*args, **kwargs)
+        finally:
+            with lock:
+                running -= 1
+
+    monkeypatch.setattr(build_aggregator, 'compile_cpp_object', tracked)
+    assert all(unit['success'] for unit in build(build_aggregator, project, jobs=4).values())
+    assert peak == 4
+    assert compiled(build(build_aggregator, project, jobs=1)) == []
+
+
+def test_depfile_limits_rebuild_to_including_units(build_aggregator, project):
+    (project / 'src' / 'B.cpp').write_text('#include "B.hpp"\n#include "A.hpp"\nint b() { return a(); }\n',
+                                           encoding='UTF-8')
+    build(build_aggregator, project)
+    include_graph = json.loads((project / 'bin' / 'include_graph.json').read_text(encoding='UTF-8'))
+    graph = {os.path.basename(source): sorted(map(os.path.basename, deps)) for source, deps in include_graph.items()}
+    assert graph['B.cpp'] == ['A.hpp', 'B.hpp']
+    assert graph['C.cpp'] == ['C.hpp']
+    touch(project / 'src' / 'A.hpp')
+    assert compiled(build(build_aggregator, project)) == ['A.cpp', 'B.cpp']
+
+
+def test_removed_header_forces_rebuild(build_aggregator, project):
+    (project / 'src' / 'extra.hpp').write_text('#pragma once\n', encoding='UTF-8')
+    (project / 'src' / 'C.cpp').write_text('#include "C.hpp"\n#include "extra.hpp"\nint c() { return 1; }\n',
+                                           encoding='UTF-8')
+    build(build_aggregator, project)
+    (project / 'src' / 'extra.hpp').unlink()
+    units = build(build_aggregator, project)
+    assert compiled(units) == ['C.cpp']
+    assert not units['C.cpp']['success']
+
+
+def test_depfile_parsing(build_aggregator):
+    text = 'bin/obj/src/A.cpp.o: src/A.cpp src/A.hpp \\\n  src/dir\\ with\\ space/B.hpp \\\r\n /usr/include/x.h\n'
+    assert build_aggregator.parse_depfile(text) == [
+        'src/A.cpp', 'src/A.hpp', 'src/dir with space/B.hpp', '/usr/include/x.h'
+    ]
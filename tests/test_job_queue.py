@@ -0,0 +1,95 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# job_queue зависит только от стандартной библиотеки и импортируется напрямую
+sys.path.insert(0, str(ROOT / 'aggregators'))
+from job_queue import JobQueue  # noqa: E402
+
+# Воркер в отдельном процессе: берёт задачи, пока они не кончатся, и записывает, какие завершил именно он
+WORKER = '''
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+from job_queue import JobQueue
+queue = JobQueue(sys.argv[2])
+name, lease = sys.argv[3], float(sys.argv[4])
+completed = []
+while True:
+    job = queue.lease(name, lease)
+    if job is None:
+        if queue.remaining() == 0:
+            break
+        time.sleep(0.05)
+        continue
+    time.sleep(0.02)
+    if queue.complete(job['id'], name, {'worker': name}):
+        completed.append(job['id'])
+print(json.dumps(completed))
+'''
+
+
+def start_worker(path: Path, name: str, lease: float) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, '-c', WORKER, str(ROOT / 'aggregators'), str(path), name, str(lease)],
+        stdout=subprocess.PIPE, text=True
+    )
+
+
+def chain(count: int) -> list[dict]:
+    # Каждая третья задача зависит от предыдущей, остальные независимы
+    return [{'id': f'job{i}', 'kind': 'test', 'deps': [f'job{i - 1}'] if i % 3 == 2 else []} for i in range(count)]
+
+
+def test_two_workers_complete_each_job_once(tmp_path):
+    path = tmp_path / 'jobs.sqlite3'
+    JobQueue(path).add(chain(30))
+    workers = [start_worker(path, name, 60) for name in ('first', 'second')]
+    completed = []
+    for worker in workers:
+        stdout, _ = worker.communicate(timeout=120)
+        assert worker.returncode == 0
+        completed += json.loads(stdout)
+    assert sorted(completed) == sorted(f'job{i}' for i in range(30))
+    assert JobQueue(path).counts() == {'done': 30}
+
+
+def test_expired_lease_is_reclaimed_by_another_process(tmp_path):
+    path = tmp_path / 'jobs.sqlite3'
+    queue = JobQueue(path)
+    queue.add(chain(1))
+    # Первый воркер берёт задачу и «падает», не завершив её
+    crashed = subprocess.run(
+        [sys.executable, '-c', 'import sys; sys.path.insert(0, sys.argv[1]); from job_queue import JobQueue; '
+                               'print(JobQueue(sys.argv[2]).lease("crashed", 0.5)["id"])',
+         str(ROOT / 'aggregators'), str(path)],
+        capture_output=True, text=True, timeout=60
+    )
+    assert crashed.stdout.strip() == 'job0'
+    worker = start_worker(path, 'second', 60)
+    stdout, _ = worker.communicate(timeout=120)
+    assert json.loads(stdout) == ['job0']
+    # Поздний ответ упавшего воркера не перезаписывает результат
+    assert queue.complete('job0', 'crashed', {'worker': 'crashed'}) is False
+    assert queue.counts() == {'done': 1}
+
+
+def test_retry_failed_stops_when_total_attempts_are_used(tmp_path):
+    queue = JobQueue(tmp_path / 'jobs.sqlite3')
+    queue.add([{'id': 'broken', 'kind': 'test'}, {'id': 'dependent', 'kind': 'test', 'deps': ['broken']}])
+    rounds = 0
+    while True:
+        job = queue.lease('worker', 60)
+        assert job['id'] == 'broken'
+        queue.fail('broken', 'worker', 'always fails', 2)
+        job = queue.lease('worker', 60)
+        queue.fail(job['id'], 'worker', 'always fails', 2)
+        rounds += 1
+        assert {job['id'] for job in queue.failed()} == {'broken', 'dependent'}
+        if queue.retry_failed(5) == 0:
+            break
+    # По 2 попытки за запуск: после третьего запуска бюджет в 5 попыток исчерпан, зависимая задача снова отменена
+    assert rounds == 3
+    assert queue.lease('worker', 60) is None
+    assert queue.counts() == {'failed': 2}
@@ -0,0 +1,40 @@
+import importlib
+import shutil
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def build_aggregator(aggregators):
+    return importlib.import_module('aggregators.build_aggregator')
+
+
+@pytest.fixture
+def project(tmp_path):
+    # Как в сгенерированном проекте: .cpp включает только свой .hpp, стандартные заголовки — в .hpp
+    headers = {'Matrix': ['<vector>', '<string>', '"Vector.hpp"'], 'Vector': ['<array>', '<string>'],
+               'Solver': ['<map>', '"Matrix.hpp"']}
+    for name, includes in headers.items():
+        module = tmp_path / ('math' if name != 'Solver' else 'solver')
+        module.mkdir(exist_ok=True)
+        (module / f'{name}.hpp').write_text(
+            '#pragma once\n' + ''.join(f'#include {include}\n' for include in includes), encoding='UTF-8'
+        )
+        (module / f'{name}.cpp').write_text(f'#include "{name}.hpp"\n', encoding='UTF-8')
+    return tmp_path
+
+
+def test_common_includes_follow_project_headers(build_aggregator, project):
+    sources, include_dirs = build_aggregator.find_cpp_source_files(project)
+    # <string> доходит до всех трёх TU, <vector> — до Matrix и Solver, <array> — до всех через Vector.hpp
+    assert build_aggregator.collect_common_includes(sources, include_dirs) == ['<array>', '<string>', '<vector>']
+
+
+def test_precompiled_header_is_built_from_transitive_includes(build_aggregator, project):
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    sources, include_dirs = build_aggregator.find_cpp_source_files(project)
+    compiler_info = build_aggregator.select_cpp_compiler('gcc', sources)
+    (project / 'bin').mkdir()
+    flags = build_aggregator.build_precompiled_header(compiler_info, sources, include_dirs, project, project / 'bin')
+    assert flags and (project / 'bin' / 'pch' / 'common.hpp.gch').exists()
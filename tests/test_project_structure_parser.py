@@ -0,0 +1,92 @@
+import importlib
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# parse_aggregator зависит только от стандартной библиотеки и импортируется напрямую, как в benchmarks
+sys.path.insert(0, str(ROOT / 'aggregators'))
+from parse_aggregator import ProjectStructureParser  # noqa: E402
+
+
+def prompt_example() -> str:
+    # Пример из промпта ProjectStructure: ответ модели по этому образцу должен приниматься
+    text = (ROOT / 'prompts' / 'ProjectStructure.md').read_text(encoding='UTF-8')
+    start = text.index('```json', text.index('## Example')) + len('```json')
+    return text[start:text.index('```', start)]
+
+
+def stream(text: str, chunk: int = 7) -> dict:
+    parser = ProjectStructureParser()
+    for i in range(0, len(text), chunk):
+        parser.feed(text[i:i + chunk])
+    return parser.close()
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 64, 1 << 20])
+def test_prompt_example_is_accepted(chunk):
+    example = prompt_example()
+    assert stream(f'```json\n{example}\n```', chunk) == json.loads(example)
+
+
+def test_unknown_project_dependency_is_rejected():
+    example = json.loads(prompt_example())
+    example['project']['modules'][0]['files'][1]['deps'].append('Quaternion')
+    with pytest.raises(ValueError, match='unknown dependencies: Quaternion'):
+        stream(json.dumps(example))
+
+
+@pytest.mark.parametrize('text', [
+    '{"project": {"modules": [{"name": "m", "files": [{"name": "a", "is_template": "no"',
+    '{"project": {"modules": [{"name": "m", "files": [{"name": "a"}]}]}}',
+    '{"project": {"modules": [tru]}}',
+    '{"project": {"modules": []',
+])
+def test_malformed_structure_is_rejected(text):
+    with pytest.raises(ValueError):
+        stream(text, 1)
+
+
+def test_error_is_raised_while_the_rest_is_still_coming():
+    example = prompt_example()
+    broken = example.replace('"is_template": false', '"is_template": "no"', 1)
+    position = broken.index('"no"') + len('"no"')
+    parser = ProjectStructureParser()
+    fed = 0
+    with pytest.raises(ValueError):
+        for char in broken:
+            fed += 1
+            parser.feed(char)
+    assert fed == position < len(broken)
+
+
+def test_structure_stream_is_closed_on_first_error(aggregators, monkeypatch):
+    model_aggregator = importlib.import_module('aggregators.model_aggregator')
+    monkeypatch.setitem(model_aggregator.config, 'STREAMING', 'true')
+    monkeypatch.setitem(model_aggregator.utils.context, 'model', 'test-model')
+    sent = []
+
+    class Response:
+        status_code = 200
+        headers = {'Content-Type': 'text/event-stream'}
+        closed = False
+
+        def iter_lines(self, decode_unicode=False):
+            for chunk in ['{"project": {"modules": [', 'tru', 'e]}}', ' trailing text']:
+                sent.append(chunk)
+                yield f'data: {json.dumps({"choices": [{"delta": {"content": chunk}}]})}'
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *_):
+            self.closed = True
+
+    response = Response()
+    monkeypatch.setattr(model_aggregator.requests, 'post', lambda *args, **kwargs: response)
+    with pytest.raises(ValueError):
+        model_aggregator.ask_stream([{'role': 'user', 'content': 'structure'}], ProjectStructureParser().feed)
+    assert sent == ['{"project": {"modules": [', 'tru', 'e]}}']
+    assert response.closed
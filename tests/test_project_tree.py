@@ -0,0 +1,184 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# project_tree зависит только от стандартной библиотеки и импортируется напрямую, как в benchmarks
+sys.path.insert(0, str(ROOT / 'aggregators'))
+from project_tree import ProjectTree  # noqa: E402
+
+
+def project(files: list[tuple[str, list[str]]] | None = None) -> dict:
+    if files is None:
+        files = [('Vector3D', []), ('Matrix', ['Vector3D', '<concepts>']), ('Solver', ['Matrix', 'Vector3D'])]
+    return {'project': {'modules': [{'name': 'math', 'files': [
+        {'name': name, 'is_template': False, 'deps': deps, 'description': ''} for name, deps in files
+    ]}]}}
+
+
+def mixed_project() -> dict:
+    # Несколько модулей, шаблоны, не-ASCII имена, повторное объявление файла и цикл
+    return {'project': {'modules': [
+        {'name': 'core', 'files': [
+            {'name': 'Base', 'is_template': False, 'deps': ['<vector>'], 'description': 'База'},
+            {'name': 'Вектор', 'is_template': True, 'deps': ['Base'], 'description': ''},
+        ]},
+        {'name': 'app', 'files': [
+            {'name': 'Base', 'is_template': True, 'deps': [], 'description': 'duplicate'},
+            {'name': 'Loop', 'is_template': False, 'deps': ['Back', 'Вектор'], 'description': ''},
+            {'name': 'Back', 'is_template': False, 'deps': ['Loop'], 'description': ''},
+            {'name': 'Main', 'is_template': False, 'deps': ['Вектор', 'Base'], 'description': ''},
+        ]},
+    ]}}
+
+
+def snapshot(tree: ProjectTree) -> dict:
+    # Всё, что видно снаружи, плюс сами CSR-массивы
+    nodes = tree._indexed_nodes
+    return {
+        'nodes': [(node.name, node.module, node.is_template, node.depth, node.dependencies, node.dependents)
+                  for node in nodes],
+        'order': [node.name for node in tree],
+        'levels': [[node.name for node in level] for level in tree.levels],
+        'roots': [node.name for node in tree.roots],
+        'cycles': [[node.name for node in cycle] for cycle in tree.cycles],
+        'describe_cycles': tree.describe_cycles(),
+        'module_names': tree.module_names,
+        'total_files': tree.total_files,
+        'project_data': tree.project_data,
+        'csr': [list(data) for data in (tree._dep_offsets, tree._dep_indices, tree._rev_offsets, tree._rev_indices)],
+    }
+
+
+@pytest.mark.parametrize('data', [project(), mixed_project(), {'project': {'modules': []}}],
+                         ids=['dag', 'mixed', 'empty'])
+def test_save_load_round_trip(tmp_path, data):
+    tree = ProjectTree(data)
+    tree.save(tmp_path / 'tree.bin')
+    loaded = ProjectTree.load(tmp_path / 'tree.bin')
+    assert snapshot(loaded) == snapshot(tree)
+    # Загруженное дерево сохраняется в тот же файл байт в байт
+    loaded.save(tmp_path / 'again.bin')
+    assert (tmp_path / 'again.bin').read_bytes() == (tmp_path / 'tree.bin').read_bytes()
+
+
+def test_queries_after_load(tmp_path):
+    ProjectTree(mixed_project()).save(tmp_path / 'tree.bin')
+    tree = ProjectTree.load(tmp_path / 'tree.bin')
+    assert [node.name for node in tree.get_subtree('Main')] == ['Base', 'Вектор', 'Main']
+    assert tree.is_reachable('Loop', 'Base')
+    assert 'Вектор' in tree and 'Missing' not in tree
+    assert len(tree) == 5
+
+
+def test_foreign_file_is_value_error(tmp_path):
+    path = tmp_path / 'tree.bin'
+    ProjectTree(project()).save(path)
+    data = bytearray(path.read_bytes())
+    data[:4] = b'XXXX'
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        ProjectTree.load(path)
+
+
+@pytest.mark.parametrize('size', [0, 3, 20, -1])
+def test_truncated_file_is_value_error(tmp_path, size):
+    # Обрезанный файл должен давать ValueError, по которому load_project_tree откатывается на JSON
+    path = tmp_path / 'tree.bin'
+    ProjectTree(project()).save(path)
+    data = path.read_bytes()
+    path.write_bytes(data[:size])
+    with pytest.raises(ValueError):
+        ProjectTree.load(path)
+
+
+def diamond() -> ProjectTree:
+    # Base <- Left, Right <- Top; Extra отдельно, Leaf зависит от Top
+    return ProjectTree(project([
+        ('Top', ['Left', 'Right']), ('Left', ['Base']), ('Right', ['Base']), ('Base', []), ('Extra', []),
+        ('Leaf', ['Top'])
+    ]))
+
+
+def test_order_puts_dependencies_first():
+    tree = diamond()
+    order = [node.name for node in tree]
+    assert sorted(order) == ['Base', 'Extra', 'Leaf', 'Left', 'Right', 'Top']
+    for position, node in enumerate(tree):
+        assert all(order.index(dependency) < position for dependency in node.dependencies)
+
+
+def test_levels_group_files_by_depth():
+    tree = diamond()
+    assert [sorted(node.name for node in level) for level in tree.levels] == [
+        ['Base', 'Extra'], ['Left', 'Right'], ['Top'], ['Leaf']
+    ]
+    depths = {'Base': 0, 'Extra': 0, 'Left': 1, 'Right': 1, 'Top': 2, 'Leaf': 3}
+    assert {node.name: node.depth for node in tree} == depths
+    assert sorted(node.name for node in tree.roots) == ['Base', 'Extra']
+    # Порядок и уровни считаются один раз и дальше берутся из кэша
+    assert tree.levels is tree.levels
+    assert tree._topological_order is tree._topological_order
+
+
+def test_closures_answer_subtree_dependents_and_reachability():
+    tree = diamond()
+    assert [node.name for node in tree.get_subtree('Top')] == [
+        node.name for node in tree if node.name in {'Top', 'Left', 'Right', 'Base'}
+    ]
+    assert {node.name for node in tree.get_dependents('Left')} == {'Left', 'Top', 'Leaf'}
+    assert tree.is_reachable('Leaf', 'Base')
+    assert not tree.is_reachable('Base', 'Leaf')
+    assert not tree.is_reachable('Top', 'Extra')
+    with pytest.raises(KeyError):
+        tree.get_subtree('Missing')
+
+
+def test_closures_reject_cycles():
+    tree = ProjectTree(project([('Base', []), ('A', ['B', 'Base']), ('B', ['A'])]))
+    assert [node.name for node in tree.get_subtree('Base')] == ['Base']
+    with pytest.raises(ValueError):
+        tree.get_subtree('A')
+    with pytest.raises(ValueError):
+        tree.get_dependents('Base')
+
+
+def cycle_names(tree: ProjectTree) -> list[list[str]]:
+    return [[node.name for node in cycle] for cycle in tree.cycles]
+
+
+def test_dag_has_no_cycles():
+    tree = ProjectTree(project())
+    assert not tree.has_cycle
+    assert tree.cycles == ()
+    assert tree.cycle_edges == ()
+    assert tree.describe_cycles() == ''
+
+
+def test_self_loop_is_a_cycle():
+    tree = ProjectTree(project([('Base', []), ('Self', ['Base', 'Self'])]))
+    assert cycle_names(tree) == [['Self']]
+    assert tree.cycle_edges == (('Self', 'Self'),)
+    assert tree.describe_cycles() == '1. math/Self -> math/Self'
+
+
+def test_disjoint_cycles_are_separate_components():
+    # F зависит от цикла, но сам в него не входит и чинить его не нужно
+    tree = ProjectTree(project([
+        ('Base', []), ('A', ['B', 'Base']), ('B', ['A']), ('C', ['E']), ('D', ['C']), ('E', ['D']), ('F', ['A'])
+    ]))
+    assert cycle_names(tree) == [['A', 'B'], ['C', 'D', 'E']]
+    assert sorted(tree.cycle_edges) == [('A', 'B'), ('B', 'A'), ('C', 'E'), ('D', 'C'), ('E', 'D')]
+    assert tree.describe_cycles().splitlines() == [
+        '1. math/A -> math/B -> math/A',
+        '2. math/C -> math/E -> math/D -> math/C',
+    ]
+    assert [node.name for node in tree] == ['Base']
+
+
+def test_long_cycle_does_not_hit_recursion_limit():
+    count = sys.getrecursionlimit() * 2
+    tree = ProjectTree(project([(f'N{i}', [f'N{(i + 1) % count}']) for i in range(count)]))
+    assert len(tree.cycles) == 1
+    assert len(tree.cycles[0]) == count
@@ -0,0 +1,74 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def shared_prefix_ratio(requests: list[str]) -> float:
+    # Доля символов запросов, совпадающая с самым длинным префиксом одного из предыдущих запросов:
+    # примерно столько провайдер может взять из своего кэша префиксов
+    shared = sum(
+        max((len(os.path.commonprefix((request, previous))) for previous in requests[:i]), default=0)
+        for i, request in enumerate(requests)
+    )
+    return shared / sum(map(len, requests))
+
+
+def render(messages: list[dict[str, str]]) -> str:
+    return ''.join(f'{message["role"]}\0{message["content"]}\0' for message in messages)
+
+
+@pytest.fixture
+def utils(aggregators, tmp_path, monkeypatch):
+    utils = importlib.import_module('aggregators.utils')
+    monkeypatch.setattr(sys, 'argv', [str(ROOT / 'main.py')])  # prompt() ищет prompts рядом с sys.argv[0]
+    files = [(f'Node{i}', [f'Node{i - 1}'] if i else []) for i in range(8)]
+    project = {'project': {'modules': [{'name': 'core', 'files': [
+        {'name': name, 'is_template': False, 'deps': deps, 'description': f'{name} description'}
+        for name, deps in files
+    ]}]}}
+    (tmp_path / 'core').mkdir()
+    for name, _ in files:
+        (tmp_path / 'core' / f'{name}.hpp').write_text(f'#pragma once\nint {name}();\n', encoding='UTF-8')
+        (tmp_path / 'core' / f'{name}.md').write_text(f'Implement {name}.\n', encoding='UTF-8')
+    (tmp_path / 'task.md').write_text('Requirement of the task. ' * 400, encoding='UTF-8')
+    monkeypatch.setattr(utils, 'workspace_path', tmp_path)
+    monkeypatch.setattr(utils, 'project_path', tmp_path)
+    monkeypatch.setitem(utils.context, 'task', str(tmp_path / 'task.md'))
+    monkeypatch.setitem(utils.context, 'project_structure', project)
+    monkeypatch.setitem(utils.context, 'project_tree', utils.ProjectTree(project))
+    return utils
+
+
+def stage_requests(utils, monkeypatch, name: str, layout: str) -> list:
+    # Промпты одного этапа для всех файлов проекта подряд, как их отправляет пайплайн
+    simply = importlib.import_module('aggregators.model_aggregator').simply
+    monkeypatch.setitem(utils.config, 'PROMPT_LAYOUT', layout)
+    requests = []
+    for node in utils.context['project_tree']:
+        monkeypatch.setitem(utils.context, 'current_file', node.name)
+        monkeypatch.setitem(utils.context, 'current_node', node)
+        monkeypatch.setitem(utils.context, 'diagnostics', f'{node.name}.cpp:1:1: error: something')
+        monkeypatch.setitem(utils.context, 'current_code', f'int {node.name}() {{ return 0 }}')
+        requests.append(simply(utils.prompt(name)))
+    return requests
+
+
+@pytest.mark.parametrize('name', ['FileRealizationInstruction', 'HppImplementation', 'FixImplementation'])
+def test_prefix_layout_keeps_system_prefix_stable(utils, monkeypatch, name):
+    prefixed = stage_requests(utils, monkeypatch, name, 'prefix')
+    assert all(messages[0]['role'] == 'system' for messages in prefixed)
+    assert len({messages[0]['content'].encode('UTF-8') for messages in prefixed}) == 1
+    assert '{task}' not in prefixed[0][0]['content']
+
+    inline = stage_requests(utils, monkeypatch, name, 'inline')
+    ratios = {
+        'inline': shared_prefix_ratio([render(messages) for messages in inline]),
+        'prefix': shared_prefix_ratio([render(messages) for messages in prefixed])
+    }
+    print(f'{name}: shared prefix {ratios["inline"]:.1%} inline, {ratios["prefix"]:.1%} prefix')
+    assert ratios['prefix'] > ratios['inline']
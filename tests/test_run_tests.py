@@ -0,0 +1,208 @@
+import importlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def test_aggregator(aggregators):
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    return importlib.import_module('aggregators.test_aggregator')
+
+
+@pytest.fixture
+def project(tmp_path):
+    # Модуль core лежит в каталоге src; C подключает A, хотя в структуре проекта от него не зависит
+    files = {'A': [], 'B': ['A'], 'C': []}
+    for name, deps in files.items():
+        (tmp_path / 'src').mkdir(exist_ok=True)
+        (tmp_path / 'src' / f'{name}.hpp').write_text(f'#pragma once\nint {name.lower()}();\n', encoding='UTF-8')
+        includes = ''.join(f'#include "{dep}.hpp"\n' for dep in deps + (['A'] if name == 'C' else []))
+        (tmp_path / 'src' / f'{name}.cpp').write_text(
+            f'#include "{name}.hpp"\n{includes}int {name.lower()}() {{ return 1; }}\n', encoding='UTF-8'
+        )
+    (tmp_path / 'tests').mkdir()
+    (tmp_path / 'tests' / 'a_test.cpp').write_text('#include "A.hpp"\nint main() { return a() - 1; }\n',
+                                                   encoding='UTF-8')
+    structure = {'project': {'modules': [{'name': 'core', 'files': [
+        {'name': name, 'is_template': False, 'deps': deps, 'description': ''} for name, deps in files.items()
+    ]}]}}
+    return tmp_path, importlib.import_module('aggregators.project_tree').ProjectTree(structure)
+
+
+@pytest.fixture
+def builds(test_aggregator, monkeypatch):
+    # Результаты сборки, которую run_tests запускает перед тестами
+    results = []
+    compile_cpp_project = test_aggregator.compile_cpp_project
+
+    def record(*args, **kwargs):
+        results.append(compile_cpp_project(*args, **kwargs))
+        return results[-1]
+
+    monkeypatch.setattr(test_aggregator, 'compile_cpp_project', record)
+    monkeypatch.setitem(test_aggregator.config, 'PCH', 'false')
+    return results
+
+
+def test_run_tests_checks_include_graph(test_aggregator, project, builds, monkeypatch):
+    project_root, project_tree = project
+    monkeypatch.setitem(test_aggregator.config, 'UNITY_BUILD', 'false')
+    test_aggregator.run_tests(project_root, 'gcc', project_tree=project_tree, run_all=True)
+    assert builds[0]['library']
+    assert any('includes "A"' in warning for warning in builds[0]['include_warnings'])
+
+
+def test_run_tests_groups_unity_by_module(test_aggregator, project, builds, monkeypatch):
+    project_root, project_tree = project
+    monkeypatch.setitem(test_aggregator.config, 'UNITY_BUILD', 'true')
+    test_aggregator.run_tests(project_root, 'gcc', project_tree=project_tree, run_all=True)
+    assert builds[0]['library']
+    # Без дерева группа называлась бы по каталогу: src.cpp
+    assert [unit['source'] for unit in builds[0]['units']] == [str(project_root / 'bin' / 'unity' / 'core.cpp')]
+
+
+@pytest.mark.parametrize('wrapper', ['prlimit', 'sh'])
+def test_memory_limit_applies_to_test_binary(test_aggregator, monkeypatch, wrapper):
+    if os.name != 'posix' or shutil.which(wrapper) is None:
+        pytest.skip(f'{wrapper} is not available')
+    if wrapper == 'sh':
+        monkeypatch.setattr(test_aggregator.shutil, 'which', lambda name: None)
+    allocate = ['-c', 'bytearray(512 * 2 ** 20); print("allocated")']
+    limited = test_aggregator.run_test_binary(sys.executable, 60, 256, allocate)
+    assert limited['exit_code'] != 0 and 'MemoryError' in limited['output']
+    unlimited = test_aggregator.run_test_binary(sys.executable, 60, 0, allocate)
+    assert unlimited['exit_code'] == 0 and 'allocated' in unlimited['output']
+
+
+@pytest.mark.parametrize('tests, shards', [(1, 8), (4, 2), (16, 1)])
+def test_default_shards_split_cores_between_binaries(test_aggregator, project, builds, monkeypatch, tests, shards):
+    project_root, project_tree = project
+    for i in range(1, tests):
+        (project_root / 'tests' / f'a{i}_test.cpp').write_text('int main() { return 0; }\n', encoding='UTF-8')
+    monkeypatch.setattr(test_aggregator.os, 'cpu_count', lambda: 8)
+    monkeypatch.setitem(test_aggregator.config, 'TEST_JOBS', '0')
+    monkeypatch.setitem(test_aggregator.config, 'TEST_SHARDS', '0')
+    used = []
+
+    def run(test, *args):
+        # Подменяет компиляцию и запуск теста; каталог сборки тестов обычно создаёт compile_and_run_test
+        used.append(args[-1])
+        (project_root / 'bin' / 'tests').mkdir(exist_ok=True)
+        return {'name': test.name, 'success': True, 'output': '', 'errors': [], 'gtest_results': {},
+                'timed_out': False}
+
+    monkeypatch.setattr(test_aggregator, 'compile_and_run_test', run)
+    test_aggregator.run_tests(project_root, 'gcc', project_tree=project_tree, run_all=True)
+    assert used == [shards] * tests
+
+
+def touch(path) -> None:
+    # Время изменения в будущем: сравнение с прошлым запуском не зависит от точности часов файловой системы
+    moment = time.time() + 10
+    os.utime(path, (moment, moment))
+
+
+def selected(test_aggregator, project_root, project_tree, **kwargs) -> list[str]:
+    results = test_aggregator.run_tests(project_root, 'gcc', project_tree=project_tree, **kwargs)
+    assert not results['failed'], results['failed']
+    return [detail['name'] for detail in results['details']]
+
+
+def test_only_affected_tests_are_run(test_aggregator, project, builds, monkeypatch):
+    project_root, project_tree = project
+    monkeypatch.setitem(test_aggregator.config, 'UNITY_BUILD', 'false')
+    (project_root / 'tests' / 'c_test.cpp').write_text('#include "C.hpp"\nint main() { return c() - 1; }\n',
+                                                       encoding='UTF-8')
+    assert selected(test_aggregator, project_root, project_tree, run_all=False) == ['a_test.cpp', 'c_test.cpp']
+    results = test_aggregator.run_tests(project_root, 'gcc', project_tree=project_tree, run_all=False)
+    assert results['details'] == []
+    assert [test['test'] for test in results['skipped']] == ['a_test.cpp', 'c_test.cpp']
+    # B никто не включает, и от него никто не зависит
+    touch(project_root / 'src' / 'B.cpp')
+    assert selected(test_aggregator, project_root, project_tree, run_all=False) == []
+    # C.cpp включает A.hpp, поэтому изменение A затрагивает и тест C
+    touch(project_root / 'src' / 'A.hpp')
+    assert selected(test_aggregator, project_root, project_tree, run_all=False) == ['a_test.cpp', 'c_test.cpp']
+    touch(project_root / 'src' / 'C.cpp')
+    assert selected(test_aggregator, project_root, project_tree, run_all=False) == ['c_test.cpp']
+    assert selected(test_aggregator, project_root, project_tree, run_all=False, changed=['C']) == ['c_test.cpp']
+    assert selected(test_aggregator, project_root, project_tree, run_all=True) == ['a_test.cpp', 'c_test.cpp']
+
+
+def test_failed_and_changed_tests_are_rerun(test_aggregator, project, builds, monkeypatch):
+    project_root, project_tree = project
+    monkeypatch.setitem(test_aggregator.config, 'UNITY_BUILD', 'false')
+    test = project_root / 'tests' / 'a_test.cpp'
+    test.write_text('#include "A.hpp"\nint main() { return a(); }\n', encoding='UTF-8')
+    for _ in range(2):
+        results = test_aggregator.run_tests(project_root, 'gcc', project_tree=project_tree, run_all=False)
+        assert [failure['test'] for failure in results['failed']] == ['a_test.cpp']
+    test.write_text('#include "A.hpp"\nint main() { return a() - 1; }\n', encoding='UTF-8')
+    touch(test)
+    assert selected(test_aggregator, project_root, project_tree, run_all=False) == ['a_test.cpp']
+    assert selected(test_aggregator, project_root, project_tree, run_all=False) == []
+
+
+def test_dependency_cycle_selects_every_test(test_aggregator, project, builds, monkeypatch):
+    project_root, _ = project
+    monkeypatch.setitem(test_aggregator.config, 'UNITY_BUILD', 'false')
+    cyclic = importlib.import_module('aggregators.project_tree').ProjectTree({'project': {'modules': [
+        {'name': 'core', 'files': [
+            {'name': name, 'is_template': False, 'deps': deps, 'description': ''}
+            for name, deps in {'A': [], 'B': ['C'], 'C': ['B']}.items()
+        ]}
+    ]}})
+    assert selected(test_aggregator, project_root, None, run_all=False) == ['a_test.cpp']
+    # Сборка с таким деревом не пройдёт, поэтому выбор проверяется напрямую: зависимых C не найти из-за цикла
+    build_dir = project_root / 'bin' / 'tests'
+    impact = json.loads((build_dir / 'impact.json').read_text(encoding='UTF-8'))
+    sources, include_dirs = test_aggregator.find_cpp_source_files(project_root)
+    files = test_aggregator.project_files(sources, include_dirs)
+    tests = test_aggregator.find_test_cases(project_root)
+    args = files, impact, ['C'], project_root, build_dir
+    assert test_aggregator.select_tests(tests, *args, None) == ([], [
+        {'test': 'a_test.cpp', 'reason': 'none of its includes were affected by changes'}
+    ])
+    assert test_aggregator.select_tests(tests, *args, cyclic) == (tests, [])
+
+
+def test_hanging_binary_is_killed(test_aggregator):
+    hang = ['-c', 'import time; print("started", flush=True); time.sleep(60)']
+    run = test_aggregator.run_test_binary(sys.executable, 0.5, 0, hang)
+    assert run['timed_out'] and run['exit_code'] != 0
+    assert 'started' in run['output']
+    assert run['duration'] < 30
+
+
+def test_test_binaries_run_in_parallel(test_aggregator, project, builds, monkeypatch):
+    project_root, project_tree = project
+    for i in range(1, 4):
+        (project_root / 'tests' / f'a{i}_test.cpp').write_text('int main() { return 0; }\n', encoding='UTF-8')
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+    compile_and_run_test = test_aggregator.compile_and_run_test
+
+    def tracked(*args, **kwargs):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        try:
+            time.sleep(0.2)
+            return compile_and_run_test(*args, **kwargs)
+        finally:
+            with lock:
+                running -= 1
+
+    monkeypatch.setattr(test_aggregator, 'compile_and_run_test', tracked)
+    results = test_aggregator.run_tests(project_root, 'gcc', jobs=4, project_tree=project_tree, run_all=True)
+    assert (results['total'], results['passed']) == (4, 4)
+    assert peak == 4
@@ -0,0 +1,113 @@
+import importlib
+import shutil
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def pipeline_aggregator(aggregators):
+    pytest.importorskip('translate')
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    return importlib.import_module('aggregators.pipeline_aggregator')
+
+
+@pytest.fixture
+def project(pipeline_aggregator, monkeypatch, tmp_path):
+    # Shape — шаблон (.hpp и .ipp), Area зависит от него
+    files = [('Shape', True, []), ('Area', False, ['Shape'])]
+    tree = pipeline_aggregator.ProjectTree({'project': {'modules': [{'name': 'geometry', 'files': [
+        {'name': name, 'is_template': template, 'deps': deps, 'description': ''} for name, template, deps in files
+    ]}]}})
+    (tmp_path / 'geometry').mkdir()
+    utils = importlib.import_module('aggregators.utils')
+    monkeypatch.setattr(utils, 'project_path', tmp_path)
+    monkeypatch.setattr(pipeline_aggregator, 'project_path', tmp_path)
+    monkeypatch.setattr(pipeline_aggregator, 'prompt', lambda name: f'{name} prompt')
+    monkeypatch.setitem(pipeline_aggregator.context, 'project_tree', tree)
+    monkeypatch.setitem(pipeline_aggregator.config, 'COMPILER', 'gcc')
+    monkeypatch.setitem(pipeline_aggregator.config, 'DIAGNOSTICS_FORMAT', 'text')
+    pipeline_aggregator.prepare_syntax_check(tree)
+    return tmp_path / 'geometry', tree
+
+
+SHAPE_HPP = '#pragma once\ntemplate <typename T> T twice(T value);\n#include "Shape.ipp"\n'
+SHAPE_IPP = 'template <typename T> T twice(T value) { return value * 2; }\n'
+AREA_HPP = '#pragma once\nint area(int side);\n'
+AREA_CPP = '#include "Area.hpp"\n#include "Shape.hpp"\nint area(int side) { return twice(side) * side; }\n'
+
+
+def check(pipeline_aggregator, path) -> list[dict]:
+    compiler_info, include_dirs = pipeline_aggregator.context['syntax_check']
+    return pipeline_aggregator.syntax_check_file(compiler_info, str(path), include_dirs)[0]
+
+
+def test_syntax_check_reports_only_the_checked_file(pipeline_aggregator, project):
+    module, _ = project
+    (module / 'Shape.hpp').write_text(SHAPE_HPP, encoding='UTF-8')
+    (module / 'Shape.ipp').write_text(SHAPE_IPP.replace('value * 2', 'missing'), encoding='UTF-8')
+    (module / 'Area.hpp').write_text(AREA_HPP, encoding='UTF-8')
+    (module / 'Area.cpp').write_text(AREA_CPP, encoding='UTF-8')
+    assert check(pipeline_aggregator, module / 'Area.hpp') == []
+    # .ipp проверяется через свой .hpp, а ошибка достаётся именно .ipp, а не заголовку
+    errors = check(pipeline_aggregator, module / 'Shape.ipp')
+    assert errors and all(error['file'].endswith('Shape.ipp') for error in errors)
+    assert check(pipeline_aggregator, module / 'Shape.hpp') == []
+    (module / 'Area.cpp').write_text(AREA_CPP.replace('twice(side) * side', 'side *'), encoding='UTF-8')
+    assert check(pipeline_aggregator, module / 'Area.cpp')
+
+
+def test_repair_rewrites_only_the_broken_file(pipeline_aggregator, project, monkeypatch):
+    module, tree = project
+    (module / 'Area.hpp').write_text(AREA_HPP, encoding='UTF-8')
+    (module / 'Area.cpp').write_text('#include "Area.hpp"\nint area(int side) { return side * ; }\n', encoding='UTF-8')
+    requests = []
+
+    def ask(messages, what=None):
+        requests.append((pipeline_aggregator.context['current_file'], pipeline_aggregator.context['diagnostics']))
+        return '```cpp\n#include "Area.hpp"\nint area(int side) { return side; }\n```'
+
+    monkeypatch.setattr(pipeline_aggregator, 'ask', ask)
+    errors = check(pipeline_aggregator, module / 'Area.cpp')
+    assert pipeline_aggregator.repair_implementation(tree['Area'], False, errors) is True
+    assert len(requests) == 1
+    assert requests[0][0] == 'Area.cpp'
+    assert 'expected primary-expression' in requests[0][1]
+    assert (module / 'Area.hpp').read_text(encoding='UTF-8') == AREA_HPP
+    assert check(pipeline_aggregator, module / 'Area.cpp') == []
+
+
+def test_repair_gives_up_after_attempts(pipeline_aggregator, project, monkeypatch):
+    module, tree = project
+    (module / 'Area.hpp').write_text('#pragma once\nint area(int side)\n', encoding='UTF-8')
+    attempts = []
+    monkeypatch.setattr(pipeline_aggregator, 'ask',
+                        lambda messages, what=None: attempts.append(what) or '#pragma once\nint area(int side)\n')
+    errors = check(pipeline_aggregator, module / 'Area.hpp')
+    assert pipeline_aggregator.repair_implementation(tree['Area'], True, errors, attempts=2) is False
+    assert len(attempts) == 2
+
+
+def test_dependency_is_repaired_before_dependents_are_written(pipeline_aggregator, project, monkeypatch):
+    module, tree = project
+    events = []
+    broken = 'template <typename T> T twice(T value) { return missing; }\n'
+    code = {('Shape', True): SHAPE_HPP, ('Shape', False): broken, ('Area', True): AREA_HPP, ('Area', False): AREA_CPP}
+
+    def write_single_implementation(file, is_header):
+        path = pipeline_aggregator.implementation_path(file, is_header)
+        events.append(f'write {path.name}')
+        path.write_text(code[(file.name, is_header)], encoding='UTF-8')
+        return True
+
+    def ask(messages, what=None):
+        events.append(f'repair {pipeline_aggregator.context["current_file"]}')
+        return SHAPE_IPP
+
+    for key, value in {'SYNTAX_CHECK': 'true', 'CANDIDATES': '1', 'JOB_QUEUE': 'false', 'BATCHING': 'false'}.items():
+        monkeypatch.setitem(pipeline_aggregator.config, key, value)
+    monkeypatch.setattr(pipeline_aggregator, 'write_single_implementation', write_single_implementation)
+    monkeypatch.setattr(pipeline_aggregator, 'ask', ask)
+    assert pipeline_aggregator.write_file_implementation() is True
+    assert events == ['write Shape.hpp', 'write Shape.ipp', 'repair Shape.ipp', 'write Area.hpp', 'write Area.cpp']
+    assert (module / 'Shape.ipp').read_text(encoding='UTF-8') == SHAPE_IPP
@@ -0,0 +1,56 @@
+import importlib
+import json
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def pipeline_aggregator(aggregators):
+    pytest.importorskip('translate')
+    return importlib.import_module('aggregators.pipeline_aggregator')
+
+
+class FakeMyMemory:
+    # Ведёт себя как MyMemory: длинный запрос отклоняется текстом ошибки вместо перевода
+    queries = []
+    broken = ''
+
+    def __init__(self, to_lang: str):
+        pass
+
+    def translate(self, text: str) -> str:
+        FakeMyMemory.queries.append(text)
+        if len(text) > 500:
+            return 'QUERY LENGTH LIMIT EXCEEDED. MAX ALLOWED QUERY : 500 CHARS'
+        if self.broken and self.broken in text:
+            return 'MYMEMORY WARNING: YOU USED ALL AVAILABLE FREE TRANSLATIONS FOR TODAY'
+        return '\n'.join(f'ru {line}' for line in text.split('\n'))
+
+
+@pytest.fixture
+def translator(pipeline_aggregator, monkeypatch):
+    monkeypatch.setattr(pipeline_aggregator.translate, 'Translator', FakeMyMemory)
+    monkeypatch.setattr(FakeMyMemory, 'queries', [])
+    return FakeMyMemory
+
+
+def test_batch_is_split_under_provider_limit(pipeline_aggregator, translator, tmp_path):
+    texts = [f'Question {i}: which container should store the matrix rows?' for i in range(30)]
+    result = pipeline_aggregator.fetch_translations(texts, tmp_path / 'translations.json')
+    assert result == {text: f'ru {text}' for text in texts}
+    assert len(translator.queries) > 1 and all(len(query) <= 500 for query in translator.queries)
+    assert json.loads((tmp_path / 'translations.json').read_text(encoding='UTF-8')) == result
+
+
+def test_failed_chunk_is_not_cached(pipeline_aggregator, translator, monkeypatch, tmp_path):
+    texts = [f'Answer {i}: {"x" * 200}' for i in range(6)]
+    monkeypatch.setattr(translator, 'broken', texts[0])
+    result = pipeline_aggregator.fetch_translations(texts, tmp_path / 'translations.json')
+    assert texts[0] not in result and texts[-1] in result
+    cache = json.loads((tmp_path / 'translations.json').read_text(encoding='UTF-8'))
+    assert not any('MYMEMORY' in value for value in cache.values())
+
+    monkeypatch.setattr(translator, 'broken', 'Answer')
+    with pytest.raises(ValueError):
+        pipeline_aggregator.fetch_translations(texts, tmp_path / 'other.json')
+    assert not (tmp_path / 'other.json').exists()
@@ -0,0 +1,109 @@
+import importlib
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# parse_aggregator зависит только от стандартной библиотеки и импортируется напрямую, как в benchmarks
+sys.path.insert(0, str(ROOT / 'aggregators'))
+from parse_aggregator import find_local_symbols  # noqa: E402
+
+
+def test_local_symbols_are_found():
+    code = '''
+    // static int commented();
+    #define STATIC static int macro()
+    const char *text = "static int quoted();";
+    namespace {
+        int helper(int x) { return x; }
+        struct Cache { int value; };
+        namespace nested { int deep(); }
+    }
+    static double scale = 2.0;
+    static int twice(int x) { static int calls = 0; return x * 2; }
+    int exported(int x) { return helper(x); }
+    namespace named { static int inner(); int outer(); }
+    '''
+    assert find_local_symbols(code) == {'helper', 'Cache', 'nested', 'scale', 'twice'}
+
+
+@pytest.fixture(scope='module')
+def build_aggregator(aggregators):
+    if shutil.which('g++') is None:
+        pytest.skip('g++ is not installed')
+    return importlib.import_module('aggregators.build_aggregator')
+
+
+@pytest.fixture
+def project(build_aggregator, monkeypatch, tmp_path):
+    monkeypatch.setattr(build_aggregator, 'cache', None)
+    monkeypatch.setitem(build_aggregator.config, 'BUILD_CACHE_SIZE', '0')
+    monkeypatch.setitem(build_aggregator.config, 'PCH', 'false')
+    monkeypatch.setitem(build_aggregator.config, 'MAX_ERRORS', '0')
+    sources = {
+        'math/Add.cpp': 'static int helper() { return 1; }\nint add(int a, int b) { return a + b + helper() - 1; }\n',
+        'math/Mul.cpp': 'static int helper() { return 0; }\nint mul(int a, int b) { return a * b + helper(); }\n',
+        'math/Sub.cpp': 'int sub(int a, int b) { return a - b; }\n',
+        'io/Print.cpp': 'int print(int value) { return value; }\n',
+        'io/Read.cpp': 'int read() { return 0; }\n',
+        'main.cpp': 'int add(int, int);\nint main() { return add(0, 0); }\n',
+    }
+    for path, code in sources.items():
+        (tmp_path / path).parent.mkdir(exist_ok=True)
+        (tmp_path / path).write_text(code, encoding='UTF-8')
+    return tmp_path
+
+
+def names(sources: list[str]) -> list[str]:
+    return sorted(Path(source).name for source in sources)
+
+
+def test_sources_are_grouped_by_module(build_aggregator, project):
+    sources, _ = build_aggregator.find_cpp_source_files(project)
+    groups, singles = build_aggregator.group_unity_sources(sources, None, set())
+    # Mul.cpp повторяет static helper из Add.cpp, main.cpp — точка входа
+    assert {module: names(group) for module, group in groups.items()} == {
+        'math': ['Add.cpp', 'Sub.cpp'], 'io': ['Print.cpp', 'Read.cpp']
+    }
+    assert names(singles) == ['Mul.cpp', 'main.cpp']
+    excluded = {str(project / 'io' / 'Print.cpp')}
+    groups, singles = build_aggregator.group_unity_sources(sources, None, excluded)
+    assert list(groups) == ['math']
+    assert names(singles) == ['Mul.cpp', 'Print.cpp', 'Read.cpp', 'main.cpp']
+
+
+def test_unity_build_links_and_records_timing(build_aggregator, project):
+    result = build_aggregator.compile_cpp_project(str(project), 'gcc', unity=True)
+    assert result['success'], result['output']
+    assert names(unit['source'] for unit in result['units']) == ['Mul.cpp', 'io.cpp', 'main.cpp', 'math.cpp']
+    assert result['timing']['mode'] == 'unity'
+    timing = json.loads((project / 'bin' / 'timing.json').read_text(encoding='UTF-8'))
+    assert 'unity' in timing
+    # Время пишется только для полной сборки: здесь объекты Mul.cpp и main.cpp переиспользуются
+    result = build_aggregator.compile_cpp_project(str(project), 'gcc', unity=False)
+    assert result['success'] and result['timing']['mode'] == 'per_tu'
+    assert 'per_tu' not in json.loads((project / 'bin' / 'timing.json').read_text(encoding='UTF-8'))
+    shutil.rmtree(project / 'bin' / 'obj')
+    build_aggregator.compile_cpp_project(str(project), 'gcc', unity=False)
+    assert set(json.loads((project / 'bin' / 'timing.json').read_text(encoding='UTF-8'))) == {'unity', 'per_tu'}
+
+
+def test_group_broken_by_amalgamation_is_excluded(build_aggregator, project):
+    # Одинаковый typedef с разными типами виден только в склейке: по отдельности файлы компилируются
+    (project / 'io' / 'Print.cpp').write_text('typedef int value_t;\nint print(value_t value) { return value; }\n',
+                                             encoding='UTF-8')
+    (project / 'io' / 'Read.cpp').write_text('typedef long value_t;\nint read() { return value_t(0); }\n',
+                                            encoding='UTF-8')
+    result = build_aggregator.compile_cpp_project(str(project), 'gcc', unity=True)
+    assert result['success'], result['output']
+    assert names(unit['source'] for unit in result['units']) == ['Mul.cpp', 'Print.cpp', 'Read.cpp', 'main.cpp',
+                                                                  'math.cpp']
+    excluded = json.loads((project / 'bin' / 'unity' / 'excluded.json').read_text(encoding='UTF-8'))
+    assert names(excluded) == ['Print.cpp', 'Read.cpp']
+    # Следующая сборка сразу компилирует исключённые файлы по отдельности
+    result = build_aggregator.compile_cpp_project(str(project), 'gcc', unity=True)
+    assert result['success']
+    assert not any(unit['source'].endswith('io.cpp') for unit in result['units'])